@@ -0,0 +1 @@
+"""Performance benchmarks, run as modules from the repository root (e.g. `python -m benchmarks.retrievers`)."""
@@ -0,0 +1,106 @@
+"""
+Throughput of the batch query API, against the local LLM stub by default.
+
+    python -m benchmarks.batch --count 1000 --concurrency 16 --latency 1.0
+
+The query texts of data/sample_queries.json are repeated up to --count and sent
+through RAGService.search_documents_batch with shared settings. With the answer
+cache off, every query costs one LLM call, so the run should take about
+count * latency / concurrency: anything beyond that is time spent in the
+pipeline itself, broken down in the report by stage.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import time
+
+from benchmarks.common import environment, peak_rss_mb, write_report
+from benchmarks.llm_stub import add_stub_arguments, start_stub_server, stub_config_from_args
+from benchmarks.load_test import QUERY_MIX_FILE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure search_documents_batch throughput against stubbed LLM providers.")
+    parser.add_argument("--count", type=int, default=1000, help="Queries in the batch")
+    parser.add_argument("--concurrency", type=int, default=8, help="LLM calls in flight at once")
+    parser.add_argument("--queries", default=QUERY_MIX_FILE, help="Query mix (JSON list); only the texts are used")
+    parser.add_argument("--doc-types", nargs="+", default=["Code", "Loi"])
+    parser.add_argument("--retriever-type", default="faiss_retriever")
+    parser.add_argument("--params", default="{}", help="Retriever params as JSON")
+    parser.add_argument("--max-results", type=int, default=10)
+    parser.add_argument("--provider", choices=["auto", "google", "together_ai"], help="Sets LLM_PROVIDER")
+    parser.add_argument(
+        "--answer-cache", action=argparse.BooleanOptionalAction, default=False,
+        help="Keep the semantic answer cache on (off by default: repeated queries would be cache hits)",
+    )
+    parser.add_argument("--no-stub", dest="stub", action="store_false", help="Call the real provider endpoints")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmarks/results/batch.json")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+    stub = None
+    if args.stub:
+        stub = start_stub_server(stub_config_from_args(args, seed=args.seed))
+        os.environ["GOOGLE_API_BASE"] = stub.google_base
+        os.environ["TOGETHER_API_BASE"] = stub.together_base
+        os.environ.setdefault("GOOGLE_API_KEY", "stub")
+        os.environ.setdefault("TOGETHER_AI_API_KEY", "stub")
+        print(f"[batch] stub providers at {stub.base_url}", flush=True)
+    if args.provider:
+        os.environ["LLM_PROVIDER"] = args.provider
+    if not args.answer_cache:
+        os.environ["ANSWER_CACHE_MAX_ENTRIES"] = "0"
+
+    with open(args.queries, encoding="utf-8") as f:
+        texts = [entry["query"] for entry in json.load(f)]
+    queries = list(itertools.islice(itertools.cycle(texts), args.count))
+
+    # Imported here: the environment must be set up before the services load.
+    from services.rag_service.rag_service import get_rag_service
+
+    rag_service = get_rag_service()
+    params = json.loads(args.params)
+    batch_arguments = (args.retriever_type, params, args.doc_types, None, None, args.max_results)
+    # Loads the indexes and the embedding model outside of the measurement.
+    rag_service.search_documents_batch(queries[:1], *batch_arguments, max_concurrency=1)
+
+    print(f"[batch] {len(queries)} queries, {args.concurrency} LLM calls in flight", flush=True)
+    start = time.perf_counter()
+    batch = rag_service.search_documents_batch(queries, *batch_arguments, max_concurrency=args.concurrency)
+    elapsed = time.perf_counter() - start
+
+    llm_bound = len(queries) * args.latency / args.concurrency if args.stub else None
+    report = {
+        "environment": environment(),
+        "config": vars(args),
+        "batch": {
+            "queries": len(queries),
+            "succeeded": len(queries) - len(batch.errors),
+            "errors": sorted({error.split(":", 1)[0] for error in batch.errors.values()}),
+            "elapsed_s": round(elapsed, 3),
+            "throughput_qps": round(len(queries) / elapsed, 3) if elapsed else 0.0,
+            "llm_bound_s": round(llm_bound, 3) if llm_bound is not None else None,
+            "overhead_s": round(elapsed - llm_bound, 3) if llm_bound is not None else None,
+            "stage_s": {stage: round(seconds, 4) for stage, seconds in sorted(batch.stage_timings.items())},
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "stub": stub.stats.to_dict() if stub else None,
+    }
+    if stub:
+        stub.shutdown()
+    write_report(report, args.output)
+
+    summary = report["batch"]
+    print(
+        f"[batch] {summary['succeeded']}/{summary['queries']} answered in {summary['elapsed_s']}s "
+        f"({summary['throughput_qps']} q/s, LLM bound {summary['llm_bound_s']}s)"
+    )
+    print(f"[batch] report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
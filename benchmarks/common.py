@@ -0,0 +1,75 @@
+"""
+Measurement and report helpers shared by the benchmarks.
+
+Standard library only: the load test imports this before configuring (through
+environment variables) the services it then imports.
+"""
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean/max of durations in seconds, reported in milliseconds (linear interpolation)"""
+    if not values:
+        return {}
+    ms = sorted(value * 1000 for value in values)
+
+    def at(q: float) -> float:
+        position = (len(ms) - 1) * q / 100
+        lower = math.floor(position)
+        upper = min(lower + 1, len(ms) - 1)
+        return ms[lower] + (ms[upper] - ms[lower]) * (position - lower)
+
+    return {
+        "p50": round(at(50), 3),
+        "p95": round(at(95), 3),
+        "p99": round(at(99), 3),
+        "mean": round(sum(ms) / len(ms), 3),
+        "max": round(ms[-1], 3),
+    }
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident memory of this process right now (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def environment(**extra: Any) -> Dict[str, Any]:
+    """Where a result was measured, so two reports can be compared fairly"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        **extra,
+    }
+
+
+def write_report(report: Dict[str, Any], path: str):
+    """Sorted, indented JSON: stable across runs, so reports diff cleanly."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True, ensure_ascii=False, default=str)
+        f.write("\n")
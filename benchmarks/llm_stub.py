@@ -0,0 +1,263 @@
+"""
+Local stand-in for the LLM provider APIs, for load tests that must not spend quota.
+
+Imitates the endpoints RagLLMService calls, blocking and streamed:
+
+    POST /v1beta/models/{model}:generateContent            Google AI
+    POST /v1beta/models/{model}:streamGenerateContent      Google AI, server-sent events with ?alt=sse
+    POST /v1/chat/completions                              Together AI, SSE when "stream": true
+
+Point the app at it with
+    GOOGLE_API_BASE=http://127.0.0.1:8089/v1beta TOGETHER_API_BASE=http://127.0.0.1:8089/v1
+
+Latency, jitter, error rate and the streaming pace are configurable:
+
+    python -m benchmarks.llm_stub --port 8089 --latency 0.8 --error-rate 0.05
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+GOOGLE_PATH = re.compile(r"^/v1beta/models/(?P<model>[^/:]+):(?P<method>generateContent|streamGenerateContent)$")
+TOGETHER_PATH = "/v1/chat/completions"
+WORDS = (
+    "Selon l'article cité du code, le titulaire doit notifier sa demande à l'autorité compétente "
+    "dans le délai prévu, sous peine de sanctions administratives et d'amendes prévues par la loi."
+).split()
+
+
+@dataclass
+class StubConfig:
+    """Behaviour of the stub provider"""
+    latency: float = 0.5            # seconds before the first byte (the whole answer when not streaming)
+    jitter: float = 0.2             # +/- uniform noise on the latency, as a fraction of it
+    error_rate: float = 0.0         # share of requests answered with one of `error_statuses`
+    error_statuses: Tuple[int, ...] = (429, 500, 503)
+    retry_after: Optional[float] = 1.0  # Retry-After sent with 429/503, None to omit it
+    answer_tokens: int = 120        # words in each answer
+    token_delay: float = 0.01       # seconds between streamed chunks
+    tokens_per_chunk: int = 4
+    seed: Optional[int] = None
+
+
+@dataclass
+class StubStats:
+    """What the stub served, by endpoint and status"""
+    requests: Counter = field(default_factory=Counter)
+    statuses: Counter = field(default_factory=Counter)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, endpoint: str, status: int):
+        with self._lock:
+            self.requests[endpoint] += 1
+            self.statuses[f"{endpoint}:{status}"] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"requests": dict(self.requests), "statuses": dict(self.statuses)}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: StubConfig):
+        super().__init__(address, _StubHandler)
+        self.config = config
+        self.stats = StubStats()
+        self.rng = random.Random(config.seed)
+        self._rng_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{'127.0.0.1' if host in ('', '0.0.0.0') else host}:{port}"
+
+    @property
+    def google_base(self) -> str:
+        return f"{self.base_url}/v1beta"
+
+    @property
+    def together_base(self) -> str:
+        return f"{self.base_url}/v1"
+
+    def draw(self) -> Tuple[float, Optional[int]]:
+        """Latency and injected error status (None for success) of the next request"""
+        config = self.config
+        with self._rng_lock:
+            latency = config.latency * (1 + self.rng.uniform(-config.jitter, config.jitter))
+            status = self.rng.choice(config.error_statuses) if self.rng.random() < config.error_rate else None
+        return max(0.0, latency), status
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: StubServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Invalid JSON payload"}}, "invalid")
+            return
+
+        match = GOOGLE_PATH.match(url.path)
+        if match:
+            endpoint = f"google:{match['method']}"
+            stream = match["method"] == "streamGenerateContent"
+            sse = parse_qs(url.query).get("alt") == ["sse"]
+            model = match["model"]
+        elif url.path == TOGETHER_PATH:
+            endpoint = "together:chat/completions"
+            stream = sse = bool(payload.get("stream"))
+            model = payload.get("model", "")
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown endpoint {url.path}"}}, "unknown")
+            return
+
+        latency, status = self.server.draw()
+        time.sleep(latency)
+        if status is not None:
+            headers = {}
+            if status in (429, 503) and self.server.config.retry_after is not None:
+                headers["Retry-After"] = str(self.server.config.retry_after)
+            self._send_json(status, {"error": {"code": status, "message": "Injected stub error"}}, endpoint, headers)
+            return
+
+        chunks = self._answer_chunks()
+        if not stream:
+            text = "".join(chunks)
+            if endpoint.startswith("google"):
+                self._send_json(200, _google_event(text, finished=True), endpoint)
+            else:
+                self._send_json(200, _together_message(model, text), endpoint)
+        elif sse:
+            self._send_sse(chunks, endpoint, model)
+        else:
+            # streamGenerateContent without alt=sse returns one JSON array of events
+            events = [_google_event(chunk, finished=i == len(chunks) - 1) for i, chunk in enumerate(chunks)]
+            self._send_json(200, events, endpoint)
+
+    def _answer_chunks(self) -> List[str]:
+        config = self.server.config
+        words = [WORDS[i % len(WORDS)] for i in range(config.answer_tokens)]
+        return [
+            " ".join(words[start:start + config.tokens_per_chunk]) + " "
+            for start in range(0, len(words), max(1, config.tokens_per_chunk))
+        ]
+
+    def _send_json(self, status: int, data: Any, endpoint: str, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.stats.record(endpoint, status)
+
+    def _send_sse(self, chunks: List[str], endpoint: str, model: str):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        # No Content-Length: the stream is delimited by closing the connection.
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for i, chunk in enumerate(chunks):
+                if i:
+                    time.sleep(self.server.config.token_delay)
+                if endpoint.startswith("google"):
+                    event = _google_event(chunk, finished=i == len(chunks) - 1)
+                else:
+                    event = {"id": "stub", "model": model, "choices": [{"index": 0, "delta": {"content": chunk}}]}
+                self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            if not endpoint.startswith("google"):
+                self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (deadline or hedge won elsewhere).
+            self.server.stats.record(endpoint, 499)
+            return
+        self.server.stats.record(endpoint, 200)
+
+
+def _google_event(text: str, finished: bool) -> Dict[str, Any]:
+    candidate: Dict[str, Any] = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    return {"candidates": [candidate]}
+
+
+def _together_message(model: str, text: str) -> Dict[str, Any]:
+    return {
+        "id": "stub",
+        "object": "chat.completion",
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+    }
+
+
+def start_stub_server(config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0) -> StubServer:
+    """Serve the stub from a daemon thread; port 0 picks a free port."""
+    server = StubServer((host, port), config or StubConfig())
+    threading.Thread(target=server.serve_forever, name="llm-stub", daemon=True).start()
+    return server
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    defaults = StubConfig()
+    parser.add_argument("--latency", type=float, default=defaults.latency, help="Seconds before the first byte")
+    parser.add_argument("--jitter", type=float, default=defaults.jitter, help="Latency noise, fraction of --latency")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--error-statuses", nargs="+", type=int, default=list(defaults.error_statuses))
+    parser.add_argument("--answer-tokens", type=int, default=defaults.answer_tokens)
+    parser.add_argument("--token-delay", type=float, default=defaults.token_delay, help="Seconds between streamed chunks")
+
+
+def stub_config_from_args(args: argparse.Namespace, seed: Optional[int] = None) -> StubConfig:
+    return StubConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_statuses=tuple(args.error_statuses),
+        answer_tokens=args.answer_tokens,
+        token_delay=args.token_delay,
+        seed=seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Google AI / Together AI endpoints for load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    server = StubServer((args.host, args.port), stub_config_from_args(args))
+    print(f"GOOGLE_API_BASE={server.google_base} TOGETHER_API_BASE={server.together_base}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats.to_dict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
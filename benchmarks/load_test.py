@@ -0,0 +1,298 @@
+"""
+Load test of the query path, against a local stub of the LLM providers by default.
+
+    python -m benchmarks.load_test --concurrency 50 --duration 120 --mode stream --latency 1.5
+
+Simulated users (threads) loop over the weighted query mix of
+data/sample_queries.json and call services.query_processor.process_query, or
+process_query_stream with the answer consumed chunk by chunk like the Streamlit
+page does. Unless --no-stub is given, benchmarks.llm_stub is started in-process
+and the app is pointed at it through GOOGLE_API_BASE / TOGETHER_API_BASE, so no
+API quota is spent; retrieval runs against the real local stores.
+
+Reported: throughput, latency percentiles (plus time to first chunk when
+streaming), errors by type, RSS growth over the run and the mean latency of each
+pipeline stage. The report is written as sorted JSON for diffing between runs.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.common import current_rss_mb, environment, peak_rss_mb, percentiles, write_report
+from benchmarks.llm_stub import add_stub_arguments, start_stub_server, stub_config_from_args
+
+QUERY_MIX_FILE = "data/sample_queries.json"
+
+
+@dataclass
+class Sample:
+    """Outcome of one request"""
+    name: str
+    latency: float
+    first_chunk: Optional[float] = None
+    error: Optional[str] = None
+
+
+def load_query_mix(path: str, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Entries of the query mix, with the command-line settings as defaults"""
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    if not entries:
+        raise ValueError(f"No queries in {path}")
+    return [
+        {
+            "name": entry.get("name") or entry["query"][:40],
+            "query": entry["query"],
+            "doc_types": entry.get("doc_types") or args.doc_types,
+            "retriever_type": entry.get("retriever_type") or args.retriever_type,
+            "params": entry.get("params") or {},
+            "start_year": entry.get("start_year"),
+            "end_year": entry.get("end_year"),
+            "max_results": entry.get("max_results") or args.max_results,
+            "weight": entry.get("weight", 1),
+        }
+        for entry in entries
+    ]
+
+
+def classify_error(error: Exception) -> str:
+    """Error type, with the HTTP status when a provider answered with one"""
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return f"{type(error).__name__}:{status}" if status else type(error).__name__
+
+
+class MemorySampler(threading.Thread):
+    """Samples the process RSS at a fixed interval while the load runs"""
+
+    def __init__(self, interval: float = 0.5):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.interval = interval
+        self.samples: List[Tuple[float, float]] = []
+        self._done = threading.Event()
+
+    def run(self):
+        start = time.perf_counter()
+        while not self._done.is_set():
+            rss = current_rss_mb()
+            if rss is not None:
+                self.samples.append((time.perf_counter() - start, rss))
+            self._done.wait(self.interval)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+class LoadTest:
+    """Closed-loop load: `concurrency` users, each sending its next request once the previous one is done."""
+
+    def __init__(self, mix: List[Dict[str, Any]], args: argparse.Namespace):
+        # Imported here: the environment (stub endpoints, caches) must be set up before the services load.
+        from services.query_processor import process_query, process_query_stream
+
+        self.process_query = process_query
+        self.process_query_stream = process_query_stream
+        self.mix = mix
+        self.args = args
+        self.samples: List[Sample] = []
+        self._lock = threading.Lock()
+
+    def request(self, entry: Dict[str, Any]) -> Sample:
+        arguments = (
+            entry["query"], entry["doc_types"], entry["retriever_type"], entry["params"],
+            entry["start_year"], entry["end_year"], entry["max_results"],
+        )
+        first_chunk = None
+        start = time.perf_counter()
+        try:
+            if self.args.mode == "stream":
+                answer_stream, _, _ = self.process_query_stream(*arguments)
+                for _ in answer_stream:
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - start
+            else:
+                self.process_query(*arguments)
+        except Exception as e:
+            return Sample(entry["name"], time.perf_counter() - start, first_chunk, classify_error(e))
+        return Sample(entry["name"], time.perf_counter() - start, first_chunk)
+
+    def user(self, user_id: int, tickets: "itertools.count[int]", deadline: float, stop: threading.Event):
+        rng = random.Random(self.args.seed + user_id)
+        weights = [entry["weight"] for entry in self.mix]
+        while not stop.is_set() and time.perf_counter() < deadline:
+            if self.args.requests and next(tickets) >= self.args.requests:
+                return
+            sample = self.request(rng.choices(self.mix, weights)[0])
+            with self._lock:
+                self.samples.append(sample)
+            if self.args.think_time:
+                stop.wait(rng.expovariate(1 / self.args.think_time))
+
+    def run(self) -> float:
+        """Run the load and return its wall time in seconds."""
+        tickets = itertools.count()
+        stop = threading.Event()
+        start = time.perf_counter()
+        deadline = start + self.args.duration
+        users = [
+            threading.Thread(target=self.user, args=(i, tickets, deadline, stop), name=f"user-{i}", daemon=True)
+            for i in range(self.args.concurrency)
+        ]
+        for user in users:
+            user.start()
+            if self.args.ramp_up:
+                time.sleep(self.args.ramp_up / self.args.concurrency)
+        try:
+            for user in users:
+                user.join()
+        except KeyboardInterrupt:
+            stop.set()
+            logging.warning("Interrupted, waiting for in-flight requests")
+            for user in users:
+                user.join()
+        return time.perf_counter() - start
+
+
+def stage_means(before: Dict[Tuple[str, ...], Tuple[int, float]], after: Dict[Tuple[str, ...], Tuple[int, float]]) -> Dict[str, Any]:
+    """Count and mean milliseconds of every pipeline stage between two histogram snapshots"""
+    stages = {}
+    for key, (count, total) in sorted(after.items()):
+        previous_count, previous_total = before.get(key, (0, 0.0))
+        if count > previous_count:
+            stages[key[0]] = {
+                "count": count - previous_count,
+                "mean_ms": round((total - previous_total) / (count - previous_count) * 1000, 3),
+            }
+    return stages
+
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict[str, Any]:
+    ok = [sample for sample in samples if sample.error is None]
+    by_name: Dict[str, List[Sample]] = defaultdict(list)
+    for sample in samples:
+        by_name[sample.name].append(sample)
+    return {
+        "requests": len(samples),
+        "succeeded": len(ok),
+        "error_rate": round(1 - len(ok) / len(samples), 4) if samples else 0.0,
+        "errors": dict(Counter(sample.error for sample in samples if sample.error)),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": percentiles([sample.latency for sample in ok]),
+        "first_chunk_ms": percentiles([sample.first_chunk for sample in ok if sample.first_chunk is not None]),
+        "failed_latency_ms": percentiles([sample.latency for sample in samples if sample.error]),
+        "by_query": {
+            name: {
+                "requests": len(group),
+                "errors": sum(sample.error is not None for sample in group),
+                "latency_ms": percentiles([sample.latency for sample in group if sample.error is None]),
+            }
+            for name, group in sorted(by_name.items())
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test process_query against stubbed LLM providers.")
+    parser.add_argument("--concurrency", type=int, default=10, help="Simultaneous users")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds of load")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after this many requests (0: duration only)")
+    parser.add_argument("--ramp-up", type=float, default=0, help="Seconds over which users are started")
+    parser.add_argument("--think-time", type=float, default=0, help="Mean pause between a user's requests")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed requests before the load (loads indexes and models)")
+    parser.add_argument("--mode", choices=["sync", "stream"], default="sync", help="process_query or process_query_stream")
+    parser.add_argument("--queries", default=QUERY_MIX_FILE, help="Query mix (JSON list)")
+    parser.add_argument("--doc-types", nargs="+", default=["Code", "Loi"], help="Default for mix entries without doc_types")
+    parser.add_argument("--retriever-type", default="faiss_retriever", help="Default for mix entries without one")
+    parser.add_argument("--max-results", type=int, default=10)
+    parser.add_argument("--provider", choices=["auto", "google", "together_ai"], help="Sets LLM_PROVIDER")
+    parser.add_argument(
+        "--answer-cache", action=argparse.BooleanOptionalAction, default=False,
+        help="Keep the semantic answer cache on (off by default: a small mix would mostly measure cache hits)",
+    )
+    parser.add_argument("--no-stub", dest="stub", action="store_false", help="Call the real provider endpoints")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmarks/results/load_test.json")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+    stub = None
+    if args.stub:
+        stub = start_stub_server(stub_config_from_args(args, seed=args.seed))
+        os.environ["GOOGLE_API_BASE"] = stub.google_base
+        os.environ["TOGETHER_API_BASE"] = stub.together_base
+        os.environ.setdefault("GOOGLE_API_KEY", "stub")
+        os.environ.setdefault("TOGETHER_AI_API_KEY", "stub")
+        print(f"[load] stub providers at {stub.base_url}", flush=True)
+    if args.provider:
+        os.environ["LLM_PROVIDER"] = args.provider
+    if not args.answer_cache:
+        os.environ["ANSWER_CACHE_MAX_ENTRIES"] = "0"
+
+    mix = load_query_mix(args.queries, args)
+    test = LoadTest(mix, args)
+    from utils.metrics import STAGE_LATENCY
+
+    rss_before_warmup = current_rss_mb()
+    warmup = [test.request(mix[i % len(mix)]) for i in range(args.warmup)]
+    for sample in warmup:
+        if sample.error:
+            logging.warning(f"Warm-up request {sample.name} failed: {sample.error}")
+
+    stages_before = STAGE_LATENCY.snapshot()
+    sampler = MemorySampler()
+    sampler.start()
+    print(f"[load] {args.concurrency} users, {args.mode} mode, {args.duration:.0f}s", flush=True)
+    elapsed = test.run()
+    sampler.stop()
+
+    summary = summarize(test.samples, elapsed)
+    rss = [value for _, value in sampler.samples]
+    growth = rss[-1] - rss[0] if rss else None
+    report = {
+        "environment": environment(),
+        "config": vars(args),
+        "warmup": {
+            "requests": len(warmup),
+            "first_request_s": round(warmup[0].latency, 3) if warmup else None,
+            "errors": [sample.error for sample in warmup if sample.error],
+        },
+        "load": summary,
+        "memory": {
+            "rss_before_warmup_mb": rss_before_warmup,
+            "rss_start_mb": rss[0] if rss else None,
+            "rss_end_mb": rss[-1] if rss else None,
+            "rss_max_mb": max(rss) if rss else None,
+            "growth_mb": round(growth, 1) if growth is not None else None,
+            "growth_mb_per_1k_requests": (
+                round(growth * 1000 / summary["requests"], 2) if growth is not None and summary["requests"] else None
+            ),
+            "peak_rss_mb": peak_rss_mb(),
+        },
+        "stages": stage_means(stages_before, STAGE_LATENCY.snapshot()),
+        "stub": stub.stats.to_dict() if stub else None,
+    }
+    if stub:
+        stub.shutdown()
+    write_report(report, args.output)
+
+    latency = summary["latency_ms"]
+    print(
+        f"[load] {summary['requests']} requests, {summary['throughput_rps']} req/s, "
+        f"p50 {latency.get('p50', '-')}ms p95 {latency.get('p95', '-')}ms p99 {latency.get('p99', '-')}ms, "
+        f"errors {summary['errors'] or 'none'}, RSS +{report['memory']['growth_mb']} MB"
+    )
+    print(f"[load] report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
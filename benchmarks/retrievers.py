@@ -0,0 +1,289 @@
+"""
+Retriever benchmark over a synthetic French legal corpus.
+
+    python -m benchmarks.retrievers --sizes 1000 10000 100000 --queries 200 --threads 1 4 8
+
+For every corpus size the corpus is generated and embedded once, and every store
+is built by the ingestion pipeline into a scratch directory. Each backend of
+RETRIEVER_REGISTRY is then measured in a fresh process, so its peak RSS is its own:
+
+    cold_load_s     first get_retriever() call, indexes read from disk
+    latency_ms      p50/p95/p99/mean of sequential searches (query vectors precomputed)
+    qps             throughput of N threads sharing the retriever
+    recall_at_k     overlap with exact search: brute-force inner product ("dense") and
+                    exhaustive BM25 scoring ("bm25")
+    peak_rss_mb     peak resident memory of the process
+
+Results are written as sorted, indented JSON so two runs can be diffed.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks.common import current_rss_mb, environment, peak_rss_mb, percentiles, write_report
+from benchmarks.synthetic import HashingEmbeddings, PrecomputedEmbeddings, generate_corpus, generate_queries
+from services.cache_service import EmbeddingCache, CachedEmbeddings, RETRIEVER_CACHE, SHARD_CACHE
+from services.ingestion_service import FileChunks, IngestConfig, IngestionPipeline
+from services.rag_service.models import SearchResult
+from services.retriever_service.bm25_engine import BM25Engine, BM25Index
+from utils.helpers import DOC_TYPES_DICT, RETRIEVER_REGISTRY, build_embeddings, get_retriever, set_embeddings
+
+DEFAULT_PARAMS: Dict[str, Dict[str, Any]] = {
+    "ensemble_retriever": {"retrievers": ["faiss", "bm25", "chroma"]},
+}
+# Retrievers that only fuse other registry entries
+COMPOSITE_RETRIEVERS = {"hybrid": ["faiss", "bm25"], "ensemble_retriever": None}
+
+
+def result_key(content: str, metadata: Dict[str, Any]) -> str:
+    """Identity of a chunk, the same one SearchResult.chunk_id gives whichever backend returned it"""
+    return SearchResult(content=content, relevance_score=0.0, document_type=[], metadata=metadata).chunk_id
+
+
+def _embed(embeddings, texts: List[str], batch_size: int) -> np.ndarray:
+    batches = [
+        np.asarray(embeddings.embed_documents(texts[start:start + batch_size]), dtype=np.float32)
+        for start in range(0, len(texts), batch_size)
+    ]
+    return np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+
+
+def _store_backends(backends: List[str], params: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Ingestion backends ("faiss", "bm25", ...) whose stores the benchmarked retrievers read"""
+    from services.retriever_service.ensemble_retriever import SUB_RETRIEVERS
+
+    needed = set()
+    for backend in backends:
+        if backend in COMPOSITE_RETRIEVERS:
+            needed.update(COMPOSITE_RETRIEVERS[backend] or params.get(backend, {}).get("retrievers", ["faiss", "bm25"]))
+        else:
+            needed.update(name for name, registry_name in SUB_RETRIEVERS.items() if registry_name == backend)
+    return sorted(needed)
+
+
+def exact_dense(matrix: np.ndarray, query_vectors: np.ndarray, k: int) -> List[List[int]]:
+    """Top-k chunk positions by inner product, i.e. cosine for unit-length embeddings"""
+    top: List[List[int]] = []
+    for start in range(0, len(query_vectors), 64):
+        scores = query_vectors[start:start + 64] @ matrix.T
+        best = np.argpartition(-scores, min(k, scores.shape[1] - 1), axis=1)[:, :k]
+        for row, candidates in zip(scores, best):
+            top.append(candidates[np.argsort(-row[candidates], kind="stable")].tolist())
+    return top
+
+
+def exact_bm25(contents: List[str], queries: List[str], k: int) -> List[List[int]]:
+    """Top-k chunk positions by BM25 over the whole corpus, with the retriever's default parameters"""
+    engine = BM25Engine([BM25Index.build(contents)])
+    return [[doc for _, doc, _ in engine.top_k(query, k)] for query in queries]
+
+
+def build_run(
+    size: int, args: argparse.Namespace, embeddings, stores_dir: str, params: Dict[str, Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Generate, embed and ingest one corpus size; returns everything the backend workers need."""
+    documents = generate_corpus(size, args.doc_types, seed=args.seed)
+    queries = generate_queries(documents, args.queries, seed=args.seed)
+
+    start = time.perf_counter()
+    contents = [content for document in documents for content in document.contents]
+    metadatas = [metadata for document in documents for metadata in document.metadatas]
+    matrix = _embed(embeddings, contents, args.batch_size)
+    embed_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pipeline = IngestionPipeline(
+        IngestConfig(stores_dir=stores_dir, doc_types=args.doc_types, backends=_store_backends(args.backends, params)),
+        embeddings=embeddings,
+    )
+    offset = 0
+    files: Dict[str, List[FileChunks]] = {doc_type: [] for doc_type in args.doc_types}
+    for document in documents:
+        count = len(document.contents)
+        files[document.doc_type].append(FileChunks(
+            document.relative_path,
+            hashlib.sha256(document.relative_path.encode("utf-8")).hexdigest(),
+            document.contents,
+            document.metadatas,
+            matrix[offset:offset + count],
+        ))
+        offset += count
+    for doc_type, doc_files in files.items():
+        pipeline.build_stores(doc_type, doc_files)
+    ingest_seconds = time.perf_counter() - start
+
+    query_vectors = []
+    embed_times = []
+    for query in queries:
+        start = time.perf_counter()
+        query_vectors.append(embeddings.embed_query(query))
+        embed_times.append(time.perf_counter() - start)
+    query_matrix = np.asarray(query_vectors, dtype=np.float32)
+
+    keys = [result_key(content, metadata) for content, metadata in zip(contents, metadatas)]
+    truth = {
+        "dense": [[keys[i] for i in top] for top in exact_dense(matrix, query_matrix, args.k)],
+        "bm25": [[keys[i] for i in top] for top in exact_bm25(contents, queries, args.k)],
+    }
+    return {
+        "summary": {
+            "corpus_chunks": len(contents),
+            "corpus_files": len(documents),
+            "queries": len(queries),
+            "embed_seconds": round(embed_seconds, 3),
+            "ingest_seconds": round(ingest_seconds, 3),
+            "query_embedding_ms": percentiles(embed_times),
+        },
+        "queries": queries,
+        "query_vectors": dict(zip(queries, query_matrix.tolist())),
+        "truth": truth,
+    }
+
+
+def _point_at(stores_dir: str, registry_names: List[str]):
+    """Make the retriever classes read their stores from the benchmark directory."""
+    for name in registry_names:
+        factory = RETRIEVER_REGISTRY[name]
+        retriever_cls = getattr(factory, "func", factory)
+        if retriever_cls.base_path:
+            retriever_cls.base_path = os.path.join(stores_dir, os.path.basename(retriever_cls.base_path))
+
+
+def measure_backend(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Benchmark one retriever. Runs in its own process."""
+    from services.retriever_service.ensemble_retriever import SUB_RETRIEVERS
+
+    logging.basicConfig(level=logging.WARNING)
+    backend, params, k = task["backend"], task["params"], task["k"]
+    queries: List[str] = task["queries"]
+    set_embeddings(CachedEmbeddings(
+        PrecomputedEmbeddings(task["query_vectors"]), "benchmark", EmbeddingCache(len(queries) + 1)
+    ))
+    sub_retrievers = COMPOSITE_RETRIEVERS.get(backend, [])
+    if backend in COMPOSITE_RETRIEVERS and sub_retrievers is None:
+        sub_retrievers = params.get("retrievers", ["faiss", "bm25"])
+    _point_at(task["stores_dir"], [backend] + [SUB_RETRIEVERS[name] for name in sub_retrievers])
+    RETRIEVER_CACHE.invalidate()
+    SHARD_CACHE.invalidate()
+
+    start = time.perf_counter()
+    retriever = get_retriever(backend, params, task["doc_types"])
+    cold_load = time.perf_counter() - start
+    rss_after_load = current_rss_mb()
+
+    for query in queries[:task["warmup"]]:
+        retriever.search(query, k)
+
+    latencies = []
+    retrieved = []
+    for query in queries:
+        start = time.perf_counter()
+        results = retriever.search(query, k)
+        latencies.append(time.perf_counter() - start)
+        retrieved.append([result.chunk_id for result in results[:k]])
+
+    recall = {}
+    for reference, truth in task["truth"].items():
+        overlaps = [len(set(found) & set(expected)) / len(expected) for found, expected in zip(retrieved, truth) if expected]
+        recall[reference] = round(float(np.mean(overlaps)), 4) if overlaps else None
+
+    qps = {}
+    for threads in task["threads"]:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            start = time.perf_counter()
+            list(pool.map(lambda query: retriever.search(query, k), queries))
+            qps[str(threads)] = round(len(queries) / (time.perf_counter() - start), 1)
+
+    return {
+        "params": params,
+        "cold_load_s": round(cold_load, 4),
+        "latency_ms": percentiles(latencies),
+        "qps": qps,
+        f"recall_at_{k}": recall,
+        "rss_after_load_mb": rss_after_load,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    backends = list(RETRIEVER_REGISTRY)
+    parser = argparse.ArgumentParser(description="Benchmark every retriever backend on a synthetic legal corpus.")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000], help="Corpus sizes, in chunks")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, 4, 8])
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed searches after the cold load")
+    parser.add_argument("--backends", nargs="+", choices=backends, default=backends)
+    parser.add_argument("--doc-types", nargs="+", choices=list(DOC_TYPES_DICT), default=["Code", "Loi"])
+    parser.add_argument("--params", type=json.loads, default={}, help='JSON per backend, e.g. \'{"faiss_retriever": {"load_mode": "pickle"}}\'')
+    parser.add_argument(
+        "--embeddings", choices=["hashing", "model"], default="hashing",
+        help="Feature hashing (fast, deterministic) or the configured embedding model",
+    )
+    parser.add_argument("--batch-size", type=int, default=512, help="Chunks per embedding call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Where stores are built (default: a temporary directory, removed afterwards)")
+    parser.add_argument("--output", default="benchmarks/results/retrievers.json")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+    params = {backend: {**DEFAULT_PARAMS.get(backend, {}), **args.params.get(backend, {})} for backend in args.backends}
+    embeddings = HashingEmbeddings() if args.embeddings == "hashing" else build_embeddings()
+    workdir = args.workdir or tempfile.mkdtemp(prefix="retriever-bench-")
+
+    report: Dict[str, Any] = {"environment": environment(embeddings=args.embeddings), "config": vars(args), "runs": []}
+    try:
+        for size in args.sizes:
+            stores_dir = os.path.join(workdir, f"chunks_{size}")
+            print(f"[bench] {size} chunks: building stores in {stores_dir}", flush=True)
+            run = build_run(size, args, embeddings, stores_dir, params)
+            summary = run["summary"]
+            summary["backends"] = {}
+            for backend in args.backends:
+                task = {
+                    "backend": backend,
+                    "params": params[backend],
+                    "stores_dir": stores_dir,
+                    "doc_types": args.doc_types,
+                    "k": args.k,
+                    "threads": args.threads,
+                    "warmup": args.warmup,
+                    "queries": run["queries"],
+                    "query_vectors": run["query_vectors"],
+                    "truth": run["truth"],
+                }
+                # A fresh interpreter per backend: no shared caches, and ru_maxrss is the backend's own.
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                    try:
+                        result = pool.submit(measure_backend, task).result()
+                    except Exception as e:
+                        result = {"error": f"{type(e).__name__}: {e}"}
+                summary["backends"][backend] = result
+                latency = result.get("latency_ms", {})
+                print(
+                    f"[bench] {size:>8} {backend:<20} load {result.get('cold_load_s', '-')}s "
+                    f"p50 {latency.get('p50', '-')}ms p99 {latency.get('p99', '-')}ms "
+                    f"recall {result.get(f'recall_at_{args.k}', result.get('error'))}",
+                    flush=True,
+                )
+            report["runs"].append(summary)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    write_report(report, args.output)
+    print(f"[bench] results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Synthetic French legal corpus for the benchmarks.
+
+Chunks read like the articles of the ingested codes and laws and carry the
+metadata the ingestion pipeline writes (source, page, page_label, title,
+doc_type, year, simhash). Each synthetic file covers a couple of legal topics,
+and every query is derived from one chunk, so lexical and dense backends both
+have relevant chunks to find.
+
+`HashingEmbeddings` is a deterministic, model-free embedder (signed feature
+hashing of words and word bigrams): a 100k-chunk corpus embeds in seconds and
+the latency numbers measure the indexes rather than the embedding model.
+"""
+import hashlib
+import math
+import random
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+from langchain.embeddings.base import Embeddings
+
+from utils.helpers import DOC_TYPES_DICT
+from utils.text_processing import simhash_hex, split_sentences, tokenize
+
+SUBJECTS = [
+    "L'employeur", "Le titulaire du permis", "Le bailleur", "Le preneur", "L'administration fiscale",
+    "Le ministre chargé des mines", "Tout contribuable", "Le juge", "L'État", "La société commerciale",
+    "Le concessionnaire", "Le notaire", "Le conservateur de la propriété foncière", "Le salarié",
+    "L'exploitant", "Le maire", "L'assureur", "Le créancier", "Le débiteur", "L'importateur",
+]
+VERBS = [
+    "est tenu de respecter", "doit déclarer", "peut céder", "assure", "garantit", "supporte",
+    "notifie", "exécute", "peut contester", "doit publier", "est responsable de", "peut suspendre",
+]
+AUTHORITIES = [
+    "du ministre compétent", "de l'autorité de régulation", "de la direction générale des impôts",
+    "du conservateur de la propriété foncière", "de l'inspection du travail", "du préfet",
+    "de la commission nationale des marchés publics", "de l'administration des douanes",
+]
+COURTS = [
+    "le tribunal de première instance", "la cour d'appel", "la Cour suprême", "le tribunal du travail",
+    "la chambre administrative", "le tribunal de commerce", "la Cour des comptes",
+]
+DELAYS = ["huit jours", "quinze jours", "trente jours", "deux mois", "trois mois", "six mois", "un an", "cinq ans"]
+ROOTS = [
+    "le bail", "la cession", "la concession", "l'hypothèque", "le licenciement", "le préavis", "la redevance",
+    "la taxe", "le permis", "la servitude", "la succession", "le dividende", "le marché public",
+    "le contrat de travail", "l'expropriation", "la prescription", "la garantie", "le nantissement",
+    "la faillite", "le titre foncier", "l'amende", "la patente", "le dédouanement", "l'agrément",
+    "la licence", "le recours", "la saisie", "l'astreinte", "la caution", "la transaction",
+    "le cadastre", "la subvention", "l'indemnité", "la cotisation", "la retraite", "le congé",
+    "la mutation", "l'usufruit", "la copropriété", "le forage",
+]
+DOMAINS = [
+    "foncière", "minière", "fiscale", "douanière", "commerciale", "pénale", "sociale", "forestière",
+    "pétrolière", "maritime", "environnementale", "bancaire", "électorale", "sanitaire", "agricole",
+    "administrative",
+]
+TEMPLATES = [
+    "{subject} {verb} {term} dans un délai de {delay} à compter de la notification.",
+    "Sous réserve des dispositions de l'article {ref}, {term} est soumis à l'autorisation préalable {authority}.",
+    "Toute infraction aux dispositions relatives à {term} est punie d'une amende de {amount} francs CFA.",
+    "Les modalités d'application relatives à {term} sont fixées par décret pris en Conseil des ministres.",
+    "{subject} peut saisir {court} de toute contestation portant sur {term}.",
+    "L'acte relatif à {term} doit être constaté par écrit et enregistré auprès {authority}.",
+    "{subject} {verb} les obligations nées de {term} ainsi que celles relatives à {other}.",
+    "En cas de manquement, {term} est suspendu jusqu'à la décision {authority}.",
+    "Le délai de recours contre {term} est de {delay} devant {court}.",
+]
+QUERY_TEMPLATES = [
+    "Que prévoit la loi concernant {words} ?",
+    "Quelles sont les règles applicables à {words} ?",
+    "Quel est le régime juridique de {words} ?",
+    "{words}",
+]
+TITLES = {
+    "Code": "Code", "Arrétés": "Arrêté", "Loi": "Loi", "Circulaire": "Circulaire",
+    "Autres": "Texte", "Décret": "Décret", "Arrets": "Arrêt",
+}
+MONTHS = [
+    "janvier", "février", "mars", "avril", "mai", "juin",
+    "juillet", "août", "septembre", "octobre", "novembre", "décembre",
+]
+STOPWORDS = {
+    "le", "la", "les", "de", "des", "du", "un", "une", "et", "à", "au", "aux", "en", "est", "sont", "par",
+    "pour", "dans", "sur", "que", "qui", "ainsi", "celles", "toute", "tout", "peut", "doit", "être", "d",
+    "l", "cas", "compter", "relatives", "relatif", "relatifs", "relative", "auprès", "devant", "contre", "matière",
+}
+
+
+@dataclass
+class SyntheticDocument:
+    """Chunks of one synthetic source file, as `extract_chunks` would return them"""
+    relative_path: str
+    doc_type: str
+    contents: List[str]
+    metadatas: List[Dict[str, Any]]
+
+
+def _term(rng: random.Random) -> str:
+    return f"{rng.choice(ROOTS)} en matière {rng.choice(DOMAINS)}"
+
+
+def _sentence(rng: random.Random, topics: List[str]) -> str:
+    # Most sentences are on the file's topics, some wander off like real articles do.
+    term = rng.choice(topics) if rng.random() < 0.75 else _term(rng)
+    return rng.choice(TEMPLATES).format(
+        subject=rng.choice(SUBJECTS),
+        verb=rng.choice(VERBS),
+        term=term,
+        other=_term(rng),
+        delay=rng.choice(DELAYS),
+        authority=rng.choice(AUTHORITIES),
+        court=rng.choice(COURTS),
+        ref=f"L.{rng.randint(1, 900)}",
+        amount=f"{rng.randint(1, 500) * 10000:,}".replace(",", " "),
+    )
+
+
+def generate_corpus(
+    num_chunks: int,
+    doc_types: List[str],
+    chunks_per_file: int = 40,
+    seed: int = 0,
+) -> List[SyntheticDocument]:
+    """`num_chunks` article-like chunks spread over files of `doc_types`, reproducible from `seed`."""
+    rng = random.Random(seed)
+    documents: List[SyntheticDocument] = []
+    file_number = 0
+    remaining = num_chunks
+    while remaining > 0:
+        doc_type = doc_types[file_number % len(doc_types)]
+        year = rng.randint(1960, 2024)
+        topics = [_term(rng) for _ in range(rng.randint(2, 4))]
+        title = (
+            f"{TITLES.get(doc_type, 'Texte')} n° {year}-{rng.randint(1, 999):03d} du {rng.randint(1, 28)} "
+            f"{rng.choice(MONTHS)} {year} sur {topics[0]}"
+        )
+        relative_path = f"{DOC_TYPES_DICT[doc_type]}/synthetic_{file_number:06d}.pdf"
+        count = min(chunks_per_file, remaining)
+        contents: List[str] = []
+        metadatas: List[Dict[str, Any]] = []
+        for position in range(count):
+            article = f"Article {position + 1} : " + " ".join(_sentence(rng, topics) for _ in range(rng.randint(3, 6)))
+            contents.append(article)
+            metadatas.append({
+                "source": f"data/01_raw/{relative_path}",
+                "page": position // 3,
+                "page_label": str(position // 3 + 1),
+                "metadata": title,
+                "doc_type": doc_type,
+                "year": year,
+                "simhash": simhash_hex(article),
+            })
+        documents.append(SyntheticDocument(relative_path, doc_type, contents, metadatas))
+        remaining -= count
+        file_number += 1
+    return documents
+
+
+def generate_queries(documents: List[SyntheticDocument], num_queries: int, seed: int = 0) -> List[str]:
+    """Distinct questions, each built from the content words of one sentence of a random chunk."""
+    rng = random.Random(seed + 1)
+    chunks = [content for document in documents for content in document.contents]
+    queries: List[str] = []
+    seen = set()
+    for _ in range(num_queries * 20):
+        if len(queries) == num_queries or not chunks:
+            break
+        sentence = rng.choice(split_sentences(rng.choice(chunks))[1:] or [""])
+        words = [word for word in tokenize(sentence) if word not in STOPWORDS and len(word) > 2]
+        if len(words) < 3:
+            continue
+        start = rng.randint(0, max(0, len(words) - 4))
+        query = rng.choice(QUERY_TEMPLATES).format(words=" ".join(words[start:start + rng.randint(3, 6)]))
+        if query not in seen:
+            seen.add(query)
+            queries.append(query)
+    return queries
+
+
+class HashingEmbeddings(Embeddings):
+    """Unit-length signed feature hashing of word unigrams and bigrams (sublinear term frequency)."""
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+        self._buckets: Dict[str, Tuple[int, float]] = {}
+
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        bucket = self._buckets.get(feature)
+        if bucket is None:
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+            bucket = (digest % self.dimension, 1.0 if digest >> 63 else -1.0)
+            self._buckets[feature] = bucket
+        return bucket
+
+    def _embed(self, text: str) -> List[float]:
+        tokens = tokenize(text)
+        counts: Dict[str, int] = {}
+        for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            counts[feature] = counts.get(feature, 0) + 1
+        vector = [0.0] * self.dimension
+        for feature, count in counts.items():
+            index, sign = self._bucket(feature)
+            vector[index] += sign * (1.0 + math.log(count))
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class PrecomputedEmbeddings(Embeddings):
+    """Serves query vectors computed up front, so measured latency excludes the embedding model."""
+
+    def __init__(self, vectors: Dict[str, List[float]]):
+        self.vectors = vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        try:
+            return self.vectors[text]
+        except KeyError:
+            raise ValueError(f"No precomputed embedding for query {text!r}") from None
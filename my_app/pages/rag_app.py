@@ -4,8 +4,13 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 from components.sidebar import sidebar_config
 from components.display import render_chat_history, append_message
-from services.query_processor import process_query
+from services.query_processor import cited_page_previews, process_query_stream, format_response
 from config.load_env_variable import init_env_variables
+from utils.logger import configure_logging
+from utils.metrics import start_metrics_server
+
+configure_logging()
+start_metrics_server()
 
 # Page configuration
 st.set_page_config(
@@ -158,9 +163,9 @@ def main():
             st.markdown(prompt)
 
         with st.chat_message("assistant"):
-            with st.spinner("Recherche dans les documents juridiques..."):
-                try:
-                    response = process_query(
+            try:
+                with st.spinner("Recherche dans les documents juridiques..."):
+                    answer_stream, sources_formatted, sources = process_query_stream(
                         prompt,
                         config["doc_types"],
                         config["retriever_type"],
@@ -169,12 +174,29 @@ def main():
                         config["end_year"],
                         config["max_results"]
                     )
-                    st.markdown(response)
-                    append_message("assistant", response)
-                except Exception as e:
-                    error_msg = f"❌ Désolé, une erreur s'est produite : {str(e)}"
-                    st.error(error_msg)
-                    append_message("assistant", error_msg)
+                # Sources are known before generation starts: render them below the
+                # answer placeholder so they are readable while the answer streams in.
+                st.markdown("**Response Based on Retrieved Context:**")
+                answer_container = st.container()
+                with st.expander("Retrieved Chunks", expanded=False):
+                    st.markdown(sources_formatted)
+                with answer_container:
+                    answer = st.write_stream(answer_stream)
+                previews = cited_page_previews(sources)
+                if previews:
+                    with st.expander("Pages citées", expanded=False):
+                        for preview in previews:
+                            caption = f"{preview.file_name}, page {preview.page_index + 1}"
+                            if preview.media_type.startswith("image/"):
+                                st.image(preview.path, caption=caption)
+                            else:
+                                st.caption(caption)
+                                st.text(preview.text())
+                append_message("assistant", format_response(answer, sources_formatted))
+            except Exception as e:
+                error_msg = f"❌ Désolé, une erreur s'est produite : {str(e)}"
+                st.error(error_msg)
+                append_message("assistant", error_msg)
 
 def check_environment():
     """Check if required environment variables are set"""
@@ -0,0 +1,536 @@
+"""Process-wide caches shared by every Streamlit session."""
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+from utils.logger import span
+
+RETRIEVER_CACHE_MAX_BYTES = int(os.getenv("RETRIEVER_CACHE_MAX_BYTES", str(4 * 1024 ** 3)))
+RETRIEVER_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVER_CACHE_MAX_ENTRIES", "32"))
+SHARD_CACHE_MAX_BYTES = int(os.getenv("SHARD_CACHE_MAX_BYTES", str(4 * 1024 ** 3)))
+SHARD_CACHE_MAX_ENTRIES = int(os.getenv("SHARD_CACHE_MAX_ENTRIES", "32"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+# Set to an empty string to keep the query-embedding cache in memory only.
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/cache/query_embeddings.sqlite")
+RERANK_CACHE_MAX_ENTRIES = int(os.getenv("RERANK_CACHE_MAX_ENTRIES", "50000"))
+# Set ANSWER_CACHE_MAX_ENTRIES to 0 to disable the semantic answer cache.
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+# Written by the ingestion pipeline after every rebuild; its mtime versions the indexes.
+INDEX_MANIFEST_PATH = os.getenv("INDEX_MANIFEST_PATH", "data/vector_stores/manifest.json")
+
+
+@dataclass
+class CacheEntry:
+    """A loaded object together with its bookkeeping"""
+    value: Any
+    size_bytes: int
+    load_time: float
+    loaded_at: float
+    hits: int = 0
+
+
+def _file_generation(path: Optional[str]) -> Optional[int]:
+    """Modification time of `path` (the index manifest), None if unset or missing."""
+    if not path:
+        return None
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class IndexCache:
+    """
+    Thread-safe LRU cache for loaded indexes and retrievers.
+
+    Entries are evicted least-recently-used first once the estimated memory of
+    all entries exceeds `max_bytes` or there are more than `max_entries` of them.
+    Concurrent requests for the same missing key load it only once. Everything is
+    dropped when the index manifest at `generation_path` changes, so rebuilt
+    indexes are picked up without a restart.
+    """
+
+    def __init__(self, name: str, max_bytes: int, max_entries: int, generation_path: Optional[str] = None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.generation_path = generation_path
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._loading: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self._generation = _file_generation(generation_path)
+
+    def _check_generation(self):
+        """Drop every entry if the indexes were rebuilt since the last lookup. Caller holds the lock."""
+        generation = _file_generation(self.generation_path)
+        if generation != self._generation:
+            if self._entries:
+                logging.info(f"[{self.name}] indexes rebuilt, dropping {len(self._entries)} entries")
+            self._entries.clear()
+            self._total_bytes = 0
+            self._generation = generation
+
+    def _lookup(self, key: Hashable) -> Optional[CacheEntry]:
+        """Return the entry for `key` and mark it as recently used. Caller holds the lock."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            entry.hits += 1
+        return entry
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        size_fn: Optional[Callable[[Any], int]] = None,
+    ) -> Any:
+        """Return the cached value for `key`, calling `loader` once if it is missing."""
+        with self._lock:
+            self._check_generation()
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry.value
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._lookup(key)
+                if entry is not None:
+                    return entry.value
+                generation = self._generation
+            released = False
+            try:
+                with span("index_load", cache=self.name, key=str(key)) as load_span:
+                    start = time.perf_counter()
+                    value = loader()
+                    load_time = time.perf_counter() - start
+                    size_bytes = size_fn(value) if size_fn is not None else 0
+                    load_span.set(bytes=size_bytes)
+
+                # Insert and release the loading slot together: a thread arriving in
+                # between would otherwise find neither and load the index again.
+                with self._lock:
+                    self._check_generation()
+                    # Loaded while the indexes were being rebuilt: served once, not cached.
+                    if self._generation == generation:
+                        self._entries[key] = CacheEntry(
+                            value=value,
+                            size_bytes=size_bytes,
+                            load_time=load_time,
+                            loaded_at=time.time(),
+                        )
+                        self._total_bytes += size_bytes
+                        self._evict()
+                    self._loading.pop(key, None)
+                    released = True
+            finally:
+                if not released:
+                    with self._lock:
+                        self._loading.pop(key, None)
+            logging.info(
+                f"[{self.name}] loaded {key} in {load_time:.2f}s "
+                f"(~{size_bytes / 1024 ** 2:.1f} MB, total ~{self._total_bytes / 1024 ** 2:.1f} MB)"
+            )
+            return value
+
+    def _evict(self):
+        """Drop least-recently-used entries until the cache fits its bounds. Caller holds the lock."""
+        while len(self._entries) > 1 and (
+            self._total_bytes > self.max_bytes or len(self._entries) > self.max_entries
+        ):
+            key, entry = self._entries.popitem(last=False)
+            self._total_bytes -= entry.size_bytes
+            logging.info(f"[{self.name}] evicted {key} (~{entry.size_bytes / 1024 ** 2:.1f} MB)")
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None):
+        """Drop every entry whose key matches `predicate`, or all entries when it is None."""
+        with self._lock:
+            for key in [k for k in self._entries if predicate is None or predicate(k)]:
+                self._total_bytes -= self._entries.pop(key).size_bytes
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-entry memory, load time and hit counts, most recently used last."""
+        with self._lock:
+            return [
+                {
+                    "key": key,
+                    "size_bytes": entry.size_bytes,
+                    "load_time": entry.load_time,
+                    "age": time.time() - entry.loaded_at,
+                    "hits": entry.hits,
+                }
+                for key, entry in self._entries.items()
+            ]
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _freeze(value: Any) -> Hashable:
+    """Turn nested params (dicts, lists) into a hashable, order-independent value."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def make_retriever_key(
+    retriever_type: str,
+    doc_types: Iterable[str],
+    params: Dict[str, Any],
+    load_params: Iterable[str] = (),
+) -> Tuple[Hashable, ...]:
+    """Cache key for a retriever: its type, the sorted doc types and the params that affect loading."""
+    relevant = {name: params[name] for name in load_params if name in params}
+    return (retriever_type, tuple(sorted(set(doc_types))), _freeze(relevant))
+
+
+RETRIEVER_CACHE = IndexCache(
+    "retriever_cache", RETRIEVER_CACHE_MAX_BYTES, RETRIEVER_CACHE_MAX_ENTRIES, INDEX_MANIFEST_PATH
+)
+# Per-doc-type index shards, shared by every retriever that selects that doc type.
+SHARD_CACHE = IndexCache("shard_cache", SHARD_CACHE_MAX_BYTES, SHARD_CACHE_MAX_ENTRIES, INDEX_MANIFEST_PATH)
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form of a query: NFC, lowercase, single spaces (MiniLM's tokenizer is uncased)."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip().lower()
+
+
+class EmbeddingCache:
+    """
+    LRU cache of query embeddings keyed by (model name, normalized text).
+
+    When `path` is set, every embedding is also written to a SQLite file so the cache
+    survives restarts; memory misses fall back to it before recomputing.
+    """
+
+    def __init__(self, max_entries: int, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.path = path
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        return hashlib.sha1(f"{model_name}\0{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Open the on-disk store lazily. Caller holds the lock."""
+        if self._db is None and self.path:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(self.path, check_same_thread=False)
+                self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+            except sqlite3.Error as e:
+                logging.warning(f"Embedding cache disabled on disk ({self.path}): {e}")
+                self.path = None
+        return self._db
+
+    def _remember(self, key: str, vector: List[float]):
+        """Insert into the LRU. Caller holds the lock."""
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+            db = self._connection()
+            row = db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone() if db else None
+            if row is None:
+                self.misses += 1
+                return None
+            vector = array("f", row[0]).tolist()
+            self._remember(key, vector)
+            self.disk_hits += 1
+            return vector
+
+    def put(self, key: str, vector: List[float]):
+        with self._lock:
+            self._remember(key, vector)
+            db = self._connection()
+            if db is not None:
+                db.execute("INSERT OR REPLACE INTO embeddings VALUES (?, ?)", (key, array("f", vector).tobytes()))
+                db.commit()
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """Insert several embeddings with a single commit of the on-disk store."""
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+            db = self._connection()
+            if db is not None and items:
+                db.executemany(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                    [(key, array("f", vector).tobytes()) for key, vector in items.items()],
+                )
+                db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves repeated queries from an EmbeddingCache."""
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: "EmbeddingCache"):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+        self._pending: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.cache.make_key(self.model_name, text)
+        # Concurrent backends of an ensemble ask for the same query: embed it only once.
+        with self._lock:
+            key_lock = self._pending.setdefault(key, threading.Lock())
+        try:
+            with key_lock, span("query_embedding") as embed_span:
+                vector = self.cache.get(key)
+                embed_span.set(cached=vector is not None)
+                if vector is None:
+                    vector = self.embeddings.embed_query(text)
+                    self.cache.put(key, vector)
+                return vector
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed many queries at once: cached ones are looked up, the rest go to the model in one batch.
+
+        Query and document embeddings are the same for the supported (symmetric) models, so the
+        misses go through `embed_documents`, which encodes them as one padded batch.
+        """
+        keys = [self.cache.make_key(self.model_name, text) for text in texts]
+        with span("query_embedding", items=len(texts)) as embed_span:
+            vectors: Dict[str, List[float]] = {}
+            missing: Dict[str, str] = {}
+            for key, text in zip(keys, texts):
+                if key in vectors or key in missing:
+                    continue
+                vector = self.cache.get(key)
+                if vector is None:
+                    missing[key] = text
+                else:
+                    vectors[key] = vector
+            if missing:
+                computed = dict(zip(missing, self.embeddings.embed_documents(list(missing.values()))))
+                self.cache.put_many(computed)
+                vectors.update(computed)
+            embed_span.set(cached=len(vectors) - len(missing), computed=len(missing))
+        return [vectors[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Documents are embedded once at ingest time and are not worth caching."""
+        return self.embeddings.embed_documents(texts)
+
+
+EMBEDDING_CACHE = EmbeddingCache(EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_PATH or None)
+
+
+class ScoreCache:
+    """LRU cache of cross-encoder scores keyed by (normalized query, chunk id)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(query: str, chunk_id: str) -> Tuple[str, str]:
+        return (normalize_query(query), chunk_id)
+
+    def get_many(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                score = self._entries.get(key)
+                if score is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                found[key] = score
+        return found
+
+    def put_many(self, scores: Dict[Tuple[str, str], float]):
+        with self._lock:
+            self._entries.update(scores)
+            for key in scores:
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+RERANK_SCORE_CACHE = ScoreCache(RERANK_CACHE_MAX_ENTRIES)
+
+
+@dataclass
+class AnswerEntry:
+    """A cached answer and the normalized embedding of the query that produced it"""
+    scope: Hashable
+    vector: np.ndarray
+    value: Any
+    created_at: float
+
+
+def make_answer_scope(
+    retriever_type: str,
+    doc_types: Iterable[str],
+    start_year: Optional[int],
+    end_year: Optional[int],
+    max_results: int,
+    params: Dict[str, Any],
+) -> Tuple[Hashable, ...]:
+    """Everything besides the query wording that changes an answer: only answers within a scope are shared."""
+    return (retriever_type, tuple(sorted(set(doc_types))), start_year, end_year, max_results, _freeze(params))
+
+
+class AnswerCache:
+    """
+    Semantic cache of RAG answers.
+
+    A lookup hits when a cached answer of the same scope was produced for a query whose
+    embedding has cosine similarity >= `threshold` with the new one, so rephrasings such as
+    "délai de préavis licenciement" / "préavis de licenciement délai" share one answer.
+    Entries expire after `ttl` seconds, the least recently used are evicted beyond
+    `max_entries`, and everything is dropped when the index manifest at
+    `generation_path` changes (indexes rebuilt by the ingestion pipeline).
+    """
+
+    def __init__(self, max_entries: int, ttl: float, threshold: float, generation_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.generation_path = generation_path
+        self._entries: "OrderedDict[int, AnswerEntry]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._generation = _file_generation(generation_path)
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _check_generation(self):
+        """Drop every answer if the indexes were rebuilt since the last lookup. Caller holds the lock."""
+        generation = _file_generation(self.generation_path)
+        if generation != self._generation:
+            if self._entries:
+                logging.info(f"[answer_cache] indexes rebuilt, dropping {len(self._entries)} answers")
+                self.invalidations += 1
+            self._entries.clear()
+            self._generation = generation
+
+    @staticmethod
+    def _normalize(vector: Iterable[float]) -> np.ndarray:
+        values = np.asarray(vector, dtype=np.float32)
+        return values / max(float(np.linalg.norm(values)), 1e-12)
+
+    def get(self, vector: Iterable[float], scope: Hashable) -> Optional[Any]:
+        """Best cached answer of `scope` above the similarity threshold, or None."""
+        if not self.enabled:
+            return None
+        query = self._normalize(vector)
+        now = time.time()
+        with self._lock:
+            self._check_generation()
+            for entry_id in [i for i, e in self._entries.items() if now - e.created_at > self.ttl]:
+                del self._entries[entry_id]
+                self.expired += 1
+            # A linear scan is fine at this size: a thousand 384-d dot products take well under a millisecond.
+            candidates = [(entry_id, entry) for entry_id, entry in self._entries.items() if entry.scope == scope]
+            if candidates:
+                similarities = np.stack([entry.vector for _, entry in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id, entry = candidates[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return entry.value
+            self.misses += 1
+            return None
+
+    def put(self, vector: Iterable[float], scope: Hashable, value: Any):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._check_generation()
+            self._entries[self._next_id] = AnswerEntry(scope, self._normalize(vector), value, time.time())
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+ANSWER_CACHE = AnswerCache(ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL, ANSWER_CACHE_THRESHOLD, INDEX_MANIFEST_PATH)
@@ -1,73 +1,238 @@
-""" Sends the documents binary"""
-from .rag_service.models import SearchResult
-import os
+""" Sends the documents binary
+
+Les PDF sources sont servis à la demande : le chemin de chaque source est résolu
+une seule fois, les fichiers ouverts sont mappés en mémoire (mmap) et gardés
+dans un petit LRU, et seul l'extrait des pages citées (`page_label`) est joint
+au SearchResult. La mémoire par requête ne dépend donc plus de la taille des PDF.
+"""
+import hashlib
+import io
 import logging
-from typing import Any
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
 
-class DocumentFinder:
+from .rag_service.models import SearchResult
+
+# Directories the part of a source after "01_raw" is looked up in, first match wins.
+DOCUMENT_ROOTS = os.getenv("DOCUMENT_ROOTS", os.pathsep.join(["data/01_raw", "data"]))
+DOCUMENT_CACHE_SIZE = int(os.getenv("DOCUMENT_CACHE_SIZE", "8"))
+RAW_DIR_MARKER = "01_raw"
+
+
+@lru_cache(maxsize=4096)
+def resolve_source(source: str, roots: str = DOCUMENT_ROOTS) -> Optional[str]:
     """
-    Enrichit un SearchResult avec les PDF binaires des documents les plus pertinents.
+    Chemin local d'une source telle qu'enregistrée dans les métadonnées des chunks.
+
+    Les sources ingérées sur une autre machine (chemins Windows, autre racine) sont
+    ramenées à leur partie après `01_raw`. Le résultat est mis en cache : un fichier
+    ajouté après coup demande `resolve_source.cache_clear()`.
     """
-    def __init__(self, search_result: list[SearchResult], num_of_docs: int = 3):
-        self.search_result = search_result
-        self.num_of_docs = num_of_docs
-        self.selected_docs = []
-        self.cleaned_paths: list[dict[str, Any]] = []
-        self.base_path : str = "data"
+    if not source:
+        return None
+    normalized = source.replace("\\", "/")
+    if os.path.isfile(normalized):
+        return os.path.abspath(normalized)
+    if RAW_DIR_MARKER not in normalized:
+        return None
+    relative = normalized.split(RAW_DIR_MARKER, 1)[1].lstrip("/")
+    for root in roots.split(os.pathsep):
+        candidate = os.path.join(root, relative)
+        if os.path.isfile(candidate):
+            return os.path.abspath(candidate)
+    return None
 
-    def _extract_top_docs(self):
-        """
-        Extrait les `num_of_docs` premiers documents (nom + chemin) depuis les métadonnées.
-        Doit trouver les documents à enrichir.
-        """
-        docs = []
-        for result in self.search_result:
-            doc_title = result.metadata.get("source", [])
-            docs.append(doc_title)
-        self.selected_docs = docs[:self.num_of_docs]  
-        return self.selected_docs
-
-    def _resolve_paths(self):
-        """
-        Ajoute les chemins absolus à chaque document sélectionné.
-        """
-        for full_path in self.selected_docs:
 
-            normalized_path = full_path.replace("\\", "/")
+class PdfHandle:
+    """
+    Un PDF ouvert et mappé en mémoire.
 
-            end_path = normalized_path.split("01_raw")[1].lstrip("/")
-            corrected_path = os.path.join(self.base_path, end_path)
+    Les pages ne sont lues (par le cache de pages de l'OS) que lorsqu'elles sont
+    extraites ; l'analyse de la table xref est faite une fois par handle.
+    """
 
-            if not os.path.exists(corrected_path):
-                logging.warning(f"Fichier non trouvé : {corrected_path}")
-                continue
+    def __init__(self, path: str):
+        self.path = path
+        self.size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            # mmap keeps its own reference to the file, the descriptor can be closed.
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self._reader = None
+        self._sha256: Optional[str] = None
+        self._lock = threading.Lock()
 
-            self.cleaned_paths.append({
-                "file_name": os.path.basename(corrected_path),
-                "resolved_path": corrected_path
-            })
+    def _pdf(self):
+        """pypdf reader over the mapping. Caller holds the lock."""
+        if self._reader is None:
+            from pypdf import PdfReader
 
-        return self.cleaned_paths
+            if self._map is None:
+                raise ValueError(f"Empty PDF: {self.path}")
+            self._reader = PdfReader(self._map)
+        return self._reader
+
+    def read(self) -> bytes:
+        """Le fichier complet, copié uniquement sur demande explicite."""
+        return self._map[:] if self._map is not None else b""
+
+    def sha256(self) -> str:
+        """Empreinte du contenu, calculée une fois par handle (clé des caches de pages)."""
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self._map if self._map is not None else b"").hexdigest()
+        return self._sha256
+
+    def page_count(self) -> int:
+        with self._lock:
+            return len(self._pdf().pages)
+
+    def page_index(self, page_label: Optional[str], page: Optional[int] = None) -> Optional[int]:
+        """Index (0-based) de la page citée, par libellé d'abord, puis par numéro."""
+        with self._lock:
+            reader = self._pdf()
+            if page_label is not None:
+                try:
+                    labels = list(reader.page_labels)
+                except Exception:
+                    labels = []
+                if str(page_label) in labels:
+                    return labels.index(str(page_label))
+            if page is not None and 0 <= int(page) < len(reader.pages):
+                return int(page)
+            if page_label is not None and str(page_label).isdigit() and 0 < int(page_label) <= len(reader.pages):
+                return int(page_label) - 1
+        return None
+
+    def page_text(self, index: int) -> str:
+        with self._lock:
+            return self._pdf().pages[index].extract_text() or ""
+
+    def extract_pages(self, indexes: List[int]) -> bytes:
+        """Un PDF autonome contenant seulement les pages `indexes`."""
+        from pypdf import PdfWriter
+
+        with self._lock:
+            reader = self._pdf()
+            writer = PdfWriter()
+            for index in indexes:
+                writer.add_page(reader.pages[index])
+            buffer = io.BytesIO()
+            writer.write(buffer)
+        return buffer.getvalue()
+
+
+@dataclass(frozen=True)
+class DocumentRef:
+    """Référence légère vers un PDF source et la page citée, servie à la demande."""
+    path: str
+    page_label: Optional[str] = None
+    page: Optional[int] = None
+    store: Optional["DocumentStore"] = field(default=None, compare=False, repr=False)
+
+    @property
+    def file_name(self) -> str:
+        return os.path.basename(self.path)
+
+    def open(self) -> PdfHandle:
+        return (self.store or DOCUMENT_STORE).open(self.path)
+
+    def read(self) -> bytes:
+        """Le PDF complet (à réserver au téléchargement explicite)."""
+        return self.open().read()
+
+    def excerpt(self, context_pages: int = 0) -> Optional[bytes]:
+        """Les pages citées (± `context_pages`) en PDF, ou None si la page est introuvable."""
+        handle = self.open()
+        index = handle.page_index(self.page_label, self.page)
+        if index is None:
+            return None
+        last = handle.page_count() - 1
+        pages = list(range(max(0, index - context_pages), min(last, index + context_pages) + 1))
+        return handle.extract_pages(pages)
+
+
+class DocumentStore:
+    """LRU des PDF récemment ouverts, partagé par toutes les requêtes."""
+
+    def __init__(self, max_open: int = DOCUMENT_CACHE_SIZE):
+        self.max_open = max_open
+        self._handles: "OrderedDict[str, PdfHandle]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, path: str) -> PdfHandle:
+        with self._lock:
+            handle = self._handles.get(path)
+            if handle is not None:
+                self._handles.move_to_end(path)
+                return handle
+        handle = PdfHandle(path)
+        with self._lock:
+            # Another thread may have opened it meanwhile; keep a single handle per file.
+            handle = self._handles.setdefault(path, handle)
+            self._handles.move_to_end(path)
+            while len(self._handles) > self.max_open:
+                # Not closed explicitly: a request may still be reading it, the mapping goes with the last reference.
+                self._handles.popitem(last=False)
+        return handle
+
+    def reference(self, metadata: Dict[str, Any]) -> Optional[DocumentRef]:
+        """DocumentRef de la source d'un chunk, si le fichier est disponible localement."""
+        path = resolve_source(str(metadata.get("source") or ""))
+        if path is None:
+            return None
+        page = metadata.get("page")
+        return DocumentRef(
+            path,
+            str(metadata["page_label"]) if metadata.get("page_label") is not None else None,
+            int(page) if str(page).isdigit() else None,
+            store=self,
+        )
+
+    def clear(self):
+        with self._lock:
+            self._handles.clear()
+
+
+DOCUMENT_STORE = DocumentStore()
+
+
+class DocumentFinder:
+    """
+    Enrichit un SearchResult avec les pages citées des documents les plus pertinents.
+
+    Chaque résultat retenu reçoit une `DocumentRef` vers son PDF (`result.document`,
+    le fichier complet reste servi à la demande) et, dans `binary`, l'extrait PDF
+    de la seule page citée.
+    """
+    def __init__(self, search_result: list[SearchResult], num_of_docs: int = 3, store: DocumentStore = DOCUMENT_STORE):
+        self.search_result = search_result
+        self.num_of_docs = num_of_docs
+        self.store = store
+
+    def _extract_top_docs(self) -> list[SearchResult]:
+        """Les `num_of_docs` premiers résultats, ceux à enrichir."""
+        return self.search_result[:self.num_of_docs]
+
+    def _attach(self, result: SearchResult):
+        ref = self.store.reference(result.metadata)
+        if ref is None:
+            logging.warning(f"Fichier non trouvé : {result.metadata.get('source')}")
+            return
+        result.document = ref
+        try:
+            result.binary = ref.excerpt()
+        except Exception as e:
+            logging.error(f"Erreur lecture {ref.path}: {e}")
+            result.binary = None
 
-    def _add_pdf_binaries_to_metadata(self):
-        """
-        Lit les fichiers PDF et les ajoute dans le champ "pdf_binary".
-        """
-        for doc, result in zip(self.cleaned_paths, self.search_result):
-            path = doc["resolved_path"]
-            try:
-                with open(path, "rb") as f:
-                    doc["pdf_binary"] = f.read()
-            except Exception as e:
-                logging.error(f"Erreur lecture {path}: {e}")
-                doc["pdf_binary"] = None
-
-            result.binary = doc["pdf_binary"]
-        return self.search_result
     def enrich_search_result(self) -> list[SearchResult]:
         """
-        Full pipeline: extract top docs, resolve paths, read binaries, and update metadata.
+        Full pipeline: select the top docs, resolve their paths once, attach the cited pages.
         """
-        self._extract_top_docs()
-        self._resolve_paths()
-        return self._add_pdf_binaries_to_metadata()
\ No newline at end of file
+        for result in self._extract_top_docs():
+            self._attach(result)
+        return self.search_result
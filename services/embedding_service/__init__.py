@@ -0,0 +1,19 @@
+"""ONNX embedding and cross-encoder backends, imported lazily so that importing one does not load onnxruntime and transformers for both."""
+import importlib
+from typing import Any
+
+_EXPORTS = {
+    "OnnxEmbeddings": ".onnx_embeddings",
+    "export_onnx_model": ".onnx_embeddings",
+    "OnnxCrossEncoder": ".cross_encoder",
+    "TorchCrossEncoder": ".cross_encoder",
+    "build_cross_encoder": ".cross_encoder",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
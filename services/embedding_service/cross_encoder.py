@@ -0,0 +1,88 @@
+"""
+Cross-encoder relevance scoring of (query, passage) pairs on CPU.
+
+Two backends with the same `predict` interface:
+    torch  sentence-transformers CrossEncoder
+    onnx   the same model exported to ONNX (int8 by default) and run by onnxruntime
+The default model is a multilingual MiniLM trained on mMARCO, so French queries
+and passages are scored directly.
+"""
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+RERANK_MODEL_NAME = os.getenv("RERANK_MODEL_NAME", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "torch")
+
+
+class TorchCrossEncoder:
+    """sentence-transformers CrossEncoder, pinned to CPU."""
+
+    def __init__(self, model_name: str = RERANK_MODEL_NAME, num_threads: Optional[int] = None, max_length: int = 512):
+        import torch
+        from sentence_transformers import CrossEncoder
+
+        if num_threads:
+            # Process-wide setting: it also applies to the torch embedding model.
+            torch.set_num_threads(num_threads)
+        self.model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+
+    def predict(self, pairs: Sequence[Tuple[str, str]]) -> np.ndarray:
+        return np.asarray(self.model.predict(list(pairs), batch_size=len(pairs), show_progress_bar=False), dtype=np.float32)
+
+
+class OnnxCrossEncoder:
+    """Cross-encoder run by onnxruntime on CPU, optionally int8-quantized."""
+
+    def __init__(
+        self,
+        model_name: str = RERANK_MODEL_NAME,
+        cache_dir: Optional[str] = None,
+        quantize: bool = True,
+        num_threads: Optional[int] = None,
+        max_length: int = 512,
+    ):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        from .onnx_embeddings import ONNX_MODEL_DIR, export_onnx_model
+
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = num_threads or 0
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            export_onnx_model(model_name, cache_dir or ONNX_MODEL_DIR, quantize, sequence_classification=True),
+            options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def predict(self, pairs: Sequence[Tuple[str, str]]) -> np.ndarray:
+        queries: List[str] = [query for query, _ in pairs]
+        passages: List[str] = [passage for _, passage in pairs]
+        encoded = self.tokenizer(
+            queries,
+            passages,
+            padding=True,
+            truncation="only_second",
+            max_length=self.max_length,
+            return_tensors="np",
+        )
+        feeds = {name: value.astype(np.int64) for name, value in encoded.items() if name in self.input_names}
+        logits = self.session.run(None, feeds)[0]
+        return logits[:, 0].astype(np.float32)
+
+
+def build_cross_encoder(backend: str = RERANK_BACKEND, num_threads: Optional[int] = None):
+    """Create the reranking model for the configured backend."""
+    if backend == "onnx":
+        return OnnxCrossEncoder(
+            RERANK_MODEL_NAME,
+            quantize=os.getenv("RERANK_ONNX_QUANTIZE", "1") != "0",
+            num_threads=num_threads,
+        )
+    return TorchCrossEncoder(RERANK_MODEL_NAME, num_threads=num_threads)
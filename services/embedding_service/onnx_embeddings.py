@@ -0,0 +1,132 @@
+"""
+ONNX Runtime backend for the sentence-transformers embedding model.
+
+The model is exported to ONNX once (this needs torch, but only at export time),
+quantized to int8 with dynamic quantization and then served by onnxruntime on
+CPU. Pooling and normalization reproduce the sentence-transformers pipeline of
+all-MiniLM-L6-v2 (mean pooling + L2 normalization), so vectors stay compatible
+with the existing FAISS/Chroma stores; check it with
+`python -m services.embedding_service.parity` before switching backends.
+"""
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import onnxruntime as ort
+from langchain.embeddings.base import Embeddings
+from transformers import AutoTokenizer
+
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "data/models/onnx")
+
+
+def _model_dir(model_name: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, model_name.replace("/", "__"))
+
+
+def export_onnx_model(
+    model_name: str,
+    cache_dir: str = ONNX_MODEL_DIR,
+    quantize: bool = True,
+    sequence_classification: bool = False,
+) -> str:
+    """
+    Export `model_name` to ONNX (and int8) under `cache_dir` unless already done; return the model path.
+
+    Encoders are exported with their `last_hidden_state`; with `sequence_classification`
+    (cross-encoders) the classification head is kept and `logits` is exported instead.
+    """
+    model_dir = _model_dir(model_name, cache_dir)
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    int8_path = os.path.join(model_dir, "model.int8.onnx")
+    target = int8_path if quantize else fp32_path
+    if os.path.exists(target):
+        return target
+
+    os.makedirs(model_dir, exist_ok=True)
+    if not os.path.exists(fp32_path):
+        import torch
+        from transformers import AutoModel, AutoModelForSequenceClassification
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        if sequence_classification:
+            model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+            sample = tokenizer(["Quel est le délai de préavis ?"], ["Le préavis est d'un mois."], return_tensors="pt")
+            output_name, output_axes = "logits", {0: "batch"}
+        else:
+            model = AutoModel.from_pretrained(model_name).eval()
+            sample = tokenizer(["Quel est le délai de préavis ?"], return_tensors="pt")
+            output_name, output_axes = "last_hidden_state", {0: "batch", 1: "sequence"}
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        dynamic_axes: Dict[str, Dict[int, str]] = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes[output_name] = output_axes
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in input_names),
+                fp32_path,
+                input_names=input_names,
+                output_names=[output_name],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return target
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence embeddings computed with onnxruntime on CPU, optionally int8-quantized."""
+
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: str = ONNX_MODEL_DIR,
+        quantize: bool = True,
+        num_threads: Optional[int] = None,
+        batch_size: int = 64,
+        max_length: int = 256,
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = num_threads or 0  # 0 lets onnxruntime use every physical core
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            export_onnx_model(model_name, cache_dir, quantize), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + self.batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            feeds = {name: value.astype(np.int64) for name, value in encoded.items() if name in self.input_names}
+            token_embeddings = self.session.run(None, feeds)[0]
+
+            # Mean pooling over real tokens, then L2 normalization, as in sentence-transformers.
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            batches.append(pooled / norms)
+        if not batches:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.concatenate(batches).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
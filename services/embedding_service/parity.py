@@ -0,0 +1,108 @@
+"""
+Parity check between an embedding backend and the vectors already stored in a FAISS index.
+
+A sample of chunks is re-embedded with the candidate backend and compared, by
+cosine similarity, with the vectors the index was built with. If every sampled
+chunk stays above the tolerance, the backend can serve queries against the
+existing stores without re-indexing.
+
+    python -m services.embedding_service.parity data/vector_stores/faiss_stores/code --min-cosine 0.98
+"""
+import argparse
+import os
+import pickle
+import sys
+from dataclasses import dataclass
+from typing import List
+
+import faiss
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+from services.retriever_service.chunk_store import CHUNK_STORE_FILE, ChunkStore
+
+DEFAULT_MIN_COSINE = 0.98
+
+
+@dataclass
+class ParityReport:
+    """Cosine similarities between stored and re-computed vectors"""
+    store_dir: str
+    sample_size: int
+    min_cosine: float
+    mean_cosine: float
+    tolerance: float
+
+    @property
+    def passed(self) -> bool:
+        return self.min_cosine >= self.tolerance
+
+
+def _chunk_texts(store_dir: str, positions: List[int]) -> List[str]:
+    """Chunk texts at `positions`, from the chunk store when present, else from the pickled docstore."""
+    chunk_store_path = os.path.join(store_dir, CHUNK_STORE_FILE)
+    if os.path.exists(chunk_store_path):
+        return [doc.page_content for doc in ChunkStore(chunk_store_path).fetch(positions)]
+    with open(os.path.join(store_dir, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return [docstore.search(index_to_docstore_id[position]).page_content for position in positions]
+
+
+def check_parity(
+    embeddings: Embeddings,
+    store_dir: str,
+    sample_size: int = 200,
+    tolerance: float = DEFAULT_MIN_COSINE,
+    seed: int = 0,
+) -> ParityReport:
+    """Compare `embeddings` against the vectors stored in the FAISS index of `store_dir`."""
+    index = faiss.read_index(os.path.join(store_dir, "index.faiss"))
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()  # IVF indexes cannot reconstruct vectors without it
+    rng = np.random.default_rng(seed)
+    positions = np.sort(rng.choice(index.ntotal, size=min(sample_size, index.ntotal), replace=False)).tolist()
+
+    stored = np.stack([index.reconstruct(position) for position in positions])
+    candidate = np.asarray(embeddings.embed_documents(_chunk_texts(store_dir, positions)), dtype=np.float32)
+
+    stored /= np.clip(np.linalg.norm(stored, axis=1, keepdims=True), 1e-12, None)
+    candidate /= np.clip(np.linalg.norm(candidate, axis=1, keepdims=True), 1e-12, None)
+    cosines = (stored * candidate).sum(axis=1)
+
+    return ParityReport(
+        store_dir=store_dir,
+        sample_size=len(positions),
+        min_cosine=float(cosines.min()),
+        mean_cosine=float(cosines.mean()),
+        tolerance=tolerance,
+    )
+
+
+def main():
+    from utils.helpers import EMBEDDING_MODEL_NAME
+    from services.embedding_service.onnx_embeddings import OnnxEmbeddings
+
+    parser = argparse.ArgumentParser(description="Check ONNX embeddings against existing FAISS stores.")
+    parser.add_argument("store_dirs", nargs="+", help="FAISS store directories (containing index.faiss)")
+    parser.add_argument("--sample-size", type=int, default=200)
+    parser.add_argument("--min-cosine", type=float, default=DEFAULT_MIN_COSINE)
+    parser.add_argument("--no-quantize", action="store_true", help="Check the fp32 ONNX model instead of int8")
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    embeddings = OnnxEmbeddings(EMBEDDING_MODEL_NAME, quantize=not args.no_quantize, num_threads=args.threads)
+    failed = False
+    for store_dir in args.store_dirs:
+        report = check_parity(embeddings, store_dir, args.sample_size, args.min_cosine)
+        status = "OK" if report.passed else "FAIL"
+        print(
+            f"[{status}] {store_dir}: {report.sample_size} chunks, "
+            f"min cosine {report.min_cosine:.4f}, mean {report.mean_cosine:.4f} (tolerance {report.tolerance})"
+        )
+        failed |= not report.passed
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
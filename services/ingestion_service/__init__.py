@@ -0,0 +1,9 @@
+from .pipeline import FileChunks, IngestConfig, IngestionPipeline, IngestStats, run_ingestion
+
+__all__ = [
+    "FileChunks",
+    "IngestConfig",
+    "IngestionPipeline",
+    "IngestStats",
+    "run_ingestion",
+]
@@ -0,0 +1,55 @@
+"""
+Build or update every retriever store from the raw PDFs.
+
+    python -m services.ingestion_service --doc-types Code Loi --workers 8
+"""
+import argparse
+import logging
+import sys
+
+from utils.helpers import DOC_TYPES_DICT
+from .pipeline import BACKENDS, IngestConfig, IngestionPipeline
+
+
+def main():
+    defaults = IngestConfig()
+    parser = argparse.ArgumentParser(description="Incrementally ingest raw PDFs into the vector stores.")
+    parser.add_argument("--raw-dir", default=defaults.raw_dir)
+    parser.add_argument("--stores-dir", default=defaults.stores_dir)
+    parser.add_argument("--doc-types", nargs="+", choices=list(DOC_TYPES_DICT), default=defaults.doc_types)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=defaults.backends)
+    parser.add_argument("--chunk-size", type=int, default=defaults.chunk_size)
+    parser.add_argument("--chunk-overlap", type=int, default=defaults.chunk_overlap)
+    parser.add_argument("--workers", type=int, default=defaults.workers, help="PDF extraction processes")
+    parser.add_argument("--batch-size", type=int, default=defaults.batch_size, help="Chunks per embedding call")
+    parser.add_argument("--force", action="store_true", help="Re-process every file and rebuild every store")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    config = IngestConfig(
+        raw_dir=args.raw_dir,
+        stores_dir=args.stores_dir,
+        doc_types=args.doc_types,
+        backends=args.backends,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        force=args.force,
+    )
+    failed = []
+    for stats in IngestionPipeline(config).run():
+        print(
+            f"{stats.doc_type:>10}: +{stats.added} ~{stats.changed} -{stats.deleted} ={stats.unchanged} files, "
+            f"{stats.chunks} chunks, {len(stats.failed)} failed, {stats.seconds:.1f}s"
+        )
+        failed.extend(stats.failed)
+    if failed:
+        print(f"{len(failed)} file(s) could not be extracted and will be retried next run:")
+        for relative in failed:
+            print(f"  {relative}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
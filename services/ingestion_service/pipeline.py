@@ -0,0 +1,468 @@
+"""
+Incremental ingestion of raw PDFs into every retriever store.
+
+For each document type, PDFs under `<raw_dir>/<type>/` are hashed and compared
+with the manifest of the previous run. Only added or changed files are
+extracted (in a process pool), chunked page by page and embedded in large
+batches. Their chunks and vectors are kept in a per-file cache keyed by content
+hash, so the stores of a doc type are re-assembled from cache without touching
+unchanged PDFs again:
+
+    FAISS   index.faiss + index.pkl (LangChain layout) + chunks.arrow + metadata.npz
+    BM25    bm25_index.npz + chunks.arrow + metadata.npz
+    Chroma  collection updated in place (chunks of changed/deleted files removed, new ones added)
+    Qdrant  collection updated in place, same as Chroma
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.retriever_service.bm25_engine import build_bm25_store
+from services.retriever_service.chunk_store import CHUNK_STORE_FILE, ChunkStore, write_chunk_store
+from services.retriever_service.metadata_index import METADATA_INDEX_FILE, MetadataIndex, extract_year
+from utils.helpers import DOC_TYPES_DICT, EMBEDDING_BACKEND, EMBEDDING_MODEL_NAME
+from utils.text_processing import simhash_hex
+
+BACKENDS = ("faiss", "bm25", "chroma", "qdrant")
+MANIFEST_FILE = "manifest.json"
+CACHE_DIR = ".ingest_cache"
+# LangChain's Chroma wrapper reads this collection unless told otherwise.
+CHROMA_COLLECTION = "langchain"
+
+
+@dataclass
+class IngestConfig:
+    """Settings of one ingestion run"""
+    raw_dir: str = "data/01_raw"
+    stores_dir: str = "data/vector_stores"
+    doc_types: List[str] = field(default_factory=lambda: list(DOC_TYPES_DICT))
+    backends: List[str] = field(default_factory=lambda: list(BACKENDS))
+    chunk_size: int = 1000
+    chunk_overlap: int = 200
+    workers: int = os.cpu_count() or 1
+    batch_size: int = 512
+    force: bool = False
+
+    def fingerprint(self) -> str:
+        """Everything that changes the chunks or vectors of a file; part of its cache key."""
+        # The backend too: torch and ONNX (int8) vectors of the same model differ slightly.
+        key = f"{self.chunk_size}|{self.chunk_overlap}|{EMBEDDING_MODEL_NAME}|{EMBEDDING_BACKEND}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
+
+
+@dataclass
+class FileChunks:
+    """Chunks and vectors of one PDF"""
+    relative_path: str
+    sha256: str
+    contents: List[str]
+    metadatas: List[Dict[str, Any]]
+    vectors: np.ndarray
+
+    @property
+    def chunk_ids(self) -> List[str]:
+        return [chunk_id(self.sha256, i) for i in range(len(self.contents))]
+
+
+@dataclass
+class IngestStats:
+    """What one doc type's run did"""
+    doc_type: str
+    added: int = 0
+    changed: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    failed: List[str] = field(default_factory=list)  # files that could not be extracted, retried next run
+
+
+def chunk_id(sha256: str, position: int) -> str:
+    return f"{sha256[:16]}-{position:05d}"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extract_chunks(
+    path: str, relative_path: str, doc_type: str, chunk_size: int, chunk_overlap: int
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Extract and chunk one PDF page by page. Runs in a worker process."""
+    from pypdf import PdfReader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    reader = PdfReader(path)
+    title = str((reader.metadata or {}).get("/Title") or os.path.splitext(os.path.basename(path))[0])
+    year = extract_year({"metadata": title, "source": relative_path})
+    try:
+        page_labels = list(reader.page_labels)
+    except Exception:
+        page_labels = [str(i + 1) for i in range(len(reader.pages))]
+
+    contents: List[str] = []
+    metadatas: List[Dict[str, Any]] = []
+    for page_number, page in enumerate(reader.pages):
+        text = page.extract_text() or ""
+        for chunk in splitter.split_text(text):
+            contents.append(chunk)
+            metadatas.append({
+                "source": path,
+                "page": page_number,
+                "page_label": page_labels[page_number] if page_number < len(page_labels) else str(page_number + 1),
+                "metadata": title,
+                "doc_type": doc_type,
+                "year": year,
+                # Near-duplicate fingerprint, compared at query time (services.rag_service.deduplication).
+                "simhash": simhash_hex(chunk),
+            })
+    return contents, metadatas
+
+
+class Manifest:
+    """Content hashes and chunk counts of every ingested file, per doc type."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    def files(self, doc_type: str) -> Dict[str, Dict[str, Any]]:
+        return self.data.setdefault(doc_type, {})
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+class IngestionPipeline:
+    """Builds every retriever store of every doc type from raw PDFs, incrementally."""
+
+    def __init__(self, config: IngestConfig, embeddings=None):
+        self.config = config
+        self._embeddings = embeddings
+        self.manifest = Manifest(os.path.join(config.stores_dir, MANIFEST_FILE))
+        self.cache_dir = os.path.join(config.stores_dir, CACHE_DIR)
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            from utils.helpers import build_embeddings
+
+            self._embeddings = build_embeddings()
+        return self._embeddings
+
+    def run(self) -> List[IngestStats]:
+        os.makedirs(self.config.stores_dir, exist_ok=True)
+        stats = []
+        with ProcessPoolExecutor(max_workers=self.config.workers) as pool:
+            for doc_type in self.config.doc_types:
+                stats.append(self._ingest_doc_type(doc_type, pool))
+                # Saved after each doc type so an interrupted run keeps its progress.
+                self.manifest.save()
+        return stats
+
+    def build_stores(self, doc_type: str, files: List[FileChunks]):
+        """Rebuild every configured store of `doc_type` from already embedded chunks (no PDFs, no manifest)."""
+        os.makedirs(self.config.stores_dir, exist_ok=True)
+        self._write_stores(doc_type, files, files, [], rebuild=True)
+
+    def _store_dir(self, backend: str, doc_type: str) -> str:
+        return os.path.join(self.config.stores_dir, f"{backend}_stores", DOC_TYPES_DICT[doc_type])
+
+    def _scan(self, doc_type: str) -> Dict[str, str]:
+        """Relative path -> absolute path of every PDF of a doc type."""
+        root = os.path.join(self.config.raw_dir, DOC_TYPES_DICT[doc_type])
+        found = {}
+        for directory, _, names in os.walk(root):
+            for name in names:
+                if name.lower().endswith(".pdf"):
+                    path = os.path.join(directory, name)
+                    found[os.path.relpath(path, self.config.raw_dir).replace("\\", "/")] = path
+        return found
+
+    def _ingest_doc_type(self, doc_type: str, pool: ProcessPoolExecutor) -> IngestStats:
+        start = time.perf_counter()
+        stats = IngestStats(doc_type)
+        previous = dict(self.manifest.files(doc_type))
+        paths = self._scan(doc_type)
+
+        with ThreadPoolExecutor(max_workers=8) as hash_pool:
+            hashes = dict(zip(paths, hash_pool.map(file_sha256, paths.values())))
+
+        to_process = [
+            relative for relative, sha in hashes.items()
+            if self.config.force or previous.get(relative, {}).get("sha256") != sha or not self._is_cached(sha)
+        ]
+        deleted = [relative for relative in previous if relative not in paths]
+        stats.added = sum(relative not in previous for relative in to_process)
+        stats.changed = len(to_process) - stats.added
+        stats.deleted = len(deleted)
+        stats.unchanged = len(paths) - len(to_process)
+
+        rebuild = self.config.force or any(
+            not os.path.isdir(self._store_dir(backend, doc_type)) for backend in self.config.backends
+        )
+        if not to_process and not deleted and not rebuild:
+            logging.info(f"[ingest] {doc_type}: up to date ({stats.unchanged} files)")
+            stats.seconds = time.perf_counter() - start
+            return stats
+
+        new_files, failed = self._process(
+            doc_type, {relative: (paths[relative], hashes[relative]) for relative in to_process}, pool
+        )
+        stats.failed = sorted(failed)
+        files = []
+        kept = set()
+        for relative in sorted(paths):
+            if relative in new_files:
+                files.append(new_files[relative])
+            elif relative in failed:
+                # Keep the last good version, if any; its old hash in the manifest gets the file retried.
+                entry = previous.get(relative)
+                if entry and self._is_cached(entry["sha256"]):
+                    files.append(self._load_cached(relative, entry["sha256"]))
+                    kept.add(relative)
+            else:
+                files.append(self._load_cached(relative, hashes[relative]))
+
+        removed_ids = [
+            chunk_id(entry["sha256"], i)
+            for relative, entry in previous.items()
+            if relative in deleted
+            or relative in new_files and entry["sha256"] != hashes[relative]
+            or relative in failed and relative not in kept
+            for i in range(entry.get("chunks", 0))
+        ]
+        self._write_stores(doc_type, files, [new_files[r] for r in sorted(new_files)], removed_ids, rebuild)
+
+        manifest = self.manifest.files(doc_type)
+        manifest.clear()
+        for file in files:
+            manifest[file.relative_path] = {"sha256": file.sha256, "chunks": len(file.contents)}
+        stats.chunks = sum(len(file.contents) for file in files)
+        stats.seconds = time.perf_counter() - start
+        logging.info(f"[ingest] {stats}")
+        if failed:
+            logging.error(f"[ingest] {doc_type}: {len(failed)} file(s) could not be extracted: {stats.failed}")
+        return stats
+
+    def _process(
+        self, doc_type: str, files: Dict[str, Tuple[str, str]], pool: ProcessPoolExecutor
+    ) -> Tuple[Dict[str, FileChunks], List[str]]:
+        """
+        Extract new/changed files in parallel, then embed all their chunks in large batches.
+
+        Returns the processed files and the ones whose extraction failed. Failed files are
+        not cached, so a transient error does not stick to the file's hash.
+        """
+        futures = {
+            relative: pool.submit(
+                extract_chunks, path, relative, doc_type, self.config.chunk_size, self.config.chunk_overlap
+            )
+            for relative, (path, _) in files.items()
+        }
+        extracted: Dict[str, Tuple[List[str], List[Dict[str, Any]]]] = {}
+        failed: List[str] = []
+        for relative, future in futures.items():
+            try:
+                extracted[relative] = future.result()
+            except Exception as e:
+                logging.error(f"[ingest] could not extract {relative}: {e}")
+                failed.append(relative)
+
+        all_contents = [content for contents, _ in extracted.values() for content in contents]
+        vectors = self._embed(all_contents)
+
+        results: Dict[str, FileChunks] = {}
+        offset = 0
+        for relative, (contents, metadatas) in extracted.items():
+            file = FileChunks(relative, files[relative][1], contents, metadatas, vectors[offset:offset + len(contents)])
+            offset += len(contents)
+            self._save_cached(file)
+            results[relative] = file
+        return results, failed
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        batches = [
+            np.asarray(self.embeddings.embed_documents(texts[start:start + self.config.batch_size]), dtype=np.float32)
+            for start in range(0, len(texts), self.config.batch_size)
+        ]
+        return np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+
+    def _cache_path(self, sha256: str) -> str:
+        return os.path.join(self.cache_dir, f"{sha256}-{self.config.fingerprint()}")
+
+    def _is_cached(self, sha256: str) -> bool:
+        return os.path.exists(os.path.join(self._cache_path(sha256), "vectors.npy"))
+
+    def _save_cached(self, file: FileChunks):
+        path = self._cache_path(file.sha256)
+        os.makedirs(path, exist_ok=True)
+        write_chunk_store(os.path.join(path, CHUNK_STORE_FILE), file.chunk_ids, file.contents, file.metadatas)
+        np.save(os.path.join(path, "vectors.npy"), file.vectors)
+
+    def _load_cached(self, relative_path: str, sha256: str) -> FileChunks:
+        path = self._cache_path(sha256)
+        chunks = ChunkStore(os.path.join(path, CHUNK_STORE_FILE))
+        docs = chunks.fetch(list(range(len(chunks))))
+        for doc in docs:
+            # Files cached before chunks carried a fingerprint.
+            doc.metadata.setdefault("simhash", simhash_hex(doc.page_content))
+        return FileChunks(
+            relative_path,
+            sha256,
+            [doc.page_content for doc in docs],
+            [doc.metadata for doc in docs],
+            np.load(os.path.join(path, "vectors.npy")),
+        )
+
+    def _write_stores(
+        self,
+        doc_type: str,
+        files: List[FileChunks],
+        new_files: List[FileChunks],
+        removed_ids: List[str],
+        rebuild: bool,
+    ):
+        ids = [cid for file in files for cid in file.chunk_ids]
+        contents = [content for file in files for content in file.contents]
+        metadatas = [metadata for file in files for metadata in file.metadatas]
+        vectors = [file.vectors for file in files if len(file.contents)]
+        matrix = np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+        if "faiss" in self.config.backends:
+            self._write_faiss(self._store_dir("faiss", doc_type), doc_type, ids, contents, metadatas, matrix)
+        if "bm25" in self.config.backends:
+            store_dir = self._store_dir("bm25", doc_type)
+            build_bm25_store(store_dir, contents, metadatas, ids)
+            MetadataIndex.build(metadatas, doc_type).save(os.path.join(store_dir, METADATA_INDEX_FILE))
+        if "chroma" in self.config.backends:
+            self._update_chroma(self._store_dir("chroma", doc_type), files if rebuild else new_files, removed_ids, rebuild)
+        if "qdrant" in self.config.backends:
+            self._update_qdrant(doc_type, files if rebuild else new_files, removed_ids, rebuild)
+
+    def _write_faiss(
+        self,
+        store_dir: str,
+        doc_type: str,
+        ids: List[str],
+        contents: List[str],
+        metadatas: List[Dict[str, Any]],
+        matrix: np.ndarray,
+    ):
+        """
+        Write a flat L2 index in LangChain's save_local layout, plus the mmap chunk store.
+
+        A running app may have index.faiss memory-mapped, so every file is written to a
+        temporary path and renamed over the old one: readers keep the old file until they
+        reload. The chunk store, whose presence selects the mmap load path, is replaced last.
+        """
+        import pickle
+        import faiss
+        from langchain.docstore.in_memory import InMemoryDocstore
+        from langchain.schema import Document
+
+        os.makedirs(store_dir, exist_ok=True)
+        index = faiss.IndexFlatL2(matrix.shape[1] if matrix.size else len(self.embeddings.embed_query("")))
+        if matrix.size:
+            index.add(matrix)
+        index_path = os.path.join(store_dir, "index.faiss")
+        faiss.write_index(index, f"{index_path}.tmp")
+        os.replace(f"{index_path}.tmp", index_path)
+
+        docstore = InMemoryDocstore({
+            cid: Document(page_content=content, metadata=metadata)
+            for cid, content, metadata in zip(ids, contents, metadatas)
+        })
+        pickle_path = os.path.join(store_dir, "index.pkl")
+        with open(f"{pickle_path}.tmp", "wb") as f:
+            pickle.dump((docstore, dict(enumerate(ids))), f)
+        os.replace(f"{pickle_path}.tmp", pickle_path)
+        MetadataIndex.build(metadatas, doc_type).save(os.path.join(store_dir, METADATA_INDEX_FILE))
+        write_chunk_store(os.path.join(store_dir, CHUNK_STORE_FILE), ids, contents, metadatas)
+
+    def _update_chroma(self, store_dir: str, files: List[FileChunks], removed_ids: List[str], rebuild: bool):
+        import chromadb
+
+        client = chromadb.PersistentClient(path=store_dir)
+        if rebuild:
+            try:
+                client.delete_collection(CHROMA_COLLECTION)
+            except Exception:
+                pass
+        collection = client.get_or_create_collection(CHROMA_COLLECTION)
+        if removed_ids and not rebuild:
+            collection.delete(ids=removed_ids)
+        for ids, contents, metadatas, vectors in _batches(files, self.config.batch_size):
+            collection.upsert(ids=ids, documents=contents, metadatas=metadatas, embeddings=vectors.tolist())
+
+    def _update_qdrant(self, doc_type: str, files: List[FileChunks], removed_ids: List[str], rebuild: bool):
+        from qdrant_client import QdrantClient
+        from qdrant_client.http import models as rest
+
+        collection = DOC_TYPES_DICT[doc_type]
+        client = QdrantClient(path=self._store_dir("qdrant", doc_type))
+        dimension = next((file.vectors.shape[1] for file in files if len(file.contents)), None)
+        exists = client.collection_exists(collection)
+        if (rebuild or not exists) and dimension is not None:
+            client.recreate_collection(
+                collection, vectors_config=rest.VectorParams(size=dimension, distance=rest.Distance.COSINE)
+            )
+        elif removed_ids and exists:
+            client.delete(collection, points_selector=rest.PointIdsList(points=[_qdrant_id(cid) for cid in removed_ids]))
+        for ids, contents, metadatas, vectors in _batches(files, self.config.batch_size):
+            client.upsert(collection, points=[
+                rest.PointStruct(
+                    id=_qdrant_id(cid),
+                    vector=vector.tolist(),
+                    payload={"page_content": content, "metadata": metadata},
+                )
+                for cid, content, metadata, vector in zip(ids, contents, metadatas, vectors)
+            ])
+        client.close()
+
+
+def _qdrant_id(chunk_id_: str) -> str:
+    """Qdrant point ids must be integers or UUIDs."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, chunk_id_))
+
+
+def _batches(files: List[FileChunks], batch_size: int):
+    """(ids, contents, metadatas, vectors) batches over the chunks of `files`."""
+    ids: List[str] = []
+    contents: List[str] = []
+    metadatas: List[Dict[str, Any]] = []
+    vectors: List[np.ndarray] = []
+    for file in files:
+        for cid, content, metadata, vector in zip(file.chunk_ids, file.contents, file.metadatas, file.vectors):
+            ids.append(cid)
+            contents.append(content)
+            metadatas.append(metadata)
+            vectors.append(vector)
+            if len(ids) == batch_size:
+                yield ids, contents, metadatas, np.stack(vectors)
+                ids, contents, metadatas, vectors = [], [], [], []
+    if ids:
+        yield ids, contents, metadatas, np.stack(vectors)
+
+
+def run_ingestion(config: Optional[IngestConfig] = None) -> List[IngestStats]:
+    return IngestionPipeline(config or IngestConfig()).run()
@@ -9,6 +9,7 @@ from langchain.schema import LLMResult, Generation
 from langchain.agents import Tool, initialize_agent, AgentType
 from langchain.callbacks.manager import CallbackManagerForLLMRun
 from services.llm_service.agents.agentic_llm_service import AgenticLLMService
+from services.llm_service.http_client import get_http_client
 from langchain_core.pydantic_v1 import Field
 
 class GoogleAgenticLLM(AgenticLLMService):
@@ -27,8 +28,8 @@ class GoogleAgenticLLM(AgenticLLMService):
     ):
         super().__init__(provider="google", model=model, api_key=api_key, **kwargs)
         self.endpoint = (
-            "https://generativelanguage.googleapis.com/v1beta/models/"
-            f"{self.model}:generateContent"
+            os.getenv("GOOGLE_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+            + f"/models/{self.model}:generateContent"
         )
 
     def _generate_response(
@@ -47,8 +48,9 @@ class GoogleAgenticLLM(AgenticLLMService):
                 "maxOutputTokens": kwargs.get("max_tokens", 512)
             }
         }
-        response = requests.post(self.endpoint, headers=headers, json=payload, params=params)
-        response.raise_for_status()
+        response = get_http_client().post(
+            self.endpoint, headers=headers, json=payload, params=params, deadline=kwargs.get("deadline")
+        )
         data = response.json()
         # Extract text from the first candidate
         if "candidates" in data and data["candidates"]:
@@ -0,0 +1,137 @@
+"""
+Asynchronous counterpart of `http_client.ProviderHTTPClient`, on httpx.
+
+Same behaviour for coroutines: pooled connections, separate connect and read
+timeouts, retries with jittered backoff honouring `Retry-After`, and a deadline
+bounding the whole call. Cancelling the calling task aborts the in-flight
+request and any pending backoff sleep.
+
+An httpx.AsyncClient is bound to the event loop it runs on, so one client (and
+connection pool) is kept per loop.
+"""
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Any, Optional, Union
+
+import httpx
+
+from services.llm_service.http_client import (
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    LLM_CONNECT_TIMEOUT,
+    LLM_MAX_RETRIES,
+    LLM_POOL_SIZE,
+    LLM_READ_TIMEOUT,
+    RETRY_STATUSES,
+    Deadline,
+    DeadlineExceeded,
+    backoff_delay,
+    parse_retry_after,
+)
+
+
+class AsyncProviderHTTPClient:
+    """Pooled, retrying, deadline-aware async HTTP client shared by the LLM services."""
+
+    def __init__(
+        self,
+        connect_timeout: float = LLM_CONNECT_TIMEOUT,
+        read_timeout: float = LLM_READ_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff_base: float = LLM_BACKOFF_BASE,
+        backoff_max: float = LLM_BACKOFF_MAX,
+        pool_size: int = LLM_POOL_SIZE,
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            client = httpx.AsyncClient(limits=limits)
+            self._clients[loop] = client
+        return client
+
+    def _timeout(self, deadline: Optional[Deadline]) -> httpx.Timeout:
+        if deadline is None:
+            return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("Deadline exceeded before the request could be sent")
+        return httpx.Timeout(min(self.read_timeout, remaining), connect=min(self.connect_timeout, remaining))
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        deadline: Union[Deadline, float, None] = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """
+        Send a request, retrying transient failures until it succeeds, retries run out or the deadline passes.
+
+        Args:
+            method: HTTP method
+            url: Full URL
+            deadline: Deadline, or seconds from now, bounding all attempts and backoff sleeps
+            **kwargs: Passed to httpx (json, params, headers, ...)
+
+        Returns:
+            The successful response; the last error response is raised with raise_for_status
+        """
+        deadline = Deadline.coerce(deadline)
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                response = await self._client().request(method, url, timeout=self._timeout(deadline), **kwargs)
+            except httpx.TransportError as e:
+                if attempt >= self.max_retries:
+                    raise
+                error: Union[Exception, httpx.Response] = e
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    return response
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                error = response
+
+            delay = backoff_delay(attempt, self.backoff_base, self.backoff_max, retry_after)
+            if deadline is not None and delay >= deadline.remaining():
+                if isinstance(error, httpx.Response):
+                    error.raise_for_status()
+                raise DeadlineExceeded(f"Deadline exceeded while retrying {url}") from error
+            logging.warning(
+                f"{method} {url} failed ({getattr(error, 'status_code', error)}), "
+                f"retry {attempt + 1}/{self.max_retries} in {delay:.2f}s"
+            )
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def post(self, url: str, deadline: Union[Deadline, float, None] = None, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, deadline=deadline, **kwargs)
+
+
+_client: Optional[AsyncProviderHTTPClient] = None
+_client_lock = threading.Lock()
+
+
+def get_async_http_client() -> AsyncProviderHTTPClient:
+    """Process-wide async client, so every coroutine on a loop shares its connection pool."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = AsyncProviderHTTPClient()
+    return _client
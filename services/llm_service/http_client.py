@@ -0,0 +1,187 @@
+"""
+Shared HTTP client for the LLM providers.
+
+One pooled `requests.Session` is reused by every provider call, so connections
+(and their TLS sessions) are kept alive between requests. On top of it:
+    - separate connect and read timeouts
+    - retries on connection errors, timeouts, 429 and 5xx, with jittered
+      exponential backoff that honours the provider's `Retry-After`
+    - an optional per-request deadline that bounds the whole call: every
+      attempt's timeout and every backoff sleep is clipped to what is left,
+      and cancelling it stops a request that is no longer wanted
+
+Base URLs are plain strings, so the client can be pointed at a local stub
+server in tests.
+"""
+import email.utils
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Optional, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", 60))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 8))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", 16))
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class DeadlineExceeded(TimeoutError):
+    """The per-request deadline ran out before the provider answered"""
+
+
+class Deadline:
+    """Absolute point in time by which a request must be complete."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+        self.cancelled = False
+
+    @classmethod
+    def coerce(cls, deadline: Union["Deadline", float, None]) -> Optional["Deadline"]:
+        """Accept a Deadline, a number of seconds from now, or None (no deadline)."""
+        if deadline is None or isinstance(deadline, Deadline):
+            return deadline
+        return cls(float(deadline))
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def cancel(self):
+        """Expire the deadline now: a request still retrying gives up at its next attempt."""
+        self.expires_at = time.monotonic()
+        self.cancelled = True
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a `Retry-After` header, given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def backoff_delay(attempt: int, base: float, maximum: float, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than what the server asked for."""
+    delay = random.uniform(0, min(maximum, base * 2 ** attempt))
+    return max(delay, retry_after) if retry_after is not None else delay
+
+
+class ProviderHTTPClient:
+    """Pooled, retrying, deadline-aware HTTP client shared by the LLM services."""
+
+    def __init__(
+        self,
+        connect_timeout: float = LLM_CONNECT_TIMEOUT,
+        read_timeout: float = LLM_READ_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff_base: float = LLM_BACKOFF_BASE,
+        backoff_max: float = LLM_BACKOFF_MAX,
+        pool_size: int = LLM_POOL_SIZE,
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        # Retries are handled here, with deadline awareness, not by urllib3.
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _timeout(self, deadline: Optional[Deadline]):
+        if deadline is None:
+            return (self.connect_timeout, self.read_timeout)
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("Deadline exceeded before the request could be sent")
+        return (min(self.connect_timeout, remaining), min(self.read_timeout, remaining))
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        return backoff_delay(attempt, self.backoff_base, self.backoff_max, retry_after)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        deadline: Union[Deadline, float, None] = None,
+        **kwargs: Any,
+    ) -> requests.Response:
+        """
+        Send a request, retrying transient failures until it succeeds, retries run out or the deadline passes.
+
+        Args:
+            method: HTTP method
+            url: Full URL
+            deadline: Deadline, or seconds from now, bounding all attempts and backoff sleeps
+            **kwargs: Passed to requests (json, params, headers, stream, ...)
+
+        Returns:
+            The successful response; the last error response is raised with raise_for_status
+        """
+        deadline = Deadline.coerce(deadline)
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                response = self.session.request(method, url, timeout=self._timeout(deadline), **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                error: Union[Exception, requests.Response] = e
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    return response
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                response.close()
+                error = response
+
+            delay = self._backoff(attempt, retry_after)
+            if deadline is not None and delay >= deadline.remaining():
+                if isinstance(error, requests.Response):
+                    error.raise_for_status()
+                raise DeadlineExceeded(f"Deadline exceeded while retrying {url}") from error
+            logging.warning(
+                f"{method} {url} failed ({getattr(error, 'status_code', error)}), "
+                f"retry {attempt + 1}/{self.max_retries} in {delay:.2f}s"
+            )
+            time.sleep(delay)
+            attempt += 1
+
+    def post(self, url: str, deadline: Union[Deadline, float, None] = None, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, deadline=deadline, **kwargs)
+
+
+_client: Optional[ProviderHTTPClient] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> ProviderHTTPClient:
+    """Process-wide client, so every provider call shares the same connection pool."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ProviderHTTPClient()
+    return _client
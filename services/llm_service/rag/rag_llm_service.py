@@ -1,9 +1,27 @@
+import asyncio
+import inspect
 import os
+import logging
+import time
 import requests
 import json
-from typing import Dict, Any, Optional
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, Any, Iterator, Optional, Tuple, Union
 import streamlit as st
 from streamlit.runtime.secrets import Secrets
+from services.llm_service.async_http_client import AsyncProviderHTTPClient, get_async_http_client
+from services.llm_service.http_client import Deadline, DeadlineExceeded, ProviderHTTPClient, get_http_client
+from services.llm_service.resilience import CircuitBreaker, LatencyTracker
+
+GOOGLE_API_BASE = os.getenv("GOOGLE_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+TOGETHER_API_BASE = os.getenv("TOGETHER_API_BASE", "https://api.together.xyz/v1")
+LLM_REQUEST_DEADLINE = float(os.getenv("LLM_REQUEST_DEADLINE", 90))
+# "auto" hedges across providers; "google" or "together_ai" pins a single one.
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "auto")
+
+PROVIDERS = ("google", "together_ai")
+
+_HEDGE_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
 
 class RagLLMService:
     """
@@ -19,6 +37,11 @@ class RagLLMService:
         default_together_model: str = "meta-llama/Llama-3.2-3B-Instruct-Turbo",
         temperature: float = 0.7,
         max_tokens: int = 512,
+        http_client: Optional[ProviderHTTPClient] = None,
+        async_http_client: Optional[AsyncProviderHTTPClient] = None,
+        request_deadline: float = LLM_REQUEST_DEADLINE,
+        default_provider: str = LLM_PROVIDER,
+        provider_order: Tuple[str, ...] = PROVIDERS,
     ):
         """
         Initialize the LLM client with API keys and default parameters.
@@ -30,6 +53,11 @@ class RagLLMService:
             default_together_model: Default Together AI model to use
             temperature: Default temperature for generation
             max_tokens: Default max tokens for generation
+            http_client: Provider HTTP client (defaults to the shared pooled client)
+            async_http_client: Provider HTTP client of the coroutine API (defaults to the shared async client)
+            request_deadline: Default time budget in seconds for one generation, retries included
+            default_provider: "auto" (hedged, with failover) or a single provider
+            provider_order: Primary first, then the provider hedged/failed over to
         """
         self.google_api_key = google_api_key
         self.together_api_key = together_api_key
@@ -37,95 +65,157 @@ class RagLLMService:
         self.default_together_model = default_together_model
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.http_client = http_client or get_http_client()
+        self.async_http_client = async_http_client or get_async_http_client()
+        self.request_deadline = request_deadline
+        self.default_provider = default_provider
+        self.provider_order = provider_order
+        self.breakers = {provider: CircuitBreaker(provider) for provider in PROVIDERS}
+        self.latency = {provider: LatencyTracker() for provider in PROVIDERS}
         
         # API endpoints
-        self.google_endpoint = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
-        self.together_endpoint = "https://api.together.xyz/v1/chat/completions"
+        self.google_endpoint = GOOGLE_API_BASE + "/models/{model}:generateContent"
+        self.google_stream_endpoint = GOOGLE_API_BASE + "/models/{model}:streamGenerateContent"
+        self.together_endpoint = TOGETHER_API_BASE + "/chat/completions"
     def get_env_variable(self, key: str) -> Secrets | str:
         """Return API key from st.secrets or dotenv depending on environment."""
         if "STREAMLIT_CLOUD" in os.environ:
             return st.secrets[key]
         else:
             return os.getenv(key) # type: ignore
+
+    def _google_key(self) -> str:
+        """Google API key, read once and then kept for the lifetime of the service."""
+        if not self.google_api_key:
+            self.google_api_key = self.get_env_variable("GOOGLE_API_KEY")
+        return self.google_api_key # type: ignore
+
+    def _together_key(self) -> str:
+        """Together AI API key, read once and then kept for the lifetime of the service."""
+        if not self.together_api_key:
+            self.together_api_key = self.get_env_variable("TOGETHER_AI_API_KEY")
+        return self.together_api_key # type: ignore
+
+    def _deadline(self, deadline: Union[Deadline, float, None]) -> Deadline:
+        return Deadline.coerce(deadline) or Deadline(self.request_deadline)
     
-    def _call_google_ai(
-        self, 
-        prompt: str, 
-        model: Optional[str] = None,
-        temperature: Optional[float] = None,
-        max_tokens: Optional[int] = None
-    ) -> str:
-        """Make API call to Google AI."""
-        
-        model = model or self.default_google_model
-        temp = temperature if temperature is not None else self.temperature
-        max_tok = max_tokens or self.max_tokens
-        
-        url = self.google_endpoint.format(model=model)
-        headers = {"Content-Type": "application/json"}
-        
-        payload = {
+    def _google_payload(self, prompt: str, temperature: Optional[float], max_tokens: Optional[int]) -> Dict[str, Any]:
+        return {
             "contents": [{"parts": [{"text": prompt}]}],
             "generationConfig": {
-                "temperature": temp,
-                "maxOutputTokens": max_tok
+                "temperature": temperature if temperature is not None else self.temperature,
+                "maxOutputTokens": max_tokens or self.max_tokens
             }
         }
-        self.google_api_key = self.get_env_variable("GOOGLE_API_KEY")
-        params = {"key": self.google_api_key}
-        
-        response = requests.post(url, headers=headers, json=payload, params=params)
-        response.raise_for_status()
-        
-        data = response.json()
-        
+
+    @staticmethod
+    def _google_text(data: Dict[str, Any]) -> str:
         if "candidates" in data and len(data["candidates"]) > 0:
             return data["candidates"][0]["content"]["parts"][0]["text"]
         else:
             raise Exception("No response generated from Google AI")
-    
-    def _call_together_ai(
-        self, 
-        prompt: str, 
-        model: Optional[str] = None,
-        temperature: Optional[float] = None,
-        max_tokens: Optional[int] = None
-    ) -> str:
-        """Make API call to Together AI."""
-        
-        model = model or self.default_together_model
-        temp = temperature if temperature is not None else self.temperature
-        max_tok = max_tokens or self.max_tokens
-        self.together_api_key = self.get_env_variable("TOGETHER_AI_API_KEY")
-        headers = {
-            "Authorization": f"Bearer {self.together_api_key}",
+
+    def _together_headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self._together_key()}",
             "Content-Type": "application/json"
         }
-        
-        payload = {
-            "model": model,
+
+    def _together_payload(
+        self, prompt: str, model: Optional[str], temperature: Optional[float], max_tokens: Optional[int]
+    ) -> Dict[str, Any]:
+        return {
+            "model": model or self.default_together_model,
             "messages": [{"role": "user", "content": prompt}],
-            "temperature": temp,
-            "max_tokens": max_tok
+            "temperature": temperature if temperature is not None else self.temperature,
+            "max_tokens": max_tokens or self.max_tokens
         }
-        
-        response = requests.post(self.together_endpoint, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        data = response.json()
-        
+
+    @staticmethod
+    def _together_text(data: Dict[str, Any]) -> str:
         if "choices" in data and len(data["choices"]) > 0:
             return data["choices"][0]["message"]["content"]
         else:
             raise Exception("No response generated from Together AI")
+
+    def _call_google_ai(
+        self, 
+        prompt: str, 
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        deadline: Union[Deadline, float, None] = None
+    ) -> str:
+        """Make API call to Google AI."""
+        response = self.http_client.post(
+            self.google_endpoint.format(model=model or self.default_google_model),
+            headers={"Content-Type": "application/json"},
+            json=self._google_payload(prompt, temperature, max_tokens),
+            params={"key": self._google_key()},
+            deadline=self._deadline(deadline),
+        )
+        return self._google_text(response.json())
+    
+    def _call_together_ai(
+        self, 
+        prompt: str, 
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        deadline: Union[Deadline, float, None] = None
+    ) -> str:
+        """Make API call to Together AI."""
+        response = self.http_client.post(
+            self.together_endpoint,
+            headers=self._together_headers(),
+            json=self._together_payload(prompt, model, temperature, max_tokens),
+            deadline=self._deadline(deadline),
+        )
+        return self._together_text(response.json())
+
+    async def _acall_google_ai(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        deadline: Union[Deadline, float, None] = None
+    ) -> str:
+        """Make API call to Google AI, asynchronously."""
+        response = await self.async_http_client.post(
+            self.google_endpoint.format(model=model or self.default_google_model),
+            headers={"Content-Type": "application/json"},
+            json=self._google_payload(prompt, temperature, max_tokens),
+            params={"key": self._google_key()},
+            deadline=self._deadline(deadline),
+        )
+        return self._google_text(response.json())
+
+    async def _acall_together_ai(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        deadline: Union[Deadline, float, None] = None
+    ) -> str:
+        """Make API call to Together AI, asynchronously."""
+        response = await self.async_http_client.post(
+            self.together_endpoint,
+            headers=self._together_headers(),
+            json=self._together_payload(prompt, model, temperature, max_tokens),
+            deadline=self._deadline(deadline),
+        )
+        return self._together_text(response.json())
     
     def generate(
         self,
         prompt: str, 
-        provider: str = "google",
+        provider: Optional[str] = None,
         model: Optional[str] = None,
         temperature: Optional[float] = None,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        deadline: Union[Deadline, float, None] = None
     ) -> str:
         """
         Generate text using specified provider and parameters.
@@ -134,19 +224,358 @@ class RagLLMService:
             prompt_template: Either a template string with {variable} placeholders 
                            or a PromptTemplate object with template and partial_variables
             variables: Dictionary of variables to substitute (if prompt_template is string)
-            provider: LLM provider to use ("google" or "together_ai")
-            model: Specific model to use (overrides default)
+            provider: LLM provider to use ("google", "together_ai" or "auto"; defaults to default_provider)
+            model: Specific model to use (overrides default; in auto mode, for the first provider only)
             temperature: Temperature for generation (overrides default)
             max_tokens: Max tokens for generation (overrides default)
+            deadline: Deadline or seconds from now for the whole call (defaults to request_deadline)
             
         Returns:
             Generated text response
         """
-        
-        # Call appropriate provider
-        if provider.lower() == "google":
-            return self._call_google_ai(prompt, model, temperature, max_tokens)
-        elif provider.lower() == "together_ai":
-            return self._call_together_ai(prompt, model, temperature, max_tokens)
+        provider = (provider or self.default_provider).lower()
+        if provider == "auto":
+            return self._generate_hedged(prompt, model, temperature, max_tokens, self._deadline(deadline))
+        if provider not in PROVIDERS:
+            raise ValueError(f"Unsupported provider: {provider}. Use 'google', 'together_ai' or 'auto'")
+        return self._call_provider(provider, prompt, model, temperature, max_tokens, self._deadline(deadline))
+
+    def _call_provider(
+        self,
+        provider: str,
+        prompt: str,
+        model: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        deadline: Deadline
+    ) -> str:
+        """Call one provider, feeding its circuit breaker and latency window."""
+        call = self._call_google_ai if provider == "google" else self._call_together_ai
+        start = time.monotonic()
+        settled = False
+        try:
+            text = call(prompt, model, temperature, max_tokens, deadline)
+            settled = True
+        except Exception:
+            # A hedge that lost the race is cancelled on purpose; that is not the provider's fault.
+            if not deadline.cancelled:
+                self.breakers[provider].record_failure()
+                settled = True
+            raise
+        finally:
+            if not settled:
+                # Neither outcome: free a half-open trial slot, or the provider stays out of rotation.
+                self.breakers[provider].release_trial()
+        self.breakers[provider].record_success()
+        self.latency[provider].record(time.monotonic() - start)
+        return text
+
+    def _generate_hedged(
+        self,
+        prompt: str,
+        model: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        deadline: Deadline
+    ) -> str:
+        """
+        Send to the primary; if it has not answered by its hedge delay (a high percentile of its
+        recent latencies) or it failed, send to the next provider too and keep the first answer.
+        Providers whose circuit is open are skipped; the losing request is cancelled.
+        """
+        candidates = [provider for provider in self.provider_order if provider in PROVIDERS]
+        attempts: Dict[Future, Tuple[str, Deadline]] = {}
+        errors: Dict[str, Exception] = {}
+
+        def launch_next() -> bool:
+            while candidates:
+                provider = candidates.pop(0)
+                if not self.breakers[provider].allow():
+                    logging.info(f"Skipping {provider}: circuit open")
+                    continue
+                attempt_deadline = Deadline(deadline.remaining())
+                provider_model = model if provider == self.provider_order[0] else None
+                future = _HEDGE_POOL.submit(
+                    self._call_provider, provider, prompt, provider_model, temperature, max_tokens, attempt_deadline
+                )
+                attempts[future] = (provider, attempt_deadline)
+                return True
+            return False
+
+        if not launch_next():
+            raise RuntimeError("No LLM provider available: every circuit breaker is open")
+        primary = next(iter(attempts.values()))[0]
+        done, _ = wait(attempts, timeout=min(self.latency[primary].hedge_delay(), max(0.0, deadline.remaining())))
+
+        while True:
+            for future in done:
+                provider, _ = attempts.pop(future)
+                try:
+                    text = future.result()
+                except Exception as e:
+                    errors[provider] = e
+                    continue
+                for loser, (loser_provider, loser_deadline) in attempts.items():
+                    loser_deadline.cancel()
+                    if loser.cancel():
+                        # Never started, so _call_provider cannot release its trial slot itself.
+                        self.breakers[loser_provider].release_trial()
+                return text
+
+            # Primary slow or failed: hedge (or fail over) to the next provider.
+            launch_next()
+            if not attempts:
+                raise RuntimeError(f"All LLM providers failed: {errors}")
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                for future, (attempt_provider, attempt_deadline) in attempts.items():
+                    attempt_deadline.cancel()
+                    if future.cancel():
+                        # Still queued: _call_provider will never run to release its trial slot.
+                        self.breakers[attempt_provider].release_trial()
+                raise DeadlineExceeded("No LLM provider answered before the deadline")
+            done, _ = wait(attempts, timeout=remaining, return_when=FIRST_COMPLETED)
+
+    async def agenerate(
+        self,
+        prompt: str,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        deadline: Union[Deadline, float, None] = None
+    ) -> str:
+        """
+        Coroutine version of `generate`, on the async HTTP client.
+
+        Same arguments, providers, hedging and circuit breakers. Cancelling the awaiting
+        task cancels every in-flight provider request.
+        """
+        provider = (provider or self.default_provider).lower()
+        if provider == "auto":
+            return await self._agenerate_hedged(prompt, model, temperature, max_tokens, self._deadline(deadline))
+        if provider not in PROVIDERS:
+            raise ValueError(f"Unsupported provider: {provider}. Use 'google', 'together_ai' or 'auto'")
+        return await self._acall_provider(provider, prompt, model, temperature, max_tokens, self._deadline(deadline))
+
+    async def _acall_provider(
+        self,
+        provider: str,
+        prompt: str,
+        model: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        deadline: Deadline
+    ) -> str:
+        """Coroutine version of `_call_provider`; a cancelled call is not counted against the provider."""
+        call = self._acall_google_ai if provider == "google" else self._acall_together_ai
+        start = time.monotonic()
+        settled = False
+        try:
+            text = await call(prompt, model, temperature, max_tokens, deadline)
+            settled = True
+        except Exception:
+            if not deadline.cancelled:
+                self.breakers[provider].record_failure()
+                settled = True
+            raise
+        finally:
+            if not settled:
+                # Lost hedge or CancelledError: free a half-open trial slot without judging the provider.
+                self.breakers[provider].release_trial()
+        self.breakers[provider].record_success()
+        self.latency[provider].record(time.monotonic() - start)
+        return text
+
+    async def _agenerate_hedged(
+        self,
+        prompt: str,
+        model: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        deadline: Deadline
+    ) -> str:
+        """Coroutine version of `_generate_hedged`: attempts are tasks, losers are cancelled."""
+        candidates = [provider for provider in self.provider_order if provider in PROVIDERS]
+        attempts: Dict["asyncio.Task[str]", Tuple[str, Deadline]] = {}
+        errors: Dict[str, Exception] = {}
+
+        def launch_next() -> bool:
+            while candidates:
+                provider = candidates.pop(0)
+                if not self.breakers[provider].allow():
+                    logging.info(f"Skipping {provider}: circuit open")
+                    continue
+                attempt_deadline = Deadline(deadline.remaining())
+                provider_model = model if provider == self.provider_order[0] else None
+                task = asyncio.ensure_future(self._acall_provider(
+                    provider, prompt, provider_model, temperature, max_tokens, attempt_deadline
+                ))
+                attempts[task] = (provider, attempt_deadline)
+                return True
+            return False
+
+        if not launch_next():
+            raise RuntimeError("No LLM provider available: every circuit breaker is open")
+        try:
+            primary = next(iter(attempts.values()))[0]
+            done, _ = await asyncio.wait(
+                attempts, timeout=min(self.latency[primary].hedge_delay(), max(0.0, deadline.remaining()))
+            )
+            while True:
+                for task in done:
+                    provider, _ = attempts.pop(task)
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        errors[provider] = e
+
+                # Primary slow or failed: hedge (or fail over) to the next provider.
+                launch_next()
+                if not attempts:
+                    raise RuntimeError(f"All LLM providers failed: {errors}")
+                remaining = deadline.remaining()
+                if remaining <= 0:
+                    raise DeadlineExceeded("No LLM provider answered before the deadline")
+                done, _ = await asyncio.wait(attempts, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # Losing hedges, or every attempt when the caller itself was cancelled.
+            for task, (attempt_provider, attempt_deadline) in attempts.items():
+                attempt_deadline.cancel()
+                # A task cancelled before its first step never reaches _acall_provider's finally;
+                # one that has started releases its own slot there, and must not release it twice.
+                never_started = inspect.getcoroutinestate(task.get_coro()) == inspect.CORO_CREATED
+                task.cancel()
+                if never_started:
+                    self.breakers[attempt_provider].release_trial()
+
+    @staticmethod
+    def _iter_sse(response: requests.Response) -> Iterator[Dict[str, Any]]:
+        """Yield the JSON payload of each `data:` event of a server-sent events response."""
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                return
+            yield json.loads(data)
+
+    def _stream_google_ai(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        deadline: Union[Deadline, float, None] = None
+    ) -> Iterator[str]:
+        """Stream a Google AI completion chunk by chunk."""
+        with self.http_client.post(
+            self.google_stream_endpoint.format(model=model or self.default_google_model),
+            headers={"Content-Type": "application/json"},
+            json=self._google_payload(prompt, temperature, max_tokens),
+            params={"key": self._google_key(), "alt": "sse"},
+            stream=True,
+            deadline=self._deadline(deadline),
+        ) as response:
+            for event in self._iter_sse(response):
+                for candidate in event.get("candidates", [])[:1]:
+                    for part in candidate.get("content", {}).get("parts", []):
+                        if part.get("text"):
+                            yield part["text"]
+
+    def _stream_together_ai(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        deadline: Union[Deadline, float, None] = None
+    ) -> Iterator[str]:
+        """Stream a Together AI completion token by token."""
+        payload = {**self._together_payload(prompt, model, temperature, max_tokens), "stream": True}
+
+        with self.http_client.post(
+            self.together_endpoint,
+            headers=self._together_headers(),
+            json=payload,
+            stream=True,
+            deadline=self._deadline(deadline),
+        ) as response:
+            for event in self._iter_sse(response):
+                for choice in event.get("choices", [])[:1]:
+                    text = choice.get("delta", {}).get("content")
+                    if text:
+                        yield text
+
+    def generate_stream(
+        self,
+        prompt: str,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        deadline: Union[Deadline, float, None] = None
+    ) -> Iterator[str]:
+        """
+        Stream generated text from the provider's SSE endpoint as it is produced.
+
+        Args:
+            prompt: Prompt to send
+            provider: LLM provider to use ("google", "together_ai" or "auto"; defaults to default_provider)
+            model: Specific model to use (overrides default; in auto mode, for the first provider only)
+            temperature: Temperature for generation (overrides default)
+            max_tokens: Max tokens for generation (overrides default)
+            deadline: Deadline or seconds from now until the stream starts (defaults to request_deadline)
+
+        Yields:
+            Text chunks, in order
+        """
+        provider = (provider or self.default_provider).lower()
+        if provider == "auto":
+            return self._stream_failover(prompt, model, temperature, max_tokens, self._deadline(deadline))
+        if provider == "google":
+            return self._stream_google_ai(prompt, model, temperature, max_tokens, deadline)
+        elif provider == "together_ai":
+            return self._stream_together_ai(prompt, model, temperature, max_tokens, deadline)
         else:
-            raise ValueError(f"Unsupported provider: {provider}. Use 'google' or 'together_ai'")
\ No newline at end of file
+            raise ValueError(f"Unsupported provider: {provider}. Use 'google', 'together_ai' or 'auto'")
+
+    def _stream_failover(
+        self,
+        prompt: str,
+        model: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        deadline: Deadline
+    ) -> Iterator[str]:
+        """
+        Stream from the first provider whose circuit is closed, moving on to the next one if it
+        fails before producing any text. Streams are not hedged: the answer is already on screen
+        before a hedge could help.
+        """
+        errors: Dict[str, Exception] = {}
+        for provider in self.provider_order:
+            if not self.breakers[provider].allow():
+                continue
+            stream = self._stream_google_ai if provider == "google" else self._stream_together_ai
+            provider_model = model if provider == self.provider_order[0] else None
+            started = False
+            settled = False
+            try:
+                for text in stream(prompt, provider_model, temperature, max_tokens, deadline):
+                    started = True
+                    yield text
+            except Exception as e:
+                self.breakers[provider].record_failure()
+                settled = True
+                if started:
+                    raise
+                errors[provider] = e
+                continue
+            finally:
+                if not settled:
+                    # Also reached on GeneratorExit when the consumer drops the stream.
+                    self.breakers[provider].release_trial()
+            self.breakers[provider].record_success()
+            return
+        raise RuntimeError(f"All LLM providers failed: {errors or 'every circuit breaker is open'}")
@@ -0,0 +1,104 @@
+"""
+Latency tracking and circuit breaking for the LLM providers.
+
+`LatencyTracker` keeps a window of recent successful latencies per provider; its
+percentile is the point after which a request is considered slow and worth
+hedging. `CircuitBreaker` takes a provider out of rotation after repeated
+failures and lets a single trial request through once its cool-down is over.
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque
+
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 95))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", 3))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", 0.5))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", 30))
+
+
+class LatencyTracker:
+    """Sliding window of latencies, in seconds."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float, default: float) -> float:
+        """q-th percentile of the window, or `default` until enough samples were seen."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return default
+            samples = sorted(self._samples)
+        # Nearest-rank percentile: always an observed latency.
+        return samples[max(0, math.ceil(q / 100 * len(samples)) - 1)]
+
+    def hedge_delay(
+        self,
+        q: float = LLM_HEDGE_PERCENTILE,
+        default: float = LLM_HEDGE_DEFAULT_DELAY,
+        minimum: float = LLM_HEDGE_MIN_DELAY,
+    ) -> float:
+        """How long to wait for the primary before firing a hedged request."""
+        return max(minimum, self.percentile(q, default))
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures; open -> half-open
+    after `reset_timeout` seconds, where one trial request decides whether it closes again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = LLM_BREAKER_FAILURES, reset_timeout: float = LLM_BREAKER_RESET):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a request may be sent to this provider now."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def release_trial(self):
+        """End a call that neither succeeded nor failed (cancelled hedge, abandoned stream), keeping the state."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
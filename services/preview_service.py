@@ -0,0 +1,203 @@
+"""
+Lightweight previews of cited PDF pages.
+
+A preview is the cited page rendered to a small grayscale image (pypdfium2, optional)
+or, without a renderer, its extracted text. Previews live in a content-addressed
+disk cache, `<PREVIEW_CACHE_DIR>/<sha[:2]>/<sha256>-p<page>-<variant>.<ext>`: the
+same page of the same file is rendered once, whatever its path and for every
+user, and an edited PDF gets new keys instead of stale previews.
+
+`prerender()` starts rendering the pages of the top results in a background pool,
+so they are ready by the time the LLM answer has streamed.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from services.document_service import DocumentRef
+from services.rag_service.models import SearchResult
+from utils.logger import span
+
+PREVIEW_CACHE_DIR = os.getenv("PREVIEW_CACHE_DIR", "data/cache/previews")
+# "image" (falls back to "text" when pypdfium2 is not installed) or "text"
+PREVIEW_FORMAT = os.getenv("PREVIEW_FORMAT", "image")
+PREVIEW_WIDTH = int(os.getenv("PREVIEW_WIDTH", "800"))
+PREVIEW_QUALITY = int(os.getenv("PREVIEW_QUALITY", "60"))
+PREVIEW_TEXT_CHARS = int(os.getenv("PREVIEW_TEXT_CHARS", "1500"))
+PREVIEW_WORKERS = int(os.getenv("PREVIEW_WORKERS", "2"))
+
+# PDFium is not thread-safe: one render at a time per process.
+_PDFIUM_LOCK = threading.Lock()
+
+
+@dataclass(frozen=True)
+class PagePreview:
+    """A cached preview file"""
+    path: str
+    media_type: str
+    page_index: int
+    file_name: str
+
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path)
+
+    def read(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def text(self) -> str:
+        with open(self.path, encoding="utf-8") as f:
+            return f.read()
+
+
+def _has_renderer() -> bool:
+    try:
+        import pypdfium2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class PreviewService:
+    """Renders, caches and pre-renders page previews."""
+
+    def __init__(
+        self,
+        cache_dir: str = PREVIEW_CACHE_DIR,
+        preview_format: str = PREVIEW_FORMAT,
+        width: int = PREVIEW_WIDTH,
+        quality: int = PREVIEW_QUALITY,
+        text_chars: int = PREVIEW_TEXT_CHARS,
+        workers: int = PREVIEW_WORKERS,
+    ):
+        if preview_format == "image" and not _has_renderer():
+            logging.warning("pypdfium2 is not installed, page previews fall back to text")
+            preview_format = "text"
+        if preview_format not in ("image", "text"):
+            raise ValueError(f"Unknown preview format: {preview_format}")
+        self.cache_dir = cache_dir
+        self.preview_format = preview_format
+        self.width = width
+        self.quality = quality
+        self.text_chars = text_chars
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preview")
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def variant(self) -> str:
+        """Everything besides file and page that changes the preview, part of its key"""
+        if self.preview_format == "image":
+            return f"w{self.width}q{self.quality}.webp"
+        return f"t{self.text_chars}.txt"
+
+    @property
+    def media_type(self) -> str:
+        return "image/webp" if self.preview_format == "image" else "text/plain"
+
+    def _cache_path(self, sha256: str, page_index: int) -> str:
+        return os.path.join(self.cache_dir, sha256[:2], f"{sha256}-p{page_index}-{self.variant}")
+
+    def preview(self, ref: DocumentRef) -> Optional[PagePreview]:
+        """Preview of the cited page, from the cache or rendered now; None if the page cannot be found."""
+        handle = ref.open()
+        page_index = handle.page_index(ref.page_label, ref.page)
+        if page_index is None:
+            return None
+        path = self._cache_path(handle.sha256(), page_index)
+        preview = PagePreview(path, self.media_type, page_index, ref.file_name)
+        if os.path.exists(path):
+            return preview
+
+        # Concurrent requests for the same page share one render.
+        with self._lock:
+            future = self._pending.get(path)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._pending[path] = future
+        if not owner:
+            future.result()
+            return preview
+        try:
+            with span("preview_render", format=self.preview_format) as render_span:
+                data = self._render(ref.path, handle, page_index)
+                self._write(path, data)
+                render_span.set(bytes=len(data))
+            future.set_result(path)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(path, None)
+        return preview
+
+    def _render(self, pdf_path: str, handle, page_index: int) -> bytes:
+        if self.preview_format == "text":
+            text = " ".join(handle.page_text(page_index).split())
+            if len(text) > self.text_chars:
+                text = text[: self.text_chars].rsplit(" ", 1)[0] + " …"
+            return text.encode("utf-8")
+
+        import pypdfium2 as pdfium
+
+        with _PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(pdf_path)
+            try:
+                page = pdf[page_index]
+                image = page.render(scale=self.width / page.get_width()).to_pil()
+                page.close()
+            finally:
+                pdf.close()
+        buffer = io.BytesIO()
+        # Legal texts are black on white: grayscale keeps previews at a few dozen KB.
+        image.convert("L").save(buffer, format="WEBP", quality=self.quality)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def prerender(self, results: List[SearchResult]) -> List["Future[Optional[PagePreview]]"]:
+        """Render the previews of results with a resolved document in the background."""
+        return [self._pool.submit(self._safe_preview, result.document) for result in results if result.document]
+
+    def _safe_preview(self, ref: DocumentRef) -> Optional[PagePreview]:
+        try:
+            return self.preview(ref)
+        except Exception as e:
+            logging.warning(f"Could not render a preview of {ref.file_name} page {ref.page_label}: {e}")
+            return None
+
+    def previews(self, results: List[SearchResult]) -> List[PagePreview]:
+        """Previews of the results' cited pages, in result order (instant once pre-rendered)."""
+        previews = []
+        for result in results:
+            if result.document is not None:
+                preview = self._safe_preview(result.document)
+                if preview is not None:
+                    previews.append(preview)
+        return previews
+
+
+_preview_service: Optional[PreviewService] = None
+_preview_lock = threading.Lock()
+
+
+def get_preview_service() -> PreviewService:
+    """Get singleton preview service instance"""
+    global _preview_service
+    with _preview_lock:
+        if _preview_service is None:
+            _preview_service = PreviewService()
+        return _preview_service
@@ -1,23 +1,64 @@
 import sys
 import os
+from typing import Iterator, List, Optional, Tuple
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 from services.rag_service.rag_service import get_rag_service
+from services.rag_service.models import SearchResult
+from services.preview_service import PagePreview, get_preview_service
 
-def process_query(query: str, doc_types: list, retriever_type: str, retriever_params: dict,
-                  start_year: int, end_year: int, max_results: int) -> str:
-    rag_service = get_rag_service()
-    results = rag_service.search_documents(query, retriever_type, retriever_params, 
-                                         doc_types, start_year, end_year, max_results)
-    sources_formatted = "\n\n".join([
+def format_sources(sources: List[SearchResult]) -> str:
+    return "\n\n".join([
         f"***Chunk {i+1}:*** \n **Doc Title**:{source.metadata['metadata']} \n{source.content} \n The Chunk was founded in page {source.metadata.get('page_label', 'Unknown')}" 
-        for i, source in enumerate(results.sources)
+        for i, source in enumerate(sources)
     ])
-    
+
+def format_response(answer: str, sources_formatted: str) -> str:
     return f"""**Response Based on Retrieved Context:**
 
-    {results.answer}
+    {answer}
 
     **Retrieved Chunks:**
 
     {sources_formatted}
     """
+
+def process_query(query: str, doc_types: list, retriever_type: str, retriever_params: dict,
+                  start_year: int, end_year: int, max_results: int) -> str:
+    rag_service = get_rag_service()
+    results = rag_service.search_documents(query, retriever_type, retriever_params, 
+                                         doc_types, start_year, end_year, max_results)
+    return format_response(results.answer, format_sources(results.sources))
+
+async def aprocess_query(query: str, doc_types: list, retriever_type: str, retriever_params: dict,
+                         start_year: int, end_year: int, max_results: int) -> str:
+    """Coroutine variant of process_query, for callers already running an event loop."""
+    rag_service = get_rag_service()
+    results = await rag_service.asearch_documents(query, retriever_type, retriever_params,
+                                                  doc_types, start_year, end_year, max_results)
+    return format_response(results.answer, format_sources(results.sources))
+
+def process_query_batch(queries: List[str], doc_types: list, retriever_type: str, retriever_params: dict,
+                        start_year: int, end_year: int, max_results: int,
+                        max_concurrency: Optional[int] = None) -> List[str]:
+    """Batch variant of process_query: one formatted response per query, or its error message if it failed."""
+    rag_service = get_rag_service()
+    kwargs = {"max_concurrency": max_concurrency} if max_concurrency else {}
+    batch = rag_service.search_documents_batch(queries, retriever_type, retriever_params,
+                                               doc_types, start_year, end_year, max_results, **kwargs)
+    return [
+        format_response(response.answer, format_sources(response.sources)) if response is not None
+        else f"**Error:** {batch.errors[i]}"
+        for i, response in enumerate(batch.responses)
+    ]
+
+def process_query_stream(query: str, doc_types: list, retriever_type: str, retriever_params: dict,
+                         start_year: int, end_year: int, max_results: int) -> Tuple[Iterator[str], str, List[SearchResult]]:
+    """Streaming variant of process_query: the answer token iterator, the formatted sources and the sources."""
+    rag_service = get_rag_service()
+    results = rag_service.search_documents_stream(query, retriever_type, retriever_params,
+                                                  doc_types, start_year, end_year, max_results)
+    return results.answer_stream, format_sources(results.sources), results.sources
+
+def cited_page_previews(sources: List[SearchResult]) -> List[PagePreview]:
+    """Previews of the pages the sources were taken from (pre-rendered during generation)."""
+    return get_preview_service().previews(sources)
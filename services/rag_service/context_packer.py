@@ -0,0 +1,113 @@
+"""
+Token-budget-aware context packing for the answer prompt.
+
+Retrieved chunks are taken in ranking order and added to the context until the
+prompt budget is spent. A chunk longer than `max_chunk_tokens` is trimmed down
+to its sentences that share the most terms with the query, kept in their
+original order. Every chunk keeps a `[Chunk n]` marker, numbered like the
+"Retrieved Chunks" shown to the user, so the answer can cite it.
+"""
+import os
+from dataclasses import dataclass, field
+from typing import List, Set
+
+from services.rag_service.models import SearchResult
+from utils.text_processing import CHARS_PER_TOKEN, estimate_tokens, split_sentences, tokenize
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_MAX_CHUNK_TOKENS = int(os.getenv("CONTEXT_MAX_CHUNK_TOKENS", "400"))
+# A chunk that would have to be cut below this is left out instead.
+CONTEXT_MIN_CHUNK_TOKENS = int(os.getenv("CONTEXT_MIN_CHUNK_TOKENS", "60"))
+
+ELISION = " […] "
+
+
+@dataclass
+class PackedContext:
+    """Prompt context and what went into it"""
+    text: str
+    tokens: int
+    used: List[int] = field(default_factory=list)  # positions in the search results
+    trimmed: int = 0
+
+
+def source_marker(position: int, result: SearchResult) -> str:
+    """Citation header of a chunk: its display number, title and page."""
+    title = result.metadata.get("metadata") or os.path.basename(str(result.metadata.get("source", ""))) or "Unknown"
+    return f"[Chunk {position + 1}] {title}, page {result.metadata.get('page_label', 'Unknown')}"
+
+
+class ContextPacker:
+    """Packs the best evidence into a fixed prompt budget."""
+
+    def __init__(
+        self,
+        token_budget: int = CONTEXT_TOKEN_BUDGET,
+        max_chunk_tokens: int = CONTEXT_MAX_CHUNK_TOKENS,
+        min_chunk_tokens: int = CONTEXT_MIN_CHUNK_TOKENS,
+    ):
+        self.token_budget = token_budget
+        self.max_chunk_tokens = max_chunk_tokens
+        self.min_chunk_tokens = min_chunk_tokens
+
+    @staticmethod
+    def _query_terms(query: str) -> Set[str]:
+        # Terms of one or two letters are mostly French articles and prepositions ("de", "la", "l").
+        return {term for term in tokenize(query) if len(term) > 2}
+
+    def trim(self, text: str, query_terms: Set[str], max_tokens: int) -> str:
+        """Keep the sentences sharing the most terms with the query, in document order, within `max_tokens`."""
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        sentences = split_sentences(text)
+        overlap = [len(query_terms.intersection(tokenize(sentence))) for sentence in sentences]
+        # Best overlap first; among equals, earlier sentences first. Sentences sharing no
+        # query term are only used when none does (the chunk then keeps its beginning).
+        ranked = sorted(range(len(sentences)), key=lambda i: (-overlap[i], i))
+        if overlap and max(overlap) > 0:
+            ranked = [i for i in ranked if overlap[i] > 0]
+
+        kept: List[int] = []
+        used_tokens = 0
+        for i in ranked:
+            cost = estimate_tokens(sentences[i]) + 1
+            if used_tokens + cost > max_tokens:
+                continue
+            kept.append(i)
+            used_tokens += cost
+        if not kept:
+            # A single sentence longer than the cap: keep its beginning.
+            return text[: int(max_tokens * CHARS_PER_TOKEN)].rstrip() + ELISION.rstrip()
+
+        kept.sort()
+        pieces = [sentences[kept[0]]]
+        for previous, current in zip(kept, kept[1:]):
+            pieces.append((" " if current == previous + 1 else ELISION) + sentences[current])
+        return "".join(pieces)
+
+    def pack(self, query: str, search_results: List[SearchResult]) -> PackedContext:
+        """Context for `query` from results in ranking order, within the token budget."""
+        query_terms = self._query_terms(query)
+        blocks: List[str] = []
+        packed = PackedContext(text="", tokens=0)
+        seen = set()
+
+        for position, result in enumerate(search_results):
+            if result.chunk_id in seen:
+                continue
+            seen.add(result.chunk_id)
+
+            marker = source_marker(position, result)
+            remaining = self.token_budget - packed.tokens - estimate_tokens(marker) - 2
+            if remaining < self.min_chunk_tokens:
+                break
+            content = self.trim(result.content, query_terms, min(self.max_chunk_tokens, remaining))
+            if content != result.content:
+                packed.trimmed += 1
+            block = f"{marker}\n{content}"
+            blocks.append(block)
+            packed.used.append(position)
+            packed.tokens += estimate_tokens(block) + 1
+
+        packed.text = "\n\n".join(blocks)
+        return packed
@@ -0,0 +1,63 @@
+"""
+Near-duplicate collapsing of retrieved chunks.
+
+Every chunk carries a 64-bit SimHash of its word shingles (`simhash` metadata,
+computed at ingest; computed on the fly for stores ingested before it existed).
+Two chunks are near-duplicates when their fingerprints differ in at most
+`max_distance` bits. The fingerprint is cut into `max_distance + 1` bands: by
+the pigeonhole principle near-duplicates agree on at least one whole band, so
+only chunks sharing a band bucket are compared and collapsing stays linear in k
+in practice.
+"""
+import os
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from services.rag_service.models import SearchResult
+from utils.text_processing import SIMHASH_BITS, hamming_distance, simhash
+
+# Minimum SimHash similarity (1 - hamming / 64) for two chunks to count as the same text; <= 0 disables.
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.85"))
+
+
+def chunk_simhash(result: SearchResult) -> int:
+    fingerprint = result.metadata.get("simhash")
+    if fingerprint:
+        return int(fingerprint, 16)
+    return simhash(result.content)
+
+
+def _bands(fingerprint: int, num_bands: int) -> List[Tuple[int, int]]:
+    width = SIMHASH_BITS // num_bands
+    bands = []
+    for band in range(num_bands):
+        # The last band takes the remaining bits.
+        bits = width if band < num_bands - 1 else SIMHASH_BITS - width * band
+        bands.append((band, (fingerprint >> (band * width)) & ((1 << bits) - 1)))
+    return bands
+
+
+def collapse_near_duplicates(
+    search_results: List[SearchResult],
+    threshold: float = NEAR_DUPLICATE_THRESHOLD,
+) -> List[SearchResult]:
+    """Keep the best-ranked chunk of every group of near-identical chunks, preserving order."""
+    if threshold <= 0 or len(search_results) < 2:
+        return search_results
+    max_distance = int((1 - threshold) * SIMHASH_BITS)
+    num_bands = max_distance + 1
+
+    buckets: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+    kept_fingerprints: List[int] = []
+    kept: List[SearchResult] = []
+    for result in search_results:
+        fingerprint = chunk_simhash(result)
+        bands = _bands(fingerprint, num_bands)
+        candidates = {i for band in bands for i in buckets.get(band, ())}
+        if any(hamming_distance(fingerprint, kept_fingerprints[i]) <= max_distance for i in candidates):
+            continue
+        for band in bands:
+            buckets[band].append(len(kept))
+        kept_fingerprints.append(fingerprint)
+        kept.append(result)
+    return kept
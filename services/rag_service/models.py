@@ -1,6 +1,10 @@
 from enum import Enum
-from typing import Dict, Any, List, Optional
+from typing import TYPE_CHECKING, Dict, Any, Iterator, List, Optional
 from dataclasses import dataclass
+import hashlib
+
+if TYPE_CHECKING:
+    from services.document_service import DocumentRef
 
 class DocumentType(Enum):
     """Supported document types"""
@@ -29,6 +33,14 @@ class SearchResult:
     document_type: list[str]
     metadata: Dict[str, Any]
     binary: Optional[bytes]= None
+    raw_score: Optional[float] = None  # native backend score; relevance_score is normalized to [0, 1]
+    document: Optional["DocumentRef"] = None  # source PDF, served on demand; `binary` only holds the cited page
+
+    @property
+    def chunk_id(self) -> str:
+        """Stable chunk identifier, identical whichever backend returned the chunk"""
+        key = f"{self.metadata.get('source', '')}|{self.metadata.get('page_label', '')}|{self.content}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
 
 @dataclass
 class RAGResponse:
@@ -41,6 +53,27 @@ class RAGResponse:
     processing_time: float
 
 
+@dataclass
+class RAGBatchResponse:
+    """Structure for a batch of RAG queries answered together"""
+    # In query order; None where the query failed. Their processing_time covers the query's own
+    # answer cache lookup or generation and PDF fetch, not the shared embedding and search stages.
+    responses: List[Optional[RAGResponse]]
+    errors: Dict[int, str]  # query index -> error
+    stage_timings: Dict[str, float]  # seconds per stage, summed over the batch (concurrent stages exceed processing_time)
+    processing_time: float  # whole batch
+
+
+@dataclass
+class RAGStreamResponse:
+    """Structure for a streamed RAG response: sources are known upfront, the answer arrives in chunks"""
+    answer_stream: Iterator[str]
+    sources: List[SearchResult]
+    confidence_score: float
+    query: str
+    retriever_used: str
+
+
 @dataclass
 class RetrieverConfig:
     """Configuration for retriever"""
@@ -1,13 +1,42 @@
 """
 RAG Service - Main orchestration for Retrieval-Augmented Generation
 """
-from langchain.prompts import PromptTemplate
-from typing import List, Dict, Any, Optional
-from ..rag_service.models import RetrieverConfig, RAGResponse, RetrieverType, SearchResult
-from services.retriever_service import BaseRetriever
+import asyncio
+import contextvars
+import dataclasses
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+from ..rag_service.models import RetrieverConfig, RAGBatchResponse, RAGResponse, RAGStreamResponse, RetrieverType, SearchResult
+from services.retriever_service.base_retriever import BaseRetriever
 from services.llm_service.rag.rag_llm_service import RagLLMService
 from services.document_service import DocumentFinder
-from utils.helpers import RETRIEVER_REGISTRY
+from services.preview_service import get_preview_service
+from services.rag_service.context_packer import ContextPacker
+from services.rag_service.deduplication import collapse_near_duplicates
+from services.rag_service.reranker import Reranker
+from services.cache_service import ANSWER_CACHE, make_answer_scope
+from utils.helpers import get_embeddings, get_retriever, uses_embeddings
+from utils.async_runner import run_sync
+from utils.logger import Trace, span, start_trace, use_trace
+
+# Threads running the blocking stages (embedding, index search, PDF reads) of the coroutine pipeline.
+RAG_EXECUTOR_WORKERS = int(os.getenv("RAG_EXECUTOR_WORKERS", "8"))
+# LLM calls in flight at once for a batch of queries; keep it under the provider's rate limit.
+RAG_BATCH_CONCURRENCY = int(os.getenv("RAG_BATCH_CONCURRENCY", "8"))
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=RAG_EXECUTOR_WORKERS, thread_name_prefix="rag")
+
+T = TypeVar("T")
+
+
+async def _offload(fn: Callable[..., T], *args: Any) -> T:
+    """Run blocking work on the RAG executor, in a copy of the caller's context so its spans join the trace"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_EXECUTOR, contextvars.copy_context().run, fn, *args)
+
 
 class RAGService:
     """Main RAG orchestration service"""
@@ -15,22 +44,14 @@ class RAGService:
     def __init__(self):
         """Initialize RAG service with vector DB and LLM connections"""
         self.llm = RagLLMService()
+        self.answer_cache = ANSWER_CACHE
+        self.context_packer = ContextPacker()
+        self.reranker = Reranker()
+        self.previews = get_preview_service()
 
     def _get_retriever(self, retriever_type: str, params: Dict[str, Any], doc_types: List[str]) -> BaseRetriever:
-        """Get and configure the appropriate retriever"""
-        
-
-        config = RetrieverConfig(
-            type=RetrieverType(retriever_type),
-            params=params,
-            document_types=doc_types # type: ignore
-        )
-
-        retriever_cls = RETRIEVER_REGISTRY.get(retriever_type, RETRIEVER_REGISTRY["faiss_retriever"])
-        retriever = retriever_cls(config)
-
-        retriever.initialize_connection()
-        return retriever
+        """Get and configure the appropriate retriever (shared through the retriever cache)"""
+        return get_retriever(retriever_type, params, doc_types)
     
     def search_documents(
         self, 
@@ -44,6 +65,8 @@ class RAGService:
     ) -> RAGResponse:
         """
         Main RAG pipeline: search + generate
+
+        Blocking wrapper around `asearch_documents`, run on the shared background event loop.
         
         Args:
             query: User's legal question
@@ -55,26 +78,350 @@ class RAGService:
         Returns:
             RAGResponse with answer and sources
         """
+        return run_sync(self.asearch_documents(
+            query, retriever_type, params, doc_types, start_year, end_year, max_results
+        ))
 
-        retriever = self._get_retriever(retriever_type, params, doc_types)
+    async def asearch_documents(
+        self,
+        query: str,
+        retriever_type: str,
+        params: dict[str, Any],
+        doc_types: List[str],
+        start_year: Optional[int] = None,
+        end_year: Optional[int] = None,
+        max_results: int = 10
+    ) -> RAGResponse:
+        """
+        Coroutine RAG pipeline, same arguments and result as search_documents
 
-        search_results = self._vector_search(
-            query, retriever, doc_types, start_year, end_year, max_results
-        )
-        search_results = self._add_binary(search_results, doc_types)
-        
-        answer = self._generate_answer(query, search_results)
-        
+        Blocking stages run on the RAG executor. Once the chunks are retrieved, the
+        cited PDF pages are fetched while the prompt is packed and the LLM generates,
+        so the PDF fetch costs nothing unless it outlasts generation. Cancelling the
+        task (the user navigated away) cancels the provider requests and abandons
+        the fetch; the trace is logged with error=CancelledError.
+        """
+        with start_trace("search_documents", retriever=retriever_type, doc_types=doc_types) as trace:
+            scope = make_answer_scope(retriever_type, doc_types, start_year, end_year, max_results, params)
+            query_vector = await _offload(self._query_vector, query, retriever_type, params)
+            cached = self._cached_answer(query, query_vector, scope)
+            if cached is not None:
+                trace.attributes["answer_cache"] = "hit"
+                return dataclasses.replace(cached, processing_time=trace.elapsed())
+
+            search_results = await _offload(
+                self._search, query, retriever_type, params, doc_types, start_year, end_year, max_results
+            )
+
+            fetch = asyncio.ensure_future(_offload(self._add_binary, search_results, doc_types))
+            try:
+                answer = await self._agenerate_answer(query, search_results)
+                search_results = await fetch
+            finally:
+                # No-op once the fetch is done; otherwise its result is no longer wanted.
+                fetch.cancel()
+
+            confidence = self._calculate_confidence(search_results)
+            
+            response = RAGResponse(
+                answer=answer,
+                sources=search_results,
+                confidence_score=confidence,
+                query=query,
+                retriever_used=retriever_type,
+                processing_time=trace.elapsed()
+            )
+            if query_vector is not None:
+                self.answer_cache.put(query_vector, scope, response)
+            return response
+
+    def search_documents_batch(
+        self,
+        queries: List[str],
+        retriever_type: str,
+        params: dict[str, Any],
+        doc_types: List[str],
+        start_year: Optional[int] = None,
+        end_year: Optional[int] = None,
+        max_results: int = 10,
+        max_concurrency: int = RAG_BATCH_CONCURRENCY
+    ) -> RAGBatchResponse:
+        """
+        Answer many queries sharing the same settings (regression sets, audits)
+
+        Blocking wrapper around `asearch_documents_batch`.
+        """
+        return run_sync(self.asearch_documents_batch(
+            queries, retriever_type, params, doc_types, start_year, end_year, max_results, max_concurrency
+        ))
+
+    async def asearch_documents_batch(
+        self,
+        queries: List[str],
+        retriever_type: str,
+        params: dict[str, Any],
+        doc_types: List[str],
+        start_year: Optional[int] = None,
+        end_year: Optional[int] = None,
+        max_results: int = 10,
+        max_concurrency: int = RAG_BATCH_CONCURRENCY
+    ) -> RAGBatchResponse:
+        """
+        Batched RAG pipeline
+
+        The queries are embedded in one model call and searched with one batched index
+        scan; then at most `max_concurrency` LLM calls run at once, each overlapped
+        with its PDF fetch as in asearch_documents. A failing query is reported in
+        `errors` without failing the batch.
+
+        Args:
+            queries: User questions
+            max_concurrency: LLM calls in flight at once
+            (other arguments as in search_documents, shared by every query)
+
+        Returns:
+            RAGBatchResponse with one RAGResponse per query and the time spent in each stage
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        with start_trace(
+            "search_documents_batch", retriever=retriever_type, doc_types=doc_types, queries=len(queries)
+        ) as trace:
+            scope = make_answer_scope(retriever_type, doc_types, start_year, end_year, max_results, params)
+            responses: List[Optional[RAGResponse]] = [None] * len(queries)
+            errors: Dict[int, str] = {}
+
+            query_vectors = await _offload(self._query_vectors, queries, retriever_type, params)
+            pending = []
+            for i, (query, query_vector) in enumerate(zip(queries, query_vectors)):
+                lookup_start = time.perf_counter()
+                cached = self._cached_answer(query, query_vector, scope)
+                if cached is not None:
+                    responses[i] = dataclasses.replace(cached, processing_time=time.perf_counter() - lookup_start)
+                else:
+                    pending.append(i)
+            trace.attributes["answer_cache_hits"] = len(queries) - len(pending)
+
+            batch_results = await _offload(
+                self._search_batch, [queries[i] for i in pending], retriever_type, params,
+                doc_types, start_year, end_year, max_results
+            )
+
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+            async def answer(i: int, search_results: List[SearchResult]):
+                async with semaphore:
+                    # Timed from here: the shared stages and the wait for a slot are not this query's own.
+                    start = time.perf_counter()
+                    # No preview pre-rendering: nobody displays the pages of a batch.
+                    fetch = asyncio.ensure_future(_offload(self._add_binary, search_results, doc_types, False))
+                    try:
+                        text = await self._agenerate_answer(queries[i], search_results)
+                        search_results = await fetch
+                    finally:
+                        fetch.cancel()
+                responses[i] = RAGResponse(
+                    answer=text,
+                    sources=search_results,
+                    confidence_score=self._calculate_confidence(search_results),
+                    query=queries[i],
+                    retriever_used=retriever_type,
+                    processing_time=time.perf_counter() - start
+                )
+                if query_vectors[i] is not None:
+                    self.answer_cache.put(query_vectors[i], scope, responses[i])
+
+            outcomes = await asyncio.gather(
+                *(answer(i, results) for i, results in zip(pending, batch_results)), return_exceptions=True
+            )
+            for i, outcome in zip(pending, outcomes):
+                if isinstance(outcome, BaseException):
+                    logging.warning(f"Batch query {i} failed: {outcome!r}")
+                    errors[i] = f"{type(outcome).__name__}: {outcome}"
+            trace.attributes["errors"] = len(errors)
+
+            stage_timings: Dict[str, float] = {}
+            for stage in trace.snapshot():
+                stage_timings[stage.name] = stage_timings.get(stage.name, 0.0) + stage.duration
+            return RAGBatchResponse(
+                responses=responses,
+                errors=errors,
+                stage_timings=stage_timings,
+                processing_time=trace.elapsed()
+            )
+
+    def search_documents_stream(
+        self,
+        query: str,
+        retriever_type: str,
+        params: dict[str, Any],
+        doc_types: List[str],
+        start_year: Optional[int] = None,
+        end_year: Optional[int] = None,
+        max_results: int = 10
+    ) -> RAGStreamResponse:
+        """
+        Streaming RAG pipeline: retrieval runs eagerly, generation is returned as a token iterator
+
+        Same arguments as search_documents. The sources can be rendered right away
+        while the caller consumes `answer_stream`; their cited PDF pages are fetched
+        on the RAG executor during generation and attached to them (in place) by the
+        time the stream is exhausted. The request trace is finished when the stream
+        is exhausted (or closed).
+        """
+        # Not a `with start_trace(...)` block: the trace outlives this call until the stream ends.
+        trace = Trace("search_documents_stream", retriever=retriever_type, doc_types=doc_types)
+        try:
+            with use_trace(trace):
+                scope = make_answer_scope(retriever_type, doc_types, start_year, end_year, max_results, params)
+                query_vector = self._query_vector(query, retriever_type, params)
+                cached = self._cached_answer(query, query_vector, scope)
+                if cached is not None:
+                    trace.finish(answer_cache="hit")
+                    return RAGStreamResponse(
+                        answer_stream=iter([cached.answer]),
+                        sources=cached.sources,
+                        confidence_score=cached.confidence_score,
+                        query=query,
+                        retriever_used=retriever_type
+                    )
+
+                search_results = self._search(
+                    query, retriever_type, params, doc_types, start_year, end_year, max_results
+                )
+                # Submitted from inside use_trace so the copied context carries the trace.
+                fetch = _EXECUTOR.submit(contextvars.copy_context().run, self._add_binary, search_results, doc_types)
+        except Exception as e:
+            trace.finish(error=type(e).__name__)
+            raise
         confidence = self._calculate_confidence(search_results)
-        
-        return RAGResponse(
-            answer=answer,
+
+        def answer_stream() -> Iterator[str]:
+            chunks = []
+            try:
+                prompt = self._pack_prompt(query, search_results, trace)
+                with span("llm_call", trace=trace) as llm_span:
+                    for chunk in self.llm.generate_stream(prompt):
+                        if not chunks:
+                            llm_span.set(first_chunk_ms=round((time.perf_counter() - llm_span.start) * 1000, 2))
+                        chunks.append(chunk)
+                        yield chunk
+                    llm_span.set(bytes=sum(len(chunk.encode("utf-8")) for chunk in chunks))
+                enriched = fetch.result()
+            except Exception as e:
+                trace.finish(error=type(e).__name__)
+                raise
+            finally:
+                # No-op once the fetch has started; a stream closed early does not wait for it.
+                fetch.cancel()
+                trace.finish()
+            # Only an answer that streamed to completion is worth caching.
+            if query_vector is not None:
+                self.answer_cache.put(query_vector, scope, RAGResponse(
+                    answer="".join(chunks),
+                    sources=enriched,
+                    confidence_score=confidence,
+                    query=query,
+                    retriever_used=retriever_type,
+                    processing_time=trace.duration or 0
+                ))
+
+        return RAGStreamResponse(
+            answer_stream=answer_stream(),
             sources=search_results,
             confidence_score=confidence,
             query=query,
-            retriever_used=retriever_type,
-            processing_time=0
+            retriever_used=retriever_type
         )
+
+    def _answer_cache_applies(self, retriever_type: str, params: dict[str, Any]) -> bool:
+        """
+        The answer cache is keyed by the query embedding, which dense retrievers compute anyway
+        (and then get from the embedding cache). Keyword-only searches skip it rather than
+        load the embedding model for it.
+        """
+        return self.answer_cache.enabled and uses_embeddings(retriever_type, params)
+
+    def _query_vector(self, query: str, retriever_type: str, params: dict[str, Any]) -> Optional[List[float]]:
+        """Query embedding for the answer cache, None when the cache does not apply"""
+        if not self._answer_cache_applies(retriever_type, params):
+            return None
+        return get_embeddings().embed_query(query)
+
+    def _query_vectors(self, queries: List[str], retriever_type: str, params: dict[str, Any]) -> List[Optional[List[float]]]:
+        """Batched `_query_vector`: one embedding call for the whole batch"""
+        if not self._answer_cache_applies(retriever_type, params):
+            return [None] * len(queries)
+        return get_embeddings().embed_queries(queries)
+
+    def _cached_answer(self, query: str, query_vector: Optional[List[float]], scope) -> Optional[RAGResponse]:
+        """Answer of a semantically equivalent earlier query with the same settings, if any"""
+        if query_vector is None:
+            return None
+        with span("answer_cache") as cache_span:
+            cached = self.answer_cache.get(query_vector, scope)
+            cache_span.set(hit=cached is not None)
+        if cached is None:
+            return None
+        return dataclasses.replace(cached, query=query)
+
+    def _search(
+        self,
+        query: str,
+        retriever_type: str,
+        params: dict[str, Any],
+        doc_types: List[str],
+        start_year: Optional[int],
+        end_year: Optional[int],
+        max_results: int
+    ) -> List[SearchResult]:
+        """Search, threshold, deduplication and optional reranking, down to `max_results` chunks"""
+        retriever = self._get_retriever(retriever_type, params, doc_types)
+        rerank = bool(params.get("rerank"))
+        # With reranking, fetch a wider candidate set and let the cross-encoder pick the best.
+        fetch_k = max(max_results, self.reranker.top_n) if rerank else max_results
+
+        with span("search", retriever=retriever_type) as search_span:
+            search_results = self._vector_search(
+                query, retriever, doc_types, start_year, end_year, fetch_k
+            )
+            search_span.set(items=len(search_results))
+        return self._refine(query, search_results, params, max_results)
+
+    def _search_batch(
+        self,
+        queries: List[str],
+        retriever_type: str,
+        params: dict[str, Any],
+        doc_types: List[str],
+        start_year: Optional[int],
+        end_year: Optional[int],
+        max_results: int
+    ) -> List[List[SearchResult]]:
+        """`_search` for many queries, with a single batched index search"""
+        if not queries:
+            return []
+        retriever = self._get_retriever(retriever_type, params, doc_types)
+        fetch_k = max(max_results, self.reranker.top_n) if params.get("rerank") else max_results
+
+        with span("search", retriever=retriever_type, queries=len(queries)) as search_span:
+            filters = self._build_filters(doc_types or [], start_year, end_year)
+            batches = retriever.search_batch(queries, fetch_k, filters)
+            search_span.set(items=sum(len(results) for results in batches))
+        return [self._refine(query, results, params, max_results) for query, results in zip(queries, batches)]
+
+    def _refine(
+        self, query: str, search_results: List[SearchResult], params: dict[str, Any], max_results: int
+    ) -> List[SearchResult]:
+        """Threshold, deduplication and optional reranking of one query's candidates"""
+        search_results = self._apply_threshold(search_results, params.get("similarity_threshold"))
+        with span("deduplicate", candidates=len(search_results)) as dedup_span:
+            search_results = collapse_near_duplicates(search_results)
+            dedup_span.set(items=len(search_results))
+        if params.get("rerank"):
+            with span("rerank", items=len(search_results)):
+                search_results = self.reranker.rerank(query, search_results)
+        return search_results[:max_results]
        
     def _build_filters(self, doc_types: List[str], start_year: int, end_year: int) -> Dict[str, Any]:
         """Build filters for search"""
@@ -97,20 +444,35 @@ class RAGService:
         max_results: int = 10
     ) -> List[SearchResult]:
         """
-        Search your existing vector index
-        TODO: Replace with actual vector database integration
+        Search your existing vector index, with doc-type and year filters pushed into the search
         """
-        return retriever.search(query, max_results)
+        filters = self._build_filters(doc_types or [], start_year, end_year)
+        return retriever.search(query, max_results, filters)
 
+
+    def _apply_threshold(self, search_results: List[SearchResult], threshold: Optional[float]) -> List[SearchResult]:
+        """Drop chunks whose normalized relevance is below the sidebar similarity threshold."""
+        if not threshold:
+            return search_results
+        return [result for result in search_results if result.relevance_score >= threshold]
     
-    def _generate_answer(self, query: str, search_results: List[SearchResult]) -> str:
+    async def _agenerate_answer(self, query: str, search_results: List[SearchResult]) -> str:
         """
-        Generate answer using LLM based on retrieved documents
-        TODO: Replace with actual LLM integration
+        Generate answer using LLM based on retrieved documents, packed into the prompt token budget
         """
-        context = "\n\n".join([result.content for result in search_results])
-        prompt = self._build_prompt(query, context)
-        return self.llm.generate(prompt)
+        prompt = self._pack_prompt(query, search_results)
+        with span("llm_call") as llm_span:
+            answer = await self.llm.agenerate(prompt)
+            llm_span.set(bytes=len(answer.encode("utf-8")))
+        return answer
+
+    def _pack_prompt(self, query: str, search_results: List[SearchResult], trace: Optional[Trace] = None) -> str:
+        """Context packing and prompt template, timed as the prompt_build stage"""
+        with span("prompt_build", trace=trace) as prompt_span:
+            packed = self.context_packer.pack(query, search_results)
+            prompt = self._build_prompt(query, packed.text)
+            prompt_span.set(items=len(packed.used), tokens=packed.tokens, trimmed=packed.trimmed, bytes=len(prompt.encode("utf-8")))
+        return prompt
         
         
     def _calculate_confidence(self, search_results: List[SearchResult]) -> float:
@@ -136,17 +498,24 @@ class RAGService:
         Instructions:
         - Base your answer strictly on the provided context
         - If the context doesn't contain enough information, say so
-        - Be precise and cite relevant information from the context
+        - Be precise and cite relevant information from the context using its [Chunk n] markers
         - Provide a structured and clear response
 
         Answer:"""
         return template.format(context=context, question=query)  
-    def _add_binary(self, search_result:list[SearchResult], doc_types:list) -> list[SearchResult]:
+    def _add_binary(self, search_result:list[SearchResult], doc_types:list, prerender: bool = True) -> list[SearchResult]:
         if doc_types != ["Code"]:
-            print("doc has other type Code")
+            logging.debug("Only Code documents are attached as PDFs, skipping")
             return search_result # TODO Change the input data so CSV have a source too, then change DocumentFinder class to add csv.
-        finder = DocumentFinder(search_result, num_of_docs=3)
-        return finder.enrich_search_result()   
+        with span("pdf_fetch") as fetch_span:
+            finder = DocumentFinder(search_result, num_of_docs=3)
+            enriched = finder.enrich_search_result()
+            attached = [result.binary for result in enriched if result.binary]
+            fetch_span.set(items=len(attached), bytes=sum(len(binary) for binary in attached))
+        if prerender:
+            # Rendered in the background while the LLM generates the answer.
+            self.previews.prerender(enriched)
+        return enriched   
     
 # Singleton instance
 _rag_service = None
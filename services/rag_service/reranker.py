@@ -0,0 +1,98 @@
+"""
+Optional cross-encoder rerank stage, run after retrieval when `rerank` is enabled.
+
+Only the first `top_n` candidates are rescored, in batches, and their scores are
+cached per (query, chunk) so a repeated or refined query does not pay twice. The
+stage has a time budget: once a batch ends past it, the first-stage order is
+returned unchanged rather than delaying the answer.
+"""
+import dataclasses
+import logging
+import os
+import threading
+import time
+from typing import List, Optional
+
+from services.cache_service import RERANK_SCORE_CACHE, ScoreCache
+from services.rag_service.models import SearchResult
+
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "30"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_TIME_BUDGET = float(os.getenv("RERANK_TIME_BUDGET", "1.5"))
+RERANK_NUM_THREADS = os.getenv("RERANK_NUM_THREADS")
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_cross_encoder():
+    """The process-wide cross-encoder, loaded on first use."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            from services.embedding_service.cross_encoder import build_cross_encoder
+
+            _model = build_cross_encoder(num_threads=int(RERANK_NUM_THREADS) if RERANK_NUM_THREADS else None)
+        return _model
+
+
+class Reranker:
+    """Reorders the best first-stage candidates by cross-encoder score."""
+
+    def __init__(
+        self,
+        top_n: int = RERANK_TOP_N,
+        batch_size: int = RERANK_BATCH_SIZE,
+        time_budget: float = RERANK_TIME_BUDGET,
+        cache: ScoreCache = RERANK_SCORE_CACHE,
+        model=None,
+    ):
+        self.top_n = top_n
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self.cache = cache
+        self._model = model
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = get_cross_encoder()
+        return self._model
+
+    def rerank(self, query: str, search_results: List[SearchResult], top_n: Optional[int] = None) -> List[SearchResult]:
+        """
+        Rerank the first `top_n` results; the rest keep their order after them.
+
+        Each reranked result gets its cross-encoder score as `rerank_score` in its metadata.
+        """
+        candidates = search_results[: top_n or self.top_n]
+        if len(candidates) < 2:
+            return search_results
+        model = self.model  # loaded outside of the time budget
+
+        start = time.perf_counter()
+        keys = [self.cache.make_key(query, result.chunk_id) for result in candidates]
+        scores = self.cache.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in scores]
+
+        for batch_start in range(0, len(missing), self.batch_size):
+            batch = missing[batch_start:batch_start + self.batch_size]
+            batch_scores = model.predict([(query, candidates[i].content) for i in batch])
+            new_scores = {keys[i]: float(score) for i, score in zip(batch, batch_scores)}
+            self.cache.put_many(new_scores)
+            scores.update(new_scores)
+            if time.perf_counter() - start > self.time_budget and batch_start + self.batch_size < len(missing):
+                logging.warning(
+                    f"Rerank time budget of {self.time_budget}s exceeded after "
+                    f"{batch_start + len(batch)}/{len(missing)} pairs, keeping the first-stage order"
+                )
+                return search_results
+
+        order = sorted(range(len(candidates)), key=lambda i: -scores[keys[i]])
+        reranked = [
+            dataclasses.replace(
+                candidates[i], metadata={**candidates[i].metadata, "rerank_score": scores[keys[i]]}
+            )
+            for i in order
+        ]
+        return reranked + search_results[len(candidates):]
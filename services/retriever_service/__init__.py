@@ -1,13 +1,21 @@
-from .faiss_retriever import FaissRetriever
-from .bm25_retriever import LocalBM25Retriever
-from .hybrid_retriever import HybridRetriever
-from .base_retriever import BaseRetriever 
-from .chroma_retriever import ChromaRetriever
-
-__all__ = [
-    "FaissRetriever",
-    "LocalBM25Retriever",
-    "HybridRetriever",
-    "BaseRetriever",
-    "ChromaRetriever"
-]
\ No newline at end of file
+"""Retriever backends, imported lazily so that importing one does not import them all."""
+import importlib
+from typing import Any
+
+_EXPORTS = {
+    "FaissRetriever": ".faiss_retriever",
+    "LocalBM25Retriever": ".bm25_retriever",
+    "HybridRetriever": ".hybrid_retriever",
+    "BaseRetriever": ".base_retriever",
+    "ChromaRetriever": ".chroma_retriever",
+    "QdrantRetriever": ".qdrant_retriever",
+    "EnsembleRetriever": ".ensemble_retriever",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
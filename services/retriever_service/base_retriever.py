@@ -1,21 +1,55 @@
 """This module contains the base class for all retrievers."""
 from services.rag_service.models import RetrieverConfig, SearchResult
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+import copy
+import os
 
 class BaseRetriever(ABC):
     """Abstract base class for all retrievers"""
-    
+
+    base_path: str = ""
+    # Params that change what initialize_connection() loads; the rest only affect search.
+    load_params: Tuple[str, ...] = ()
+
     def __init__(self, config: RetrieverConfig):
         self.config = config
-        self.vector_client = None 
-    
+        self.vector_client = None
+
+    @classmethod
+    def uses_embeddings(cls, params: Dict[str, Any]) -> bool:
+        """Whether a search embeds the query with the shared embedding model"""
+        return False
+
     @abstractmethod
     def search(self, query: str, max_results: int, filters: Optional[Dict[str, Any]] = None) -> List[SearchResult]:
         """Perform search using this retriever"""
         pass
-    
+
+    def search_batch(
+        self, queries: List[str], max_results: int, filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[SearchResult]]:
+        """Search several queries with the same filters; backends that can batch the index scan override this"""
+        return [self.search(query, max_results, filters) for query in queries]
+
     @abstractmethod
     def initialize_connection(self):
         """Initialize connection to vector database"""
         pass
+
+    def with_config(self, config: RetrieverConfig) -> "BaseRetriever":
+        """Return a shallow copy sharing the loaded index but using another config."""
+        clone = copy.copy(self)
+        clone.config = config
+        return clone
+
+    def estimate_memory(self) -> int:
+        """Estimate the memory held by the loaded index, from the size of its stores on disk."""
+        from utils.helpers import DOC_TYPES_DICT
+
+        total = 0
+        for doc_type in self.config.document_types:
+            path = os.path.join(self.base_path, DOC_TYPES_DICT.get(doc_type, doc_type))
+            for root, _, files in os.walk(path):
+                total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        return total
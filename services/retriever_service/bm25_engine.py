@@ -0,0 +1,284 @@
+"""
+Array-backed BM25 engine.
+
+Each doc-type store holds an inverted index in CSR form, persisted without pickle
+as `bm25_index.npz`:
+    vocabulary  (V,)    terms, position = term id
+    indptr      (V+1,)  postings of term t are postings[indptr[t]:indptr[t+1]]
+    postings    (P,)    document ids, ascending within a term
+    term_freqs  (P,)    frequency of the term in that document
+    doc_lengths (N,)    number of tokens per document
+Chunk text and metadata live next to it in a ChunkStore (`chunks.arrow`).
+
+Several stores are searched together with global statistics (N, avgdl, df summed
+over the stores), which is exactly BM25 over their union without rebuilding it.
+"""
+import os
+import pickle
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .chunk_store import CHUNK_STORE_FILE, ChunkStore, write_chunk_store
+from .metadata_index import load_or_build_metadata_index
+from utils.text_processing import tokenize
+
+BM25_INDEX_FILE = "bm25_index.npz"
+LEGACY_BM25_FILE = "bm25_index.pkl"
+# Upper bound on the (queries x documents) float32 score block of a batched search: 128 MB.
+BM25_BATCH_CELLS = int(os.getenv("BM25_BATCH_CELLS", str(32 * 1024 ** 2)))
+
+class BM25Index:
+    """CSR inverted index of one document collection."""
+
+    def __init__(
+        self,
+        vocabulary: np.ndarray,
+        indptr: np.ndarray,
+        postings: np.ndarray,
+        term_freqs: np.ndarray,
+        doc_lengths: np.ndarray,
+    ):
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.postings = postings
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.term_ids: Dict[str, int] = {term: i for i, term in enumerate(vocabulary.tolist())}
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_lengths)
+
+    @property
+    def document_frequencies(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "BM25Index":
+        """Tokenize `texts` once and build the inverted index."""
+        term_ids: Dict[str, int] = {}
+        rows_term: List[int] = []
+        rows_doc: List[int] = []
+        rows_tf: List[int] = []
+        doc_lengths: List[int] = []
+
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                rows_term.append(term_ids.setdefault(term, len(term_ids)))
+                rows_doc.append(doc_id)
+                rows_tf.append(tf)
+
+        terms = np.asarray(rows_term, dtype=np.int64)
+        # A stable sort keeps document ids ascending inside each posting list.
+        order = np.argsort(terms, kind="stable")
+        indptr = np.zeros(len(term_ids) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(terms, minlength=len(term_ids)))
+
+        return cls(
+            vocabulary=np.asarray(list(term_ids), dtype=str),
+            indptr=indptr,
+            postings=np.asarray(rows_doc, dtype=np.int32)[order],
+            term_freqs=np.asarray(rows_tf, dtype=np.float32)[order],
+            doc_lengths=np.asarray(doc_lengths, dtype=np.float32),
+        )
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            vocabulary=self.vocabulary,
+            indptr=self.indptr,
+            postings=self.postings,
+            term_freqs=self.term_freqs,
+            doc_lengths=self.doc_lengths,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(**{name: data[name] for name in data.files})
+
+    def posting_list(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Document ids and term frequencies for `term` (empty arrays if unknown)."""
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return self.postings[:0], self.term_freqs[:0]
+        start, end = self.indptr[term_id], self.indptr[term_id + 1]
+        return self.postings[start:end], self.term_freqs[start:end]
+
+    def nbytes(self) -> int:
+        arrays = (self.vocabulary, self.indptr, self.postings, self.term_freqs, self.doc_lengths)
+        return sum(array.nbytes for array in arrays)
+
+
+class BM25Shard:
+    """One doc type: its inverted index plus the chunk store the document ids point into."""
+
+    def __init__(self, store_dir: str, doc_type: str):
+        self.store_dir = store_dir
+        self.doc_type = doc_type
+        self.index = BM25Index.load(os.path.join(store_dir, BM25_INDEX_FILE))
+        self.chunks = ChunkStore(os.path.join(store_dir, CHUNK_STORE_FILE))
+        self.metadata_index = load_or_build_metadata_index(
+            store_dir, doc_type, self.chunks.metadatas, self.index.num_docs
+        )
+
+    def estimate_memory(self) -> int:
+        """The chunk store is memory-mapped, only the index and metadata arrays are resident."""
+        metadata = self.metadata_index
+        return self.index.nbytes() + metadata.years.nbytes + metadata.doc_types.nbytes + metadata.sources.nbytes
+
+
+def build_bm25_store(store_dir: str, contents: List[str], metadatas: List[dict], chunk_ids: Optional[List[str]] = None):
+    """Write the inverted index and chunk store of one doc type."""
+    os.makedirs(store_dir, exist_ok=True)
+    chunk_ids = chunk_ids or [str(i) for i in range(len(contents))]
+    write_chunk_store(os.path.join(store_dir, CHUNK_STORE_FILE), chunk_ids, contents, metadatas)
+    BM25Index.build(contents).save(os.path.join(store_dir, BM25_INDEX_FILE))
+
+
+def convert_legacy_store(store_dir: str):
+    """Build the array store from a pickled LangChain BM25Retriever, once."""
+    with open(os.path.join(store_dir, LEGACY_BM25_FILE), "rb") as f:
+        retriever = pickle.load(f)
+    build_bm25_store(
+        store_dir,
+        [doc.page_content for doc in retriever.docs],
+        [doc.metadata or {} for doc in retriever.docs],
+    )
+
+
+def average_idf(indexes: List[BM25Index]) -> float:
+    """Mean IDF over the union vocabulary, used to floor negative IDFs (as in rank_bm25)."""
+    num_docs = sum(index.num_docs for index in indexes)
+    vocabulary = np.concatenate([index.vocabulary for index in indexes])
+    frequencies = np.concatenate([index.document_frequencies for index in indexes])
+    _, inverse = np.unique(vocabulary, return_inverse=True)
+    global_df = np.bincount(inverse, weights=frequencies)
+    return float(np.mean(np.log(num_docs - global_df + 0.5) - np.log(global_df + 0.5)))
+
+
+class BM25Engine:
+    """Okapi BM25 over one or more BM25Index with shared global statistics."""
+
+    def __init__(
+        self,
+        indexes: List[BM25Index],
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+        mean_idf: Optional[float] = None,
+    ):
+        self.indexes = indexes
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.offsets = np.cumsum([0] + [index.num_docs for index in indexes])
+        self.num_docs = int(self.offsets[-1])
+        total_length = sum(float(index.doc_lengths.sum()) for index in indexes)
+        self.avgdl = total_length / self.num_docs if self.num_docs else 0.0
+        self.mean_idf = mean_idf if mean_idf is not None else average_idf(indexes)
+
+    def idf(self, term: str) -> float:
+        df = sum(len(index.posting_list(term)[0]) for index in self.indexes)
+        idf = np.log(self.num_docs - df + 0.5) - np.log(df + 0.5)
+        return float(idf) if idf >= 0 else self.epsilon * self.mean_idf
+
+    def get_scores(self, query: str, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """BM25 score of every document, concatenated in index order."""
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        if not self.num_docs:
+            return scores
+
+        for term, query_tf in Counter(tokenize(query)).items():
+            idf = self.idf(term) * query_tf
+            for index, offset in zip(self.indexes, self.offsets):
+                doc_ids, tfs = index.posting_list(term)
+                if not len(doc_ids):
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * index.doc_lengths[doc_ids] / self.avgdl)
+                scores[offset + doc_ids] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+        if mask is not None:
+            scores[~mask] = 0.0
+        return scores
+
+    def top_k(self, query: str, k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[int, int, float]]:
+        """Best `k` matching documents as (index number, local doc id, score), best first."""
+        scores = self.get_scores(query, mask)
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        index_numbers = np.searchsorted(self.offsets, top, side="right") - 1
+        return [
+            (int(i), int(doc - self.offsets[i]), float(scores[doc]))
+            for i, doc in zip(index_numbers, top)
+        ]
+
+    def get_scores_batch(self, queries: List[str], mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        BM25 scores of every document for each query, one row per query.
+
+        Each distinct term of the batch is looked up and normalized once, then added to
+        the rows of all the queries containing it.
+        """
+        scores = np.zeros((len(queries), self.num_docs), dtype=np.float32)
+        if not self.num_docs or not queries:
+            return scores
+
+        term_rows: Dict[str, Tuple[List[int], List[int]]] = {}
+        for row, query in enumerate(queries):
+            for term, query_tf in Counter(tokenize(query)).items():
+                rows, query_tfs = term_rows.setdefault(term, ([], []))
+                rows.append(row)
+                query_tfs.append(query_tf)
+
+        for term, (rows, query_tfs) in term_rows.items():
+            weights = self.idf(term) * np.asarray(query_tfs, dtype=np.float32)
+            for index, offset in zip(self.indexes, self.offsets):
+                doc_ids, tfs = index.posting_list(term)
+                if not len(doc_ids):
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * index.doc_lengths[doc_ids] / self.avgdl)
+                # Rows and documents are unique here, so a plain fancy-indexed add is exact.
+                scores[np.ix_(rows, offset + doc_ids)] += np.outer(weights, tfs * (self.k1 + 1) / (tfs + norm))
+
+        if mask is not None:
+            scores[:, ~mask] = 0.0
+        return scores
+
+    def top_k_batch(
+        self, queries: List[str], k: int, mask: Optional[np.ndarray] = None
+    ) -> List[List[Tuple[int, int, float]]]:
+        """`top_k` of every query, scored in blocks of rows of at most BM25_BATCH_CELLS scores."""
+        rows_per_block = max(1, BM25_BATCH_CELLS // max(1, self.num_docs))
+        results: List[List[Tuple[int, int, float]]] = []
+        for start in range(0, len(queries), rows_per_block):
+            scores = self.get_scores_batch(queries[start:start + rows_per_block], mask)
+            results.extend(self._top_rows(scores, k))
+        return results
+
+    def _top_rows(self, scores: np.ndarray, k: int) -> List[List[Tuple[int, int, float]]]:
+        """Best `k` entries of each row, as many as the row has non-zero scores (as in top_k)."""
+        counts = np.count_nonzero(scores, axis=1)
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return [[] for _ in range(scores.shape[0])]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        index_numbers = np.searchsorted(self.offsets, top, side="right") - 1
+        local_ids = top - self.offsets[index_numbers]
+        return [
+            [(int(i), int(doc), float(score)) for i, doc, score in zip(row_indexes[:count], row_docs[:count], row_scores[:count])]
+            for row_indexes, row_docs, row_scores, count in zip(index_numbers, local_ids, top_scores, counts)
+        ]
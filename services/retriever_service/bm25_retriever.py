@@ -1,52 +1,109 @@
 """This module contains the BM25 retriever implementation."""
 from .base_retriever import BaseRetriever
-from typing import Dict, List, Any, Optional
+from .bm25_engine import BM25_INDEX_FILE, LEGACY_BM25_FILE, BM25Engine, BM25Shard, average_idf, convert_legacy_store
+from .score_normalization import DEFAULT_BM25_PIVOT, bm25_to_similarity
+from .metadata_index import MetadataFilter
+import numpy as np
+from typing import Dict, List, Any, Optional, Tuple
 from services.rag_service.models import SearchResult, RetrieverConfig
+from services.cache_service import SHARD_CACHE
 import os
-import pickle
-from langchain_community.retrievers import BM25Retriever
 from utils.helpers import DOC_TYPES_DICT
 
 class LocalBM25Retriever(BaseRetriever):
-    """BM25 keyword-based retriever"""
+    """
+    BM25 keyword-based retriever over the array-backed BM25 engine.
+
+    Each doc type is a BM25Shard loaded once into SHARD_CACHE. Selecting several doc
+    types scores their postings together with global statistics instead of rebuilding
+    an index from all documents.
+    """
+    base_path = "data/vector_stores/bm25_stores"
+
     def __init__(self, config: RetrieverConfig):
         super().__init__(config)
+        self.mean_idf: Optional[float] = None
+
+    def _load_shard(self, doc_type: str) -> BM25Shard:
+        """Fetch a shard from the shared cache, converting a legacy pickle store on first use."""
+        path = os.path.join(self.base_path, DOC_TYPES_DICT[doc_type])
+
+        def load() -> BM25Shard:
+            if not os.path.exists(os.path.join(path, BM25_INDEX_FILE)):
+                if not os.path.exists(os.path.join(path, LEGACY_BM25_FILE)):
+                    raise FileNotFoundError(f"No BM25 store found for document type: {doc_type}")
+                convert_legacy_store(path)
+            return BM25Shard(path, doc_type)
+
+        return SHARD_CACHE.get_or_load(("bm25", path), load, size_fn=lambda shard: shard.estimate_memory())
+
+    def _shards(self) -> List[BM25Shard]:
+        return [self._load_shard(doc_type) for doc_type in self.config.document_types]
+
     def initialize_connection(self):
         """Initialize BM25 search engine"""
-        base_path = "data/vector_stores/bm25_stores"
-        doc_types = self.config.document_types
-        all_documents = []
-        if len(doc_types) == 1:
-            path = os.path.join(base_path, DOC_TYPES_DICT[doc_types[0]], "bm25_index.pkl") # type: ignore
-            if os.path.exists(path):
-                with open(path, "rb") as f:
-                    retriever = pickle.load(f)
-                self.vector_client = retriever
+        shards = self._shards()
+        # The only statistic that needs the whole union vocabulary; everything else is cheap per query.
+        self.mean_idf = average_idf([shard.index for shard in shards])
+        self.vector_client = [shard.store_dir for shard in shards]
+
+    def estimate_memory(self) -> int:
+        """The shards are accounted for in SHARD_CACHE, so the retriever itself is negligible."""
+        return 0
+
+    def _mask(self, shards: List[BM25Shard], filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Concatenated metadata mask of the shards, in engine document order."""
+        metadata_filter = MetadataFilter.from_dict(filters)
+        if metadata_filter.is_empty():
+            return None
+        masks = []
+        for shard in shards:
+            if metadata_filter.doc_types and shard.doc_type not in metadata_filter.doc_types:
+                masks.append(np.zeros(shard.index.num_docs, dtype=bool))
             else:
-                raise FileNotFoundError(f"No BM25 store found for document type: {DOC_TYPES_DICT[doc_types[0]]}")
-        else :
-            for doc_type in doc_types:
-                path = os.path.join(base_path, DOC_TYPES_DICT[doc_type], "bm25_index.pkl") # type: ignore
-                if os.path.exists(path):
-                    with open(path, "rb") as f:
-                        retriever = pickle.load(f) 
-                        all_documents.extend(retriever.docs)
-                else:
-                    raise FileNotFoundError(f"No BM25 store found for document type: {doc_type}")
-            self.vector_client = BM25Retriever.from_documents(all_documents)
-    
-    def search(self, query: str, max_results: int, filters: Optional[Dict[str, Any]] = None) -> List[SearchResult]:
-        """Search using BM25 and return structured search results."""
-        if self.vector_client is None:
-            raise RuntimeError("BM25 retriever not initialized. Call initialize_connection() first.")
+                mask = shard.metadata_index.mask(metadata_filter)
+                masks.append(np.ones(shard.index.num_docs, dtype=bool) if mask is None else mask)
+        return np.concatenate(masks)
 
-        docs = self.vector_client.get_relevant_documents(query)
+    def _engine(self, shards: List[BM25Shard]) -> BM25Engine:
+        return BM25Engine(
+            [shard.index for shard in shards],
+            k1=self.config.params.get("k1", 1.5),
+            b=self.config.params.get("b", 0.75),
+            epsilon=self.config.params.get("epsilon", 0.25),
+            mean_idf=self.mean_idf,
+        )
+
+    def _to_results(self, shards: List[BM25Shard], hits: List[Tuple[int, int, float]]) -> List[SearchResult]:
+        pivot = self.config.params.get("bm25_pivot", DEFAULT_BM25_PIVOT)
         results = []
-        for doc in docs:
+        for shard_number, doc_id, score in hits:
+            doc = shards[shard_number].chunks.fetch([doc_id])[0]
             results.append(SearchResult(
                 content=doc.page_content,
                 metadata=doc.metadata,
-                relevance_score=0,
-                document_type=self.config.document_types, 
+                relevance_score=bm25_to_similarity(score, pivot),
+                document_type=self.config.document_types,
+                raw_score=score,
             ))
-        return results[:max_results]
+        return results
+
+    def search(self, query: str, max_results: int, filters: Optional[Dict[str, Any]] = None) -> List[SearchResult]:
+        """Search using BM25 and return structured search results."""
+        if self.vector_client is None:
+            raise RuntimeError("BM25 retriever not initialized. Call initialize_connection() first.")
+
+        shards = self._shards()
+        hits = self._engine(shards).top_k(query, max_results, self._mask(shards, filters))
+        return self._to_results(shards, hits)
+
+    def search_batch(
+        self, queries: List[str], max_results: int, filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[SearchResult]]:
+        """Score all queries as one matrix, sharing the filter mask and the per-term work."""
+        if self.vector_client is None:
+            raise RuntimeError("BM25 retriever not initialized. Call initialize_connection() first.")
+
+        shards = self._shards()
+        batch_hits = self._engine(shards).top_k_batch(queries, max_results, self._mask(shards, filters))
+        return [self._to_results(shards, hits) for hits in batch_hits]
@@ -1,10 +1,13 @@
 """This module contains the Chroma retriever implementation."""
+import logging
 from typing import Dict, Any, List, Optional
 from abc import ABC
 from langchain.vectorstores import Chroma
 from langchain.embeddings.base import Embeddings
 from dataclasses import dataclass
 from .base_retriever import BaseRetriever
+from .score_normalization import chroma_distance_to_similarity
+from .metadata_index import UNKNOWN_YEAR, MetadataFilter
 from services.rag_service.models import RetrieverConfig, SearchResult
 from utils.helpers import DOC_TYPES_DICT
 
@@ -12,26 +15,32 @@ class ChromaRetriever(BaseRetriever):
     """
     Chroma retriever using LangChain's Chroma wrapper.
     """
+    base_path = "data/vector_stores/chroma_stores"
+
     def __init__(self, config: RetrieverConfig, embeddings: Embeddings):
         super().__init__(config)
         self.embeddings = embeddings
         self.vector_client = None
+        self.has_year = False
+
+    @classmethod
+    def uses_embeddings(cls, params: Dict[str, Any]) -> bool:
+        return True
 
     def initialize_connection(self):
         """Load Chroma vector store from disk."""
-        base_path = "data/vector_stores/chroma_stores"
         doc_types = self.config.document_types
 
         if len(doc_types) == 1:
-            path = f"{base_path}/{DOC_TYPES_DICT[doc_types[0]]}"
+            path = f"{self.base_path}/{DOC_TYPES_DICT[doc_types[0]]}"
             self.vector_client = Chroma(persist_directory=path, embedding_function=self.embeddings)
-            print("chroma initialized")
+            logging.debug(f"Chroma store loaded from {path}")
         else:
-            first_path = f"{base_path}/{DOC_TYPES_DICT[doc_types[0]]}"
+            first_path = f"{self.base_path}/{DOC_TYPES_DICT[doc_types[0]]}"
             merged_chroma = Chroma(persist_directory=first_path, embedding_function=self.embeddings)
 
             for doc_type in doc_types[1:]:
-                path = f"{base_path}/{DOC_TYPES_DICT[doc_type]}"
+                path = f"{self.base_path}/{DOC_TYPES_DICT[doc_type]}"
                 next_chroma = Chroma(persist_directory=path, embedding_function=self.embeddings)
                 
                 next_data = next_chroma._collection.get()
@@ -46,21 +55,46 @@ class ChromaRetriever(BaseRetriever):
 
             self.vector_client = merged_chroma
 
+        # Chroma cannot match a missing field, so the year filter is only pushed down when every
+        # chunk has a `year`; stores ingested (even partly) before chunks carried one are not filtered.
+        collection = self.vector_client._collection
+        total = collection.count()
+        with_year = len(collection.get(where={"year": {"$gte": UNKNOWN_YEAR}}, include=[])["ids"]) if total else 0
+        self.has_year = total > 0 and with_year == total
+        if 0 < with_year < total:
+            logging.warning(f"{total - with_year} of {total} Chroma chunks have no year: date filters are ignored")
+
+    def _where(self, filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Translate the metadata filter into a Chroma `where` clause evaluated inside the search."""
+        metadata_filter = MetadataFilter.from_dict(filters)
+        if not (self.config.params.get("enable_metadata_filter", True) and self.has_year and metadata_filter.has_year_range):
+            return None
+        bounds = []
+        if metadata_filter.start_year is not None:
+            bounds.append({"year": {"$gte": metadata_filter.start_year}})
+        if metadata_filter.end_year is not None:
+            bounds.append({"year": {"$lte": metadata_filter.end_year}})
+        in_range = bounds[0] if len(bounds) == 1 else {"$and": bounds}
+        return {"$or": [{"year": {"$eq": UNKNOWN_YEAR}}, in_range]}
+
     def search(self, query: str, max_results: int, filters: Optional[Dict[str, Any]] = None) -> List[SearchResult]:
         """Search using LangChain Chroma and return scored results."""
         if self.vector_client is None:
             raise RuntimeError("Chroma vector store not initialized. Call initialize_connection() first.")
 
-        docs_with_scores = self.vector_client.similarity_search_with_score(query, k=max_results)
-        print(len(docs_with_scores))
+        docs_with_scores = self.vector_client.similarity_search_with_score(
+            query, k=max_results, filter=self._where(filters)
+        )
+        space = (self.vector_client._collection.metadata or {}).get("hnsw:space", "l2")
         results = []
 
-        for doc, score in docs_with_scores:
+        for doc, distance in docs_with_scores:
             results.append(SearchResult(
                 content=doc.page_content,
                 metadata=doc.metadata if doc.metadata else {},
-                relevance_score=score,
+                relevance_score=chroma_distance_to_similarity(distance, space),
                 document_type=self.config.document_types,
+                raw_score=distance,
             ))
         return results
     
@@ -0,0 +1,97 @@
+"""
+Columnar on-disk store for chunk text and metadata.
+
+Chunks are written as an uncompressed Arrow IPC file, one row per vector in the
+matching index, so row `i` describes the vector at position `i`. The file is
+opened through a memory map: only the rows fetched for the final top-k are ever
+paged in, and several processes opening the same store share the page cache.
+
+Export an existing LangChain FAISS store with:
+    python -m services.retriever_service.chunk_store data/vector_stores/faiss_stores/code
+"""
+import json
+import os
+import pickle
+import sys
+from typing import Any, Dict, Iterator, List, Sequence
+
+import pyarrow as pa
+from langchain.schema import Document
+
+CHUNK_STORE_FILE = "chunks.arrow"
+
+CHUNK_SCHEMA = pa.schema([
+    ("chunk_id", pa.string()),
+    ("content", pa.string()),
+    ("metadata", pa.string()),
+])
+
+
+class ChunkStore:
+    """Read-only, memory-mapped view over a chunk store file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._source = pa.memory_map(path, "r")
+        # read_all() on a memory map is zero-copy: columns point into the mapped file.
+        self._table = pa.ipc.open_file(self._source).read_all()
+
+    def __len__(self) -> int:
+        return self._table.num_rows
+
+    def fetch(self, positions: Sequence[int]) -> List[Document]:
+        """Materialize the chunks at the given index positions, in the same order."""
+        rows = self._table.take(pa.array(positions, type=pa.int64())).to_pydict()
+        return [
+            Document(page_content=content, metadata=json.loads(metadata))
+            for content, metadata in zip(rows["content"], rows["metadata"])
+        ]
+
+    def metadatas(self) -> Iterator[Dict[str, Any]]:
+        """Parse the metadata of every chunk, in index order."""
+        for metadata in self._table.column("metadata").to_pylist():
+            yield json.loads(metadata)
+
+    def column(self, name: str) -> pa.ChunkedArray:
+        """Return a whole column without materializing the text columns."""
+        return self._table.column(name)
+
+
+def write_chunk_store(path: str, chunk_ids: List[str], contents: List[str], metadatas: List[Dict[str, Any]]):
+    """Write chunks, ordered by index position, to an Arrow IPC file."""
+    table = pa.table(
+        {
+            "chunk_id": chunk_ids,
+            "content": contents,
+            "metadata": [json.dumps(metadata, ensure_ascii=False, default=str) for metadata in metadatas],
+        },
+        schema=CHUNK_SCHEMA,
+    )
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def export_faiss_store(store_dir: str) -> str:
+    """Write the chunk store of a LangChain FAISS directory from its pickled docstore."""
+    with open(os.path.join(store_dir, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    chunk_ids, contents, metadatas = [], [], []
+    for position in range(len(index_to_docstore_id)):
+        chunk_id = index_to_docstore_id[position]
+        doc = docstore.search(chunk_id)
+        chunk_ids.append(chunk_id)
+        contents.append(doc.page_content)
+        metadatas.append(doc.metadata or {})
+
+    path = os.path.join(store_dir, CHUNK_STORE_FILE)
+    write_chunk_store(path, chunk_ids, contents, metadatas)
+    return path
+
+
+if __name__ == "__main__":
+    for store_dir in sys.argv[1:]:
+        print(f"Wrote {export_faiss_store(store_dir)}")
@@ -0,0 +1,228 @@
+"""This module contains the ensemble retriever implementation."""
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Any, List, Optional
+from .base_retriever import BaseRetriever
+from .fusion import DEFAULT_RRF_K, reciprocal_rank_fusion
+from services.rag_service.models import RetrieverConfig, SearchResult
+from utils.logger import span
+from utils.metrics import BACKEND_SKIPS
+
+ENSEMBLE_BACKEND_TIMEOUT = float(os.getenv("ENSEMBLE_BACKEND_TIMEOUT", "5"))
+# Budget of a whole batched search, whatever the number of queries.
+ENSEMBLE_BATCH_TIMEOUT = float(os.getenv("ENSEMBLE_BATCH_TIMEOUT", "60"))
+# Worker threads of each backend: a hung backend can only tie up its own.
+ENSEMBLE_BACKEND_WORKERS = int(os.getenv("ENSEMBLE_BACKEND_WORKERS", "4"))
+
+# Sidebar names of the sub-retrievers -> RETRIEVER_REGISTRY keys
+SUB_RETRIEVERS: Dict[str, str] = {
+    "faiss": "faiss_retriever",
+    "bm25": "bm25",
+    "chroma": "chroma_retriever",
+    "qdrant": "qdrant_retriever",
+}
+
+
+
+class BackendPool:
+    """
+    Worker threads of one backend.
+
+    A search that timed out keeps running (threads cannot be cancelled) and keeps its
+    worker. Once every worker is busy, new searches are refused instead of queued, so
+    a hung backend is skipped right away rather than stalling every ensemble query.
+    """
+
+    def __init__(self, name: str, workers: int = ENSEMBLE_BACKEND_WORKERS):
+        self.name = name
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"ensemble-{name}")
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Optional[Future]:
+        """Run `fn` on a free worker, or return None (and count the skip) if there is none."""
+        with self._lock:
+            if self._in_flight >= self.workers:
+                BACKEND_SKIPS.inc(backend=self.name)
+                return None
+            self._in_flight += 1
+        try:
+            return self._executor.submit(self._run, fn, *args)
+        except BaseException:
+            self._release()
+            raise
+
+    def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        try:
+            return fn(*args)
+        finally:
+            # Before the future completes, so a caller seeing the result also sees the free worker.
+            self._release()
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+
+_BACKEND_POOLS: Dict[str, BackendPool] = {name: BackendPool(name) for name in SUB_RETRIEVERS}
+
+
+class EnsembleRetriever(BaseRetriever):
+    """
+    Runs several retrievers concurrently and fuses their rankings with weighted RRF.
+
+    Sub-retrievers come from the shared retriever cache. A backend that does not answer
+    within `backend_timeout` seconds (or raises) is left out of the fusion instead of
+    stalling the query.
+    """
+
+    def __init__(self, config: RetrieverConfig):
+        super().__init__(config)
+
+    @classmethod
+    def _retriever_names(cls, params: Dict[str, Any]) -> List[str]:
+        return [name for name in params.get("retrievers", ["faiss", "bm25"]) if name in SUB_RETRIEVERS]
+
+    @classmethod
+    def uses_embeddings(cls, params: Dict[str, Any]) -> bool:
+        from utils.helpers import RETRIEVER_REGISTRY
+
+        return any(
+            RETRIEVER_REGISTRY.retriever_class(SUB_RETRIEVERS[name]).uses_embeddings(params)
+            for name in cls._retriever_names(params)
+        )
+
+    def _weights(self) -> Dict[str, float]:
+        return self.config.params.get("weights") or {}
+
+    def _sub_retriever(self, name: str) -> BaseRetriever:
+        from utils.helpers import get_retriever
+
+        return get_retriever(SUB_RETRIEVERS[name], self.config.params, self.config.document_types)
+
+    def initialize_connection(self):
+        """Warm every selected sub-retriever; failures surface again at search time."""
+        names = self._retriever_names(self.config.params)
+        if not names:
+            raise ValueError("Select at least one retriever to combine in the ensemble.")
+        for name in names:
+            try:
+                self._sub_retriever(name)
+            except Exception as e:
+                logging.warning(f"Ensemble: could not load {name}: {e}")
+        self.vector_client = names
+
+    def estimate_memory(self) -> int:
+        """Sub-retrievers are cached, and accounted for, on their own."""
+        return 0
+
+    def search(self, query: str, max_results: int, filters: Optional[Dict[str, Any]] = None) -> List[SearchResult]:
+        """Query the sub-retrievers in parallel and fuse their results."""
+        if self.vector_client is None:
+            raise RuntimeError("Ensemble retriever not initialized. Call initialize_connection() first.")
+
+        params = self.config.params
+        fetch_k = params.get("fetch_k", max_results * 2)
+        timeout = params.get("backend_timeout", ENSEMBLE_BACKEND_TIMEOUT)
+
+        def search_backend(name: str) -> List[SearchResult]:
+            with span(f"search:{name}") as backend_span:
+                results = self._sub_retriever(name).search(query, fetch_k, filters)
+                backend_span.set(items=len(results))
+            return results
+
+        futures = self._submit(search_backend)
+        done, not_done = wait(futures, timeout=timeout)
+
+        ranked_lists: Dict[str, List[SearchResult]] = {}
+        for future in done:
+            name = futures[future]
+            try:
+                ranked_lists[name] = future.result()
+            except Exception as e:
+                logging.warning(f"Ensemble: {name} failed: {e}")
+        for future in not_done:
+            future.cancel()
+            logging.warning(f"Ensemble: {futures[future]} exceeded {timeout}s and was skipped")
+
+        if not ranked_lists:
+            raise RuntimeError("No retriever of the ensemble returned results in time.")
+
+        with span("fusion", lists=len(ranked_lists)) as fusion_span:
+            fused = self._fuse(ranked_lists, max_results)
+            fusion_span.set(items=len(fused))
+        return fused
+
+    def _submit(self, search_backend: Callable[[str], Any]) -> Dict[Future, str]:
+        """Start `search_backend(name)` on each backend's own pool, skipping saturated backends."""
+        futures = {}
+        for name in self._retriever_names(self.config.params):
+            # Each backend runs in a copy of the caller's context so its spans join the request trace.
+            future = _BACKEND_POOLS[name].submit(contextvars.copy_context().run, search_backend, name)
+            if future is None:
+                logging.warning(f"Ensemble: {name} skipped, its {_BACKEND_POOLS[name].workers} workers are still busy")
+            else:
+                futures[future] = name
+        return futures
+
+    def _fuse(self, ranked_lists: Dict[str, List[SearchResult]], max_results: int) -> List[SearchResult]:
+        fused = reciprocal_rank_fusion(ranked_lists, self._weights(), self.config.params.get("rrf_k", DEFAULT_RRF_K))
+        for result in fused:
+            result.document_type = self.config.document_types
+        return fused[:max_results]
+
+    def search_batch(
+        self, queries: List[str], max_results: int, filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[SearchResult]]:
+        """
+        Run each sub-retriever's batched search concurrently, then fuse query by query.
+
+        Backends get `batch_timeout` seconds (ENSEMBLE_BATCH_TIMEOUT) for the whole batch.
+        """
+        if self.vector_client is None:
+            raise RuntimeError("Ensemble retriever not initialized. Call initialize_connection() first.")
+        if not queries:
+            return []
+
+        params = self.config.params
+        fetch_k = params.get("fetch_k", max_results * 2)
+        timeout = params.get("batch_timeout", ENSEMBLE_BATCH_TIMEOUT)
+
+        def search_backend(name: str) -> List[List[SearchResult]]:
+            with span(f"search:{name}", queries=len(queries)) as backend_span:
+                batches = self._sub_retriever(name).search_batch(queries, fetch_k, filters)
+                backend_span.set(items=sum(len(results) for results in batches))
+            return batches
+
+        futures = self._submit(search_backend)
+        done, not_done = wait(futures, timeout=timeout)
+
+        batched_lists: Dict[str, List[List[SearchResult]]] = {}
+        for future in done:
+            name = futures[future]
+            try:
+                batched_lists[name] = future.result()
+            except Exception as e:
+                logging.warning(f"Ensemble: {name} failed: {e}")
+        for future in not_done:
+            future.cancel()
+            logging.warning(f"Ensemble: {futures[future]} exceeded {timeout}s and was skipped")
+
+        if not batched_lists:
+            raise RuntimeError("No retriever of the ensemble returned results in time.")
+
+        with span("fusion", lists=len(batched_lists), queries=len(queries)) as fusion_span:
+            fused = [
+                self._fuse({name: batches[i] for name, batches in batched_lists.items()}, max_results)
+                for i in range(len(queries))
+            ]
+            fusion_span.set(items=sum(len(results) for results in fused))
+        return fused
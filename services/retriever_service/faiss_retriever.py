@@ -1,60 +1,317 @@
 """This module contains the FAISS retriever implementation."""
-from typing import Dict, Any, List, Optional
-from abc import ABC
+import heapq
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+import faiss
+import numpy as np
 from langchain.vectorstores import FAISS
 from langchain.embeddings.base import Embeddings
-from dataclasses import dataclass
-import numpy as np
+from langchain.schema import Document
+from langchain_community.vectorstores.utils import DistanceStrategy
 from .base_retriever import BaseRetriever
+from .chunk_store import CHUNK_STORE_FILE, ChunkStore
+from .metadata_index import MetadataFilter, load_or_build_metadata_index
+from .score_normalization import inner_product_to_similarity, l2_to_similarity
 from services.rag_service.models import RetrieverConfig, SearchResult
+from services.cache_service import SHARD_CACHE
 from utils.helpers import DOC_TYPES_DICT
-from services.rag_service.models import RetrieverConfig
+
+# FAISS releases the GIL while searching, so shards can be scanned concurrently.
+_SHARD_SEARCH_POOL = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="faiss-shard")
+
+# "pickle": FAISS.load_local; "mmap": memory-mapped index + chunk store; "auto": mmap when a chunk store exists.
+FAISS_LOAD_MODE = os.getenv("FAISS_LOAD_MODE", "auto")
+# Newer FAISS builds can memory-map flat indexes directly; older ones only map IVF lists.
+_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def _search_index(
+    index: "faiss.Index",
+    embeddings: List[List[float]],
+    k: int,
+    mask: Optional[np.ndarray] = None,
+    nprobe: Optional[int] = None,
+) -> List[Tuple[List[float], List[int]]]:
+    """
+    Search a raw FAISS index with one or more query vectors, restricted to the positions set in `mask`.
+
+    All queries go to FAISS as a single matrix, which it spreads over its OpenMP threads.
+    Returns (scores, positions) per query.
+    """
+    kwargs: Dict[str, Any] = {}
+    if mask is not None:
+        # The selector points into `bits`, which must stay alive until the search returns.
+        bits = np.packbits(mask, bitorder="little")
+        kwargs["sel"] = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bits))
+    params = None
+    if faiss.try_extract_index_ivf(index) is not None and nprobe:
+        params = faiss.SearchParametersIVF(nprobe=int(nprobe), **kwargs)
+    elif kwargs:
+        params = faiss.SearchParameters(**kwargs)
+
+    scores, positions = index.search(np.asarray(embeddings, dtype=np.float32), k, params=params)
+    found = positions >= 0
+    return [(row_scores[row_found].tolist(), row_positions[row_found].tolist())
+            for row_scores, row_positions, row_found in zip(scores, positions, found)]
+
+
+class FaissShard:
+    """A single per-doc-type FAISS store, searched independently of the others."""
+
+    def __init__(self, doc_type: str, store: FAISS, path: str):
+        self.doc_type = doc_type
+        self.store = store
+        self.metadata_index = load_or_build_metadata_index(
+            path,
+            doc_type,
+            lambda: (store.docstore.search(store.index_to_docstore_id[i]).metadata or {} for i in range(store.index.ntotal)),
+            store.index.ntotal,
+        )
+
+    @property
+    def higher_is_better(self) -> bool:
+        """Inner-product indexes return similarities, L2 indexes return distances."""
+        return self.store.distance_strategy in (DistanceStrategy.MAX_INNER_PRODUCT, DistanceStrategy.DOT_PRODUCT)
+
+    def search(
+        self,
+        embedding: List[float],
+        k: int,
+        mask: Optional[np.ndarray] = None,
+        nprobe: Optional[int] = None,
+    ) -> List[Tuple[Document, float]]:
+        """Return the shard's top-k documents (among `mask`) with their native FAISS score."""
+        if mask is None and nprobe is None:
+            return self.store.similarity_search_with_score_by_vector(embedding, k=k)
+        return self.search_batch([embedding], k, mask, nprobe)[0]
+
+    def search_batch(
+        self,
+        embeddings: List[List[float]],
+        k: int,
+        mask: Optional[np.ndarray] = None,
+        nprobe: Optional[int] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """Top-k documents of every query vector, from one FAISS call."""
+        return [
+            [(self.store.docstore.search(self.store.index_to_docstore_id[p]), score) for p, score in zip(positions, scores)]
+            for scores, positions in _search_index(self.store.index, embeddings, k, mask, nprobe)
+        ]
+
+    def estimate_memory(self) -> int:
+        """Vectors plus the text held in the docstore."""
+        index = self.store.index
+        docs = getattr(self.store.docstore, "_dict", {}).values()
+        return index.ntotal * index.d * 4 + sum(len(doc.page_content.encode("utf-8")) for doc in docs)
+
+
+class MmapFaissShard(FaissShard):
+    """
+    A shard whose index is memory-mapped read-only and whose chunks live in a ChunkStore.
+
+    Nothing is unpickled: text and metadata are fetched only for the final top-k.
+    """
+
+    def __init__(self, doc_type: str, path: str):
+        self.doc_type = doc_type
+        self.store = None
+        self.index = faiss.read_index(os.path.join(path, "index.faiss"), _MMAP_FLAGS)
+        self.chunks = ChunkStore(os.path.join(path, CHUNK_STORE_FILE))
+        if self.index.ntotal != len(self.chunks):
+            raise ValueError(f"Chunk store out of sync with FAISS index in {path}; re-export it.")
+        self.metadata_index = load_or_build_metadata_index(path, doc_type, self.chunks.metadatas, self.index.ntotal)
+
+    @property
+    def higher_is_better(self) -> bool:
+        return self.index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+    def search(
+        self,
+        embedding: List[float],
+        k: int,
+        mask: Optional[np.ndarray] = None,
+        nprobe: Optional[int] = None,
+    ) -> List[Tuple[Document, float]]:
+        return self.search_batch([embedding], k, mask, nprobe)[0]
+
+    def search_batch(
+        self,
+        embeddings: List[List[float]],
+        k: int,
+        mask: Optional[np.ndarray] = None,
+        nprobe: Optional[int] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        return [
+            list(zip(self.chunks.fetch(positions), scores))
+            for scores, positions in _search_index(self.index, embeddings, k, mask, nprobe)
+        ]
+
+    def estimate_memory(self) -> int:
+        """Mapped pages belong to the shared page cache, not to this process."""
+        return 0
+
 
 class FaissRetriever(BaseRetriever):
     """
     FAISS retriever using LangChain's FAISS wrapper.
+
+    Each document type is a separate shard loaded once into SHARD_CACHE. Multi-type
+    searches query every shard with the same query vector and merge the per-shard
+    top-k, so no merged copy of the indexes is ever built.
     """
+    base_path = "data/vector_stores/faiss_stores"
+    load_params = ("load_mode",)
+
     def __init__(self, config: RetrieverConfig, embeddings: Embeddings):
         super().__init__(config)
         self.embeddings = embeddings
-        self.vector_client = None  
+        self.vector_client = None
+
+    @classmethod
+    def uses_embeddings(cls, params: Dict[str, Any]) -> bool:
+        return True
+
+    def _load_shard(self, doc_type: str) -> FaissShard:
+        """Fetch a shard from the shared cache, loading it from disk on first use."""
+        path = f"{self.base_path}/{DOC_TYPES_DICT[doc_type]}"
+        load_mode = self.config.params.get("load_mode", FAISS_LOAD_MODE)
+        if load_mode == "auto":
+            load_mode = "mmap" if os.path.exists(os.path.join(path, CHUNK_STORE_FILE)) else "pickle"
+
+        def load() -> FaissShard:
+            if load_mode == "mmap":
+                return MmapFaissShard(doc_type, path)
+            store = FAISS.load_local(path, embeddings=self.embeddings, allow_dangerous_deserialization=True)
+            return FaissShard(doc_type, store, path)
+
+        return SHARD_CACHE.get_or_load(("faiss", load_mode, path), load, size_fn=lambda shard: shard.estimate_memory())
+
+    def _shards(self) -> List[FaissShard]:
+        return [self._load_shard(doc_type) for doc_type in self.config.document_types]
 
     def initialize_connection(self):
-        """Load FAISS vector store from disk."""
-        base_path = "data/vector_stores/faiss_stores"
-        doc_types = self.config.document_types
+        """Load (or reuse) the FAISS shard of every selected document type."""
+        shards = self._shards()
+        if len({shard.higher_is_better for shard in shards}) > 1:
+            raise ValueError("Cannot merge FAISS shards built with different distance strategies.")
+        # Shards are owned by SHARD_CACHE; only the selection is kept here so eviction frees memory.
+        self.vector_client = [shard.doc_type for shard in shards]
 
-        if len(doc_types) == 1:
-            path = f"{base_path}/{DOC_TYPES_DICT[doc_types[0]]}"
-            self.vector_client = FAISS.load_local(path, embeddings=self.embeddings, allow_dangerous_deserialization=True)
-        else:
-            first_path = f"{base_path}/{DOC_TYPES_DICT[doc_types[0]]}"
-            merged_faiss = FAISS.load_local(first_path, embeddings=self.embeddings, allow_dangerous_deserialization=True)
+    def estimate_memory(self) -> int:
+        """The shards are accounted for in SHARD_CACHE, so the retriever itself is negligible."""
+        return 0
 
-            for doc_type in doc_types[1:]:
-                path = f"{base_path}/{DOC_TYPES_DICT[doc_type]}"
-                next_faiss = FAISS.load_local(path, embeddings=self.embeddings, allow_dangerous_deserialization=True)
-                merged_faiss.merge_from(next_faiss)
+    def _targets(self, shards: List[FaissShard], metadata_filter: MetadataFilter) -> List[Tuple[FaissShard, Optional[np.ndarray]]]:
+        """Shards that can match the filter, with their ID mask (None: every position)."""
+        # Filters are pushed into each shard as an ID selector over its metadata columns.
+        targets = []
+        for shard in shards:
+            if metadata_filter.doc_types and shard.doc_type not in metadata_filter.doc_types:
+                continue
+            mask = shard.metadata_index.mask(metadata_filter)
+            if mask is None or mask.any():
+                targets.append((shard, mask))
+        return targets
 
-            self.vector_client = merged_faiss
+    def _search_shards(
+        self, query: str, max_results: int, metadata_filter: MetadataFilter
+    ) -> List[Tuple[Document, float]]:
+        """Scatter the query vector to every shard and gather one correctly ranked top-k."""
+        shards = self._shards()
+        higher_is_better = shards[0].higher_is_better
+        nprobe = self.config.params.get("nprobe")
 
-    def search(self, query: str, max_results: int) -> List[SearchResult]:
-        """Search using LangChain FAISS and return scored results."""
-        if self.vector_client is None:
-            raise RuntimeError("FAISS vector store not initialized. Call initialize_connection() first.")
+        targets = self._targets(shards, metadata_filter)
+        if not targets:
+            return []
 
-        docs = self.vector_client.similarity_search(query, k=max_results)
+        embedding = self.embeddings.embed_query(query)
+
+        def search_shard(target) -> List[Tuple[Document, float]]:
+            shard, mask = target
+            return shard.search(embedding, max_results, mask, nprobe)
+
+        if len(targets) > 1 and self.config.params.get("parallel_search", True):
+            per_shard = list(_SHARD_SEARCH_POOL.map(search_shard, targets))
+        else:
+            per_shard = [search_shard(target) for target in targets]
+
+        return self._merge(per_shard, max_results, higher_is_better)
+
+    @staticmethod
+    def _merge(per_shard: List[List[Tuple[Document, float]]], max_results: int, higher_is_better: bool) -> List[Tuple[Document, float]]:
+        # Each shard list is already sorted, so a k-way merge is enough.
+        merged = heapq.merge(
+            *per_shard,
+            key=lambda doc_score: -doc_score[1] if higher_is_better else doc_score[1],
+        )
+        return list(merged)[:max_results]
+
+    def _to_results(self, docs_with_scores: List[Tuple[Document, float]]) -> List[SearchResult]:
+        normalize = inner_product_to_similarity if self._shards()[0].higher_is_better else l2_to_similarity
         results = []
 
-        for doc in docs:
+        for doc, score in docs_with_scores:
             results.append(SearchResult(
                 content=doc.page_content,
                 metadata=doc.metadata if doc.metadata else {},
-                relevance_score=0,
+                relevance_score=normalize(float(score)),
                 document_type=self.config.document_types,
+                raw_score=float(score),
             ))
         return results
+
+    def search(self, query: str, max_results: int, filters: Optional[Dict[str, Any]] = None) -> List[SearchResult]:
+        """Search using LangChain FAISS and return scored results."""
+        if self.vector_client is None:
+            raise RuntimeError("FAISS vector store not initialized. Call initialize_connection() first.")
+
+        return self._to_results(self._search_shards(query, max_results, MetadataFilter.from_dict(filters)))
+
+    def search_batch(
+        self, queries: List[str], max_results: int, filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[SearchResult]]:
+        """
+        Embed all queries in one model call and search each shard once with the whole query matrix.
+        """
+        if self.vector_client is None:
+            raise RuntimeError("FAISS vector store not initialized. Call initialize_connection() first.")
+        if not queries:
+            return []
+
+        shards = self._shards()
+        higher_is_better = shards[0].higher_is_better
+        nprobe = self.config.params.get("nprobe")
+        targets = self._targets(shards, MetadataFilter.from_dict(filters))
+        if not targets:
+            return [[] for _ in queries]
+
+        embed_queries = getattr(self.embeddings, "embed_queries", None)
+        if embed_queries is not None:
+            embeddings = embed_queries(queries)
+        else:
+            embeddings = self.embeddings.embed_documents(queries)
+
+        def search_shard(target) -> List[List[Tuple[Document, float]]]:
+            shard, mask = target
+            return shard.search_batch(embeddings, max_results, mask, nprobe)
+
+        if len(targets) > 1 and self.config.params.get("parallel_search", True):
+            per_shard = list(_SHARD_SEARCH_POOL.map(search_shard, targets))
+        else:
+            per_shard = [search_shard(target) for target in targets]
+
+        # per_shard[s][q] -> per query, the lists of every shard
+        return [
+            self._to_results(self._merge(list(shard_lists), max_results, higher_is_better))
+            for shard_lists in zip(*per_shard)
+        ]
+
     def as_langchain_retriever(self):
         if self.vector_client is None:
             raise RuntimeError("Vector store not initialized.")
-        return self.vector_client.as_retriever()
+        shards = self._shards()
+        if len(shards) != 1 or shards[0].store is None:
+            raise RuntimeError("A LangChain retriever is only available for a single, pickle-loaded document type.")
+        return shards[0].store.as_retriever()
@@ -0,0 +1,36 @@
+"""Fusion of ranked result lists coming from several retrievers."""
+import dataclasses
+from typing import Dict, List, Optional
+
+from services.rag_service.models import SearchResult
+
+DEFAULT_RRF_K = 60
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Dict[str, List[SearchResult]],
+    weights: Optional[Dict[str, float]] = None,
+    k: int = DEFAULT_RRF_K,
+) -> List[SearchResult]:
+    """
+    Weighted Reciprocal Rank Fusion: score(d) = sum_r weight_r / (k + rank_r(d)).
+
+    Chunks are deduplicated by `chunk_id`. The fused result keeps the best
+    normalized relevance_score among the backends and stores the RRF score in
+    raw_score, which is what the returned list is sorted by.
+    """
+    weights = weights or {}
+    fused: Dict[str, SearchResult] = {}
+    rrf_scores: Dict[str, float] = {}
+
+    for name, results in ranked_lists.items():
+        weight = weights.get(name, 1.0)
+        for rank, result in enumerate(results, start=1):
+            chunk_id = result.chunk_id
+            rrf_scores[chunk_id] = rrf_scores.get(chunk_id, 0.0) + weight / (k + rank)
+            best = fused.get(chunk_id)
+            if best is None or result.relevance_score > best.relevance_score:
+                fused[chunk_id] = result
+
+    ordered = sorted(rrf_scores, key=rrf_scores.__getitem__, reverse=True)
+    return [dataclasses.replace(fused[chunk_id], raw_score=rrf_scores[chunk_id]) for chunk_id in ordered]
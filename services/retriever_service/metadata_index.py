@@ -0,0 +1,176 @@
+"""
+Per-chunk metadata columns used to pre-filter searches.
+
+For every store, `metadata.npz` holds one entry per index position:
+    years       (N,) int16  publication year, 0 when unknown
+    doc_types   (N,) int16  code into `doc_type_names`
+    sources     (N,) int32  code into `source_names`
+    version     ()   int    METADATA_INDEX_VERSION of the code that built it
+Filters are evaluated on these arrays into a boolean mask that the retrievers
+push down into the search itself (FAISS ID selector, masked BM25 scoring), so a
+narrow date range makes a search cheaper instead of emptier.
+
+Chunks whose year is unknown are kept by year filters: dropping them would hide
+most of a corpus that was ingested without dates.
+"""
+import logging
+import math
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+METADATA_INDEX_FILE = "metadata.npz"
+# Bumped when year extraction changes, so that indexes built by older code are rebuilt on load.
+METADATA_INDEX_VERSION = 2
+UNKNOWN_YEAR = 0
+
+# Not \b: an underscore is a word character, so "Code_2019.pdf" has no boundary before the year.
+_YEAR_PATTERN = re.compile(r"(?<!\d)(19[5-9]\d|20\d\d)(?!\d)")
+
+
+def extract_year(metadata: Dict[str, Any]) -> int:
+    """Publication year of a chunk: an explicit `year`, else the first year in its title or source."""
+    year = metadata.get("year")
+    # NaN (an empty cell of a CSV read by pandas) counts as no year.
+    if isinstance(year, float) and not math.isfinite(year):
+        year = None
+    if isinstance(year, (int, float)) or (isinstance(year, str) and year.isdigit()):
+        return int(year)
+    for key in ("metadata", "title", "source"):
+        match = _YEAR_PATTERN.search(str(metadata.get(key, "")))
+        if match:
+            return int(match.group(1))
+    return UNKNOWN_YEAR
+
+
+@dataclass
+class MetadataFilter:
+    """Filters understood by every retriever"""
+    start_year: Optional[int] = None
+    end_year: Optional[int] = None
+    doc_types: Optional[List[str]] = None
+    sources: Optional[List[str]] = None
+
+    @classmethod
+    def from_dict(cls, filters: Optional[Dict[str, Any]]) -> "MetadataFilter":
+        """Parse the Mongo-style dict built by RAGService._build_filters."""
+        filters = filters or {}
+        year = filters.get("year", {})
+        return cls(
+            start_year=year.get("$gte"),
+            end_year=year.get("$lte"),
+            doc_types=filters.get("document_type", {}).get("$in"),
+            sources=filters.get("source", {}).get("$in"),
+        )
+
+    @property
+    def has_year_range(self) -> bool:
+        return self.start_year is not None or self.end_year is not None
+
+    def is_empty(self) -> bool:
+        return not (self.has_year_range or self.doc_types or self.sources)
+
+
+class MetadataIndex:
+    """Column store of chunk metadata, aligned with index positions."""
+
+    def __init__(
+        self,
+        years: np.ndarray,
+        doc_types: np.ndarray,
+        doc_type_names: np.ndarray,
+        sources: np.ndarray,
+        source_names: np.ndarray,
+        version: int = METADATA_INDEX_VERSION,
+    ):
+        self.version = version
+        self.years = years
+        self.doc_types = doc_types
+        self.doc_type_names = doc_type_names
+        self.sources = sources
+        self.source_names = source_names
+
+    def __len__(self) -> int:
+        return len(self.years)
+
+    @classmethod
+    def build(cls, metadatas: Iterable[Dict[str, Any]], doc_type: str) -> "MetadataIndex":
+        years: List[int] = []
+        sources: List[int] = []
+        source_codes: Dict[str, int] = {}
+        for metadata in metadatas:
+            years.append(extract_year(metadata))
+            source = str(metadata.get("source", ""))
+            sources.append(source_codes.setdefault(source, len(source_codes)))
+        return cls(
+            years=np.asarray(years, dtype=np.int16),
+            doc_types=np.zeros(len(years), dtype=np.int16),
+            doc_type_names=np.asarray([doc_type], dtype=str),
+            sources=np.asarray(sources, dtype=np.int32),
+            source_names=np.asarray(list(source_codes) or [""], dtype=str),
+        )
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            years=self.years,
+            doc_types=self.doc_types,
+            doc_type_names=self.doc_type_names,
+            sources=self.sources,
+            source_names=self.source_names,
+            version=np.asarray(self.version),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "MetadataIndex":
+        with np.load(path, allow_pickle=False) as data:
+            columns = {name: data[name] for name in data.files}
+        # Files written before the version field are version 1.
+        version = int(columns.pop("version", 1))
+        return cls(**columns, version=version)
+
+    def _codes(self, names: np.ndarray, wanted: List[str]) -> np.ndarray:
+        return np.flatnonzero(np.isin(names, np.asarray(wanted, dtype=str)))
+
+    def mask(self, metadata_filter: MetadataFilter) -> Optional[np.ndarray]:
+        """Boolean mask of the chunks matching the filter, or None when nothing is filtered."""
+        if metadata_filter.is_empty():
+            return None
+        mask = np.ones(len(self), dtype=bool)
+        if metadata_filter.has_year_range:
+            in_range = np.ones(len(self), dtype=bool)
+            if metadata_filter.start_year is not None:
+                in_range &= self.years >= metadata_filter.start_year
+            if metadata_filter.end_year is not None:
+                in_range &= self.years <= metadata_filter.end_year
+            mask &= in_range | (self.years == UNKNOWN_YEAR)
+        if metadata_filter.doc_types:
+            mask &= np.isin(self.doc_types, self._codes(self.doc_type_names, metadata_filter.doc_types))
+        if metadata_filter.sources:
+            mask &= np.isin(self.sources, self._codes(self.source_names, metadata_filter.sources))
+        return mask
+
+
+def load_or_build_metadata_index(
+    store_dir: str,
+    doc_type: str,
+    metadatas: Callable[[], Iterable[Dict[str, Any]]],
+    expected_size: int,
+) -> MetadataIndex:
+    """Load `metadata.npz`, building and persisting it from the chunk metadata when missing or stale."""
+    path = os.path.join(store_dir, METADATA_INDEX_FILE)
+    if os.path.exists(path):
+        index = MetadataIndex.load(path)
+        if len(index) == expected_size and index.version == METADATA_INDEX_VERSION:
+            return index
+    index = MetadataIndex.build(metadatas(), doc_type)
+    try:
+        index.save(path)
+    except OSError as e:
+        logging.warning(f"Could not persist metadata index {path}: {e}")
+    return index
@@ -5,6 +5,9 @@ from langchain.vectorstores import Qdrant
 from langchain.embeddings.base import Embeddings
 from dataclasses import dataclass
 from .base_retriever import BaseRetriever
+from .score_normalization import qdrant_score_to_similarity
+from .metadata_index import UNKNOWN_YEAR, MetadataFilter
+from qdrant_client.http import models as rest
 from services.rag_service.models import RetrieverConfig, SearchResult
 from utils.helpers import DOC_TYPES_DICT
 
@@ -12,25 +15,31 @@ class QdrantRetriever(BaseRetriever):
     """
     Qdrant retriever using LangChain's Qdrant wrapper.
     """
+    base_path = "data/vector_stores/qdrant_stores"
+
     def __init__(self, config: RetrieverConfig, embeddings: Embeddings):
         super().__init__(config)
         self.embeddings = embeddings
         self.vector_client = None
+        self.distance: Optional[str] = None
+
+    @classmethod
+    def uses_embeddings(cls, params: Dict[str, Any]) -> bool:
+        return True
 
     def initialize_connection(self):
         """Initialize Qdrant vector store."""
-        base_path = "data/vector_stores/qdrant_stores"
         doc_types = self.config.document_types
 
         if len(doc_types) == 1:
-            path = f"{base_path}/{DOC_TYPES_DICT[doc_types[0]]}"
+            path = f"{self.base_path}/{DOC_TYPES_DICT[doc_types[0]]}"
             self.vector_client = Qdrant.from_existing_collection(
                 embedding=self.embeddings,
                 path=path,
                 collection_name=DOC_TYPES_DICT[doc_types[0]]
             )
         else:
-            first_path = f"{base_path}/{DOC_TYPES_DICT[doc_types[0]]}"
+            first_path = f"{self.base_path}/{DOC_TYPES_DICT[doc_types[0]]}"
             merged_qdrant = Qdrant.from_existing_collection(
                 embedding=self.embeddings,
                 path=first_path,
@@ -38,7 +47,7 @@ class QdrantRetriever(BaseRetriever):
             )
 
             for doc_type in doc_types[1:]:
-                path = f"{base_path}/{DOC_TYPES_DICT[doc_type]}"
+                path = f"{self.base_path}/{DOC_TYPES_DICT[doc_type]}"
                 next_qdrant = Qdrant.from_existing_collection(
                     embedding=self.embeddings,
                     path=path,
@@ -49,20 +58,49 @@ class QdrantRetriever(BaseRetriever):
                 )
 
             self.vector_client = merged_qdrant
+        self.distance = self._distance_name()
+
+    def _payload_filter(self, filters: Optional[Dict[str, Any]]) -> Optional[rest.Filter]:
+        """Translate the metadata filter into a Qdrant payload filter evaluated inside the search."""
+        metadata_filter = MetadataFilter.from_dict(filters)
+        if not metadata_filter.has_year_range:
+            return None
+        # Chunks of unknown year are kept, whether stored as 0 or without a `year` at all
+        # (points ingested before chunks carried one).
+        return rest.Filter(should=[
+            rest.FieldCondition(key="metadata.year", match=rest.MatchValue(value=UNKNOWN_YEAR)),
+            rest.IsEmptyCondition(is_empty=rest.PayloadField(key="metadata.year")),
+            rest.FieldCondition(
+                key="metadata.year",
+                range=rest.Range(gte=metadata_filter.start_year, lte=metadata_filter.end_year),
+            ),
+        ])
+
+    def _distance_name(self) -> str:
+        """Distance metric of the collection: "Cosine", "Dot" or "Euclid"."""
+        collection = self.vector_client.client.get_collection(self.vector_client.collection_name)
+        vectors = collection.config.params.vectors
+        if isinstance(vectors, dict):
+            vectors = next(iter(vectors.values()))
+        return getattr(vectors.distance, "value", str(vectors.distance))
 
     def search(self, query: str, max_results: int, filters: Optional[Dict[str, Any]] = None) -> List[SearchResult]:
         """Search using LangChain Qdrant and return scored results."""
         if self.vector_client is None:
             raise RuntimeError("Qdrant vector store not initialized. Call initialize_connection() first.")
 
-        docs = self.vector_client.similarity_search(query, k=max_results)
+        docs_with_scores = self.vector_client.similarity_search_with_score(
+            query, k=max_results, filter=self._payload_filter(filters)
+        )
+        distance = self.distance or self._distance_name()
         results = []
 
-        for doc in docs:
+        for doc, score in docs_with_scores:
             results.append(SearchResult(
                 content=doc.page_content,
                 metadata=doc.metadata if doc.metadata else {},
-                relevance_score=0,
+                relevance_score=qdrant_score_to_similarity(score, distance),
                 document_type=self.config.document_types,
+                raw_score=score,
             ))
         return results
\ No newline at end of file
@@ -0,0 +1,54 @@
+"""
+Map each backend's native score to a comparable [0, 1] similarity.
+
+Dense stores hold unit-length MiniLM embeddings, so every dense score can be
+turned back into a cosine, used as is with negative cosines clipped to 0. (A
+(1 + cos) / 2 mapping would put nearly every chunk in [0.5, 1], since MiniLM
+cosines are rarely negative, and make the answer confidence meaningless.) BM25
+scores are unbounded and go through a saturation curve instead.
+"""
+import math
+
+DEFAULT_BM25_PIVOT = 10.0
+
+
+def _clip(value: float) -> float:
+    return min(max(value, 0.0), 1.0)
+
+
+def cosine_to_similarity(cosine: float) -> float:
+    """Map a cosine in [-1, 1] to [0, 1]: opposite and unrelated texts both score 0."""
+    return _clip(cosine)
+
+
+def l2_to_similarity(squared_distance: float) -> float:
+    """FAISS/Chroma L2 scores are squared distances; for unit vectors cos = 1 - d / 2."""
+    return cosine_to_similarity(1.0 - squared_distance / 2.0)
+
+
+def inner_product_to_similarity(inner_product: float) -> float:
+    """The inner product of unit vectors is their cosine."""
+    return cosine_to_similarity(inner_product)
+
+
+def bm25_to_similarity(score: float, pivot: float = DEFAULT_BM25_PIVOT) -> float:
+    """Saturating map score / (score + pivot): a score equal to `pivot` maps to 0.5."""
+    if score <= 0 or math.isnan(score):
+        return 0.0
+    return score / (score + pivot)
+
+
+def chroma_distance_to_similarity(distance: float, space: str = "l2") -> float:
+    """Chroma returns a distance whose meaning depends on the collection's `hnsw:space`."""
+    if space == "cosine":
+        return cosine_to_similarity(1.0 - distance)
+    if space == "ip":
+        return inner_product_to_similarity(1.0 - distance)
+    return l2_to_similarity(distance)
+
+
+def qdrant_score_to_similarity(score: float, distance: str = "Cosine") -> float:
+    """Qdrant returns a similarity for Cosine/Dot collections and a distance for Euclid ones."""
+    if distance == "Euclid":
+        return l2_to_similarity(score ** 2)
+    return cosine_to_similarity(score)
@@ -0,0 +1,144 @@
+import math
+import os
+import pickle
+from collections import Counter
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from services.rag_service.models import RetrieverConfig, RetrieverType
+from services.retriever_service.bm25_engine import (
+    BM25_INDEX_FILE,
+    LEGACY_BM25_FILE,
+    BM25Engine,
+    BM25Index,
+    convert_legacy_store,
+)
+from services.retriever_service.bm25_retriever import LocalBM25Retriever
+from services.retriever_service.chunk_store import CHUNK_STORE_FILE
+from utils.text_processing import tokenize
+
+CORPUS = [
+    "Le contrat de travail est conclu pour une durée indéterminée.",
+    "Le contrat de travail à durée déterminée ne peut excéder deux ans.",
+    "Tout employeur doit déclarer ses salariés à la caisse de sécurité sociale.",
+    "La durée légale du travail est fixée à quarante heures par semaine.",
+    "Le salarié licencié a droit à une indemnité de licenciement.",
+    "Les heures supplémentaires donnent lieu à une majoration de salaire.",
+    "Le code des impôts fixe le taux de la taxe sur la valeur ajoutée.",
+    "La taxe est due par toute personne qui réalise une opération imposable.",
+    "Le contrat est résilié de plein droit en cas de force majeure.",
+    "Le travail de nuit des enfants est interdit.",
+]
+QUERIES = [
+    "durée du contrat de travail",
+    "indemnité de licenciement du salarié",
+    "taxe sur la valeur ajoutée",
+    "heures supplémentaires de travail de nuit",
+    "travail travail contrat",
+]
+
+
+def okapi_scores(corpus, query, k1=1.5, b=0.75, epsilon=0.25):
+    """rank_bm25.BM25Okapi.get_scores, which LangChain's BM25Retriever ranked with."""
+    doc_freqs = [Counter(doc) for doc in corpus]
+    doc_len = np.array([len(doc) for doc in corpus], dtype=float)
+    avgdl = doc_len.sum() / len(corpus)
+    nd = Counter(term for freqs in doc_freqs for term in freqs)
+    idf = {term: math.log(len(corpus) - df + 0.5) - math.log(df + 0.5) for term, df in nd.items()}
+    eps = epsilon * sum(idf.values()) / len(idf)
+    idf = {term: value if value >= 0 else eps for term, value in idf.items()}
+    scores = np.zeros(len(corpus))
+    for term in query:
+        q_freq = np.array([freqs.get(term, 0) for freqs in doc_freqs], dtype=float)
+        scores += idf.get(term, 0) * (q_freq * (k1 + 1) / (q_freq + k1 * (1 - b + b * doc_len / avgdl)))
+    return scores
+
+
+def ranking(scores):
+    """Documents with a non-zero score, best first."""
+    return [int(doc) for doc in np.argsort(-scores, kind="stable") if scores[doc] > 0]
+
+
+def assert_ranked_like(docs, expected_scores):
+    """Same matching documents, in an order the reference agrees with (ties may come either way)."""
+    assert sorted(docs) == sorted(ranking(expected_scores))
+    ranked = expected_scores[docs]
+    assert np.all(ranked[:-1] >= ranked[1:] - 1e-5)
+
+
+@pytest.mark.parametrize("k1, b, epsilon", [(1.5, 0.75, 0.25), (1.2, 0.5, 0.1)])
+def test_scores_match_okapi(k1, b, epsilon):
+    corpus = [tokenize(text) for text in CORPUS]
+    engine = BM25Engine([BM25Index.build(CORPUS)], k1=k1, b=b, epsilon=epsilon)
+    for query in QUERIES:
+        expected = okapi_scores(corpus, tokenize(query), k1, b, epsilon)
+        assert np.allclose(engine.get_scores(query), expected, rtol=1e-5, atol=1e-6)
+        assert_ranked_like([doc for _, doc, _ in engine.top_k(query, len(CORPUS))], expected)
+
+
+def test_scores_match_rank_bm25():
+    rank_bm25 = pytest.importorskip("rank_bm25")
+    okapi = rank_bm25.BM25Okapi([tokenize(text) for text in CORPUS], k1=1.5, b=0.75, epsilon=0.25)
+    engine = BM25Engine([BM25Index.build(CORPUS)])
+    for query in QUERIES:
+        assert np.allclose(engine.get_scores(query), okapi.get_scores(tokenize(query)), rtol=1e-5, atol=1e-6)
+
+
+def test_shards_score_like_their_union():
+    union = BM25Engine([BM25Index.build(CORPUS)])
+    sharded = BM25Engine([BM25Index.build(CORPUS[:4]), BM25Index.build(CORPUS[4:])])
+    for query in QUERIES:
+        assert np.allclose(sharded.get_scores(query), union.get_scores(query), rtol=1e-5)
+        assert [(4 * shard + doc if shard else doc) for shard, doc, _ in sharded.top_k(query, 5)] == \
+            [doc for _, doc, _ in union.top_k(query, 5)]
+
+
+def test_batch_matches_single_queries():
+    engine = BM25Engine([BM25Index.build(CORPUS[:4]), BM25Index.build(CORPUS[4:])])
+    mask = np.arange(len(CORPUS)) % 3 != 0
+    batch = engine.top_k_batch(QUERIES, 4, mask)
+    for query, hits in zip(QUERIES, batch):
+        single = engine.top_k(query, 4, mask)
+        assert [hit[:2] for hit in hits] == [hit[:2] for hit in single]
+        assert np.allclose([hit[2] for hit in hits], [hit[2] for hit in single])
+
+
+def test_index_round_trips_through_npz(tmp_path):
+    path = str(tmp_path / BM25_INDEX_FILE)
+    BM25Index.build(CORPUS).save(path)
+    engine = BM25Engine([BM25Index.load(path)])
+    assert np.array_equal(engine.get_scores(QUERIES[0]), BM25Engine([BM25Index.build(CORPUS)]).get_scores(QUERIES[0]))
+
+
+def write_legacy_store(store_dir):
+    """A pickled retriever exposing `docs`, like LangChain's BM25Retriever."""
+    os.makedirs(store_dir)
+    docs = [SimpleNamespace(page_content=text, metadata={"source": f"code_{i}.pdf", "page": i}) for i, text in enumerate(CORPUS)]
+    with open(os.path.join(store_dir, LEGACY_BM25_FILE), "wb") as f:
+        pickle.dump(SimpleNamespace(docs=docs), f)
+
+
+def test_convert_legacy_store(tmp_path):
+    store_dir = str(tmp_path / "code")
+    write_legacy_store(store_dir)
+    convert_legacy_store(store_dir)
+
+    assert os.path.exists(os.path.join(store_dir, BM25_INDEX_FILE))
+    assert os.path.exists(os.path.join(store_dir, CHUNK_STORE_FILE))
+    converted = BM25Engine([BM25Index.load(os.path.join(store_dir, BM25_INDEX_FILE))])
+    assert np.allclose(converted.get_scores(QUERIES[1]), BM25Engine([BM25Index.build(CORPUS)]).get_scores(QUERIES[1]))
+
+
+def test_retriever_converts_legacy_store_on_first_load(tmp_path):
+    write_legacy_store(str(tmp_path / "code"))
+    retriever = LocalBM25Retriever(RetrieverConfig(type=RetrieverType("bm25"), params={}, document_types=["Code"]))
+    retriever.base_path = str(tmp_path)
+    retriever.initialize_connection()
+
+    results = retriever.search(QUERIES[1], len(CORPUS))
+    docs = [CORPUS.index(result.content) for result in results]
+    assert_ranked_like(docs, okapi_scores([tokenize(text) for text in CORPUS], tokenize(QUERIES[1])))
+    assert results[0].metadata == {"source": f"code_{docs[0]}.pdf", "page": docs[0]}
+    assert os.path.exists(str(tmp_path / "code" / BM25_INDEX_FILE))
@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+
+import pytest
+
+from services.cache_service import IndexCache
+
+
+def test_concurrent_misses_load_once():
+    cache = IndexCache("test", max_bytes=1000, max_entries=10)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return "index"
+
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        assert cache.get_or_load("key", loader, size_fn=lambda value: 100) == "index"
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert cache.total_bytes == 100
+    assert cache._loading == {}
+
+
+class WatchedLoading(dict):
+    """Records, whenever a loading slot is released, whether the entry was already cached."""
+
+    def __init__(self, cache: IndexCache):
+        super().__init__()
+        self.cache = cache
+        self.visible_on_release = []
+
+    def pop(self, key, *default):
+        self.visible_on_release.append(key in self.cache._entries)
+        return super().pop(key, *default)
+
+
+def test_loading_slot_is_released_with_the_entry_in_place():
+    cache = IndexCache("test", max_bytes=1000, max_entries=10)
+    cache._loading = WatchedLoading(cache)
+    cache.get_or_load("key", lambda: "index", size_fn=lambda value: 100)
+    # A thread arriving after the release must find the entry, not start a second load.
+    assert cache._loading.visible_on_release == [True]
+
+
+def test_failed_load_is_not_cached_and_can_be_retried():
+    cache = IndexCache("test", max_bytes=1000, max_entries=10)
+
+    def broken():
+        raise OSError("index missing")
+
+    with pytest.raises(OSError):
+        cache.get_or_load("key", broken)
+    assert len(cache) == 0 and cache._loading == {}
+    assert cache.get_or_load("key", lambda: "index") == "index"
+
+
+def test_evicts_least_recently_used_over_budget():
+    cache = IndexCache("test", max_bytes=250, max_entries=10)
+    for key in "abc":
+        cache.get_or_load(key, lambda: key, size_fn=lambda value: 100)
+    assert [entry["key"] for entry in cache.stats()] == ["b", "c"]
+    assert cache.total_bytes == 200
+
+    cache.get_or_load("b", lambda: "reloaded")
+    cache.get_or_load("d", lambda: "d", size_fn=lambda value: 100)
+    assert [entry["key"] for entry in cache.stats()] == ["b", "d"]
+    assert cache.total_bytes == 200
+
+
+def test_evicts_over_entry_count():
+    cache = IndexCache("test", max_bytes=10 ** 6, max_entries=2)
+    for key in "abc":
+        cache.get_or_load(key, lambda: key)
+    assert len(cache) == 2
+    assert [entry["key"] for entry in cache.stats()] == ["b", "c"]
+
+
+def test_rebuilt_indexes_are_reloaded(tmp_path):
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text("{}", encoding="utf-8")
+    cache = IndexCache("test", max_bytes=1000, max_entries=10, generation_path=str(manifest))
+    assert cache.get_or_load("key", lambda: "old", size_fn=lambda value: 100) == "old"
+    assert cache.get_or_load("key", lambda: "unused") == "old"
+
+    manifest.write_text('{"rebuilt": true}', encoding="utf-8")
+    os.utime(manifest, ns=(0, os.stat(manifest).st_mtime_ns + 1))
+    assert cache.get_or_load("key", lambda: "new", size_fn=lambda value: 50) == "new"
+    assert cache.total_bytes == 50
+
+
+def test_index_loaded_during_a_rebuild_is_not_cached(tmp_path):
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text("{}", encoding="utf-8")
+    cache = IndexCache("test", max_bytes=1000, max_entries=10, generation_path=str(manifest))
+
+    def load_while_rebuilding():
+        os.utime(manifest, ns=(0, os.stat(manifest).st_mtime_ns + 1))
+        return "half-written"
+
+    assert cache.get_or_load("key", load_while_rebuilding) == "half-written"
+    assert len(cache) == 0 and cache._loading == {}
+    assert cache.get_or_load("key", lambda: "rebuilt") == "rebuilt"
@@ -0,0 +1,56 @@
+from services.rag_service.context_packer import ELISION, ContextPacker, source_marker
+from services.rag_service.models import SearchResult
+from utils.text_processing import estimate_tokens
+
+FILLER = "Les dispositions du présent chapitre s'appliquent aux entreprises de toute nature."
+
+
+def result(content: str, page: str = "1", title: str = "Code du travail") -> SearchResult:
+    return SearchResult(
+        content=content, relevance_score=0.5, document_type=["Code"],
+        metadata={"source": "data/raw/code/code_travail.pdf", "page_label": page, "metadata": title},
+    )
+
+
+def test_short_chunks_are_kept_whole_with_numbered_markers():
+    results = [result("Le préavis est d'un mois.", "3"), result("Le salaire est payé chaque mois.", "7")]
+    packed = ContextPacker(token_budget=1000).pack("préavis", results)
+    assert packed.text == (
+        "[Chunk 1] Code du travail, page 3\nLe préavis est d'un mois.\n\n"
+        "[Chunk 2] Code du travail, page 7\nLe salaire est payé chaque mois."
+    )
+    assert packed.used == [0, 1] and packed.trimmed == 0
+
+
+def test_long_chunk_is_trimmed_to_the_sentences_matching_the_query():
+    content = " ".join([FILLER] * 4 + ["Le licenciement pour motif économique ouvre droit à une indemnité."] + [FILLER] * 4)
+    packer = ContextPacker(token_budget=1000, max_chunk_tokens=40, min_chunk_tokens=10)
+    trimmed = packer.trim(content, packer._query_terms("indemnité de licenciement"), 40)
+    assert "licenciement pour motif économique" in trimmed
+    assert estimate_tokens(trimmed) <= 40 + estimate_tokens(ELISION) * 2
+    assert trimmed != content
+
+
+def test_trim_keeps_document_order_and_marks_gaps():
+    sentences = ["Premier alinéa sur le préavis.", FILLER, FILLER, "Dernier alinéa sur le préavis."]
+    packer = ContextPacker()
+    trimmed = packer.trim(" ".join(sentences), {"préavis"}, estimate_tokens(sentences[0]) * 2 + 2)
+    assert trimmed == sentences[0] + ELISION + sentences[3]
+
+
+def test_budget_is_respected_and_the_rest_is_left_out():
+    results = [result(" ".join([FILLER] * 8), str(page)) for page in range(10)]
+    packer = ContextPacker(token_budget=300, max_chunk_tokens=100, min_chunk_tokens=30)
+    packed = packer.pack("entreprises", results)
+    assert packed.tokens <= 300
+    assert estimate_tokens(packed.text) <= 300
+    assert 0 < len(packed.used) < len(results)
+    assert packed.used == list(range(len(packed.used)))
+
+
+def test_duplicate_chunks_are_packed_once_and_numbering_follows_the_results():
+    duplicate = result("Le préavis est d'un mois.", "3")
+    results = [duplicate, duplicate, result("Le salaire est payé chaque mois.", "7")]
+    packed = ContextPacker(token_budget=1000).pack("préavis", results)
+    assert packed.used == [0, 2]
+    assert source_marker(2, results[2]) in packed.text
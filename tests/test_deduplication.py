@@ -0,0 +1,69 @@
+import random
+
+from services.rag_service.deduplication import collapse_near_duplicates
+from services.rag_service.models import SearchResult
+from utils.text_processing import SIMHASH_BITS, hamming_distance, simhash, simhash_hex
+
+ARTICLE = (
+    "Article 12. Le contrat de travail à durée déterminée ne peut être conclu que pour l'exécution "
+    "d'une tâche précise et temporaire. Il ne peut avoir pour objet de pourvoir durablement un emploi "
+    "lié à l'activité normale et permanente de l'entreprise. Sa durée totale, renouvellement compris, "
+    "ne peut excéder deux ans. À défaut d'écrit, le contrat est réputé conclu pour une durée indéterminée."
+)
+AMENDED = ARTICLE.replace("deux ans", "trois ans")
+UNRELATED = (
+    "Article 4. La taxe sur la valeur ajoutée est due par toute personne physique ou morale qui réalise "
+    "de manière indépendante une opération imposable, quels que soient son statut juridique et sa "
+    "situation au regard des autres impôts."
+)
+
+
+def result(content: str, source: str = "code.pdf", **metadata) -> SearchResult:
+    return SearchResult(content=content, relevance_score=0.5, document_type=["Code"], metadata={"source": source, **metadata})
+
+
+def test_simhash_separates_near_duplicates_from_other_texts():
+    assert simhash(ARTICLE) == simhash(ARTICLE.upper())
+    assert hamming_distance(simhash(ARTICLE), simhash(AMENDED)) <= 9
+    assert hamming_distance(simhash(ARTICLE), simhash(UNRELATED)) > 9
+    assert simhash("") == 0
+    assert len(simhash_hex(ARTICLE)) == 16
+
+
+def test_collapse_keeps_the_best_ranked_copy_in_order():
+    results = [result(UNRELATED), result(ARTICLE, "loi.pdf"), result(AMENDED, "code.pdf")]
+    kept = collapse_near_duplicates(results, threshold=0.85)
+    assert kept == results[:2]
+
+
+def test_collapse_uses_the_stored_fingerprint():
+    fingerprint = simhash_hex(UNRELATED)
+    results = [result(UNRELATED), result("texte différent", simhash=fingerprint)]
+    assert collapse_near_duplicates(results, threshold=0.85) == results[:1]
+
+
+def test_threshold_zero_disables_collapsing():
+    results = [result(ARTICLE), result(ARTICLE, "loi.pdf")]
+    assert collapse_near_duplicates(results, threshold=0) == results
+
+
+def test_banding_finds_every_pair_within_the_distance():
+    rng = random.Random(0)
+    threshold = 0.85
+    max_distance = int((1 - threshold) * SIMHASH_BITS)
+    base = [rng.getrandbits(SIMHASH_BITS) for _ in range(20)]
+    fingerprints = []
+    for value in base:
+        fingerprints.append(value)
+        flipped = value
+        for bit in rng.sample(range(SIMHASH_BITS), rng.randint(0, max_distance + 3)):
+            flipped ^= 1 << bit
+        fingerprints.append(flipped)
+    results = [result(str(i), simhash=f"{value:016x}") for i, value in enumerate(fingerprints)]
+
+    # Brute force: keep a chunk unless an already kept one is within max_distance.
+    expected = []
+    for value, item in zip(fingerprints, results):
+        if all(hamming_distance(value, int(kept.metadata["simhash"], 16)) > max_distance for kept in expected):
+            expected.append(item)
+    assert collapse_near_duplicates(results, threshold) == expected
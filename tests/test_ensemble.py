@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+from services.rag_service.models import SearchResult
+from services.retriever_service.ensemble_retriever import BackendPool
+from services.retriever_service.fusion import reciprocal_rank_fusion
+from utils.metrics import BACKEND_SKIPS
+
+
+def result(content: str, relevance: float) -> SearchResult:
+    return SearchResult(content=content, relevance_score=relevance, document_type=["Code"], metadata={"source": "a.pdf"})
+
+
+def test_backend_pool_refuses_work_while_saturated():
+    pool = BackendPool("hung", workers=2)
+    release = threading.Event()
+    hung = [pool.submit(release.wait, 5) for _ in range(2)]
+    assert all(future is not None for future in hung)
+
+    assert pool.submit(lambda: "never runs") is None
+    assert BACKEND_SKIPS._values[("hung",)] == 1
+
+    release.set()
+    for future in hung:
+        future.result(timeout=5)
+    assert pool.in_flight == 0
+    assert pool.submit(lambda: "ok").result(timeout=5) == "ok"
+
+
+def test_hung_backend_does_not_block_others():
+    hung_pool, healthy_pool = BackendPool("slow", workers=1), BackendPool("fast", workers=1)
+    release = threading.Event()
+    hung_pool.submit(release.wait, 5)
+    try:
+        assert hung_pool.submit(lambda: None) is None
+        assert healthy_pool.submit(lambda: "fast").result(timeout=5) == "fast"
+    finally:
+        release.set()
+
+
+def test_rrf_rewards_chunks_ranked_by_several_backends():
+    shared, dense_only, keyword_only = result("shared", 0.6), result("dense", 0.9), result("keyword", 0.4)
+    fused = reciprocal_rank_fusion({
+        "faiss": [dense_only, shared],
+        "bm25": [keyword_only, result("shared", 0.7)],
+    })
+    assert [r.content for r in fused][0] == "shared"
+    assert len(fused) == 3
+    # The best normalized relevance among the backends is kept.
+    assert fused[0].relevance_score == 0.7
+
+
+def test_rrf_weights_favour_a_backend():
+    dense, keyword = result("dense", 0.5), result("keyword", 0.5)
+    fused = reciprocal_rank_fusion({"faiss": [dense], "bm25": [keyword]}, weights={"faiss": 0.2, "bm25": 0.8})
+    assert [r.content for r in fused] == ["keyword", "dense"]
+
+
+def test_rrf_scores_follow_the_formula():
+    first, second = result("first", 0.9), result("second", 0.8)
+    fused = reciprocal_rank_fusion({"faiss": [first, second], "bm25": [second]}, weights={"bm25": 0.5}, k=10)
+    scores = {r.content: r.raw_score for r in fused}
+    assert scores["first"] == pytest.approx(1 / 11)
+    assert scores["second"] == pytest.approx(1 / 12 + 0.5 / 11)
+    assert [r.content for r in fused] == ["second", "first"]
+
+
+def test_rrf_merges_chunks_by_identity_not_by_object():
+    from_dense = SearchResult(content="same", relevance_score=0.3, document_type=["Code"], metadata={"source": "a.pdf", "page_label": "2"})
+    other_page = SearchResult(content="same", relevance_score=0.9, document_type=["Code"], metadata={"source": "a.pdf", "page_label": "3"})
+    fused = reciprocal_rank_fusion({"faiss": [from_dense], "bm25": [other_page]})
+    assert len(fused) == 2
+
+
+def test_rrf_of_nothing_is_empty():
+    assert reciprocal_rank_fusion({}) == []
+    assert reciprocal_rank_fusion({"faiss": [], "bm25": []}) == []
@@ -0,0 +1,23 @@
+import pytest
+
+from utils import helpers
+from utils.helpers import RETRIEVER_REGISTRY, uses_embeddings
+
+
+def test_keyword_search_does_not_need_embeddings():
+    assert not uses_embeddings("bm25", {})
+    assert not uses_embeddings("ensemble_retriever", {"retrievers": ["bm25"]})
+    assert helpers._embeddings is None
+
+
+def test_registry_membership_does_not_resolve_factories():
+    assert "faiss_retriever" in RETRIEVER_REGISTRY
+    assert "unknown" not in RETRIEVER_REGISTRY
+    assert not RETRIEVER_REGISTRY.is_loaded("faiss_retriever")
+
+
+def test_dense_search_needs_embeddings():
+    pytest.importorskip("faiss")
+    assert uses_embeddings("faiss_retriever", {})
+    assert uses_embeddings("hybrid", {})
+    assert uses_embeddings("ensemble_retriever", {"retrievers": ["bm25", "faiss"]})
@@ -0,0 +1,113 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.ingestion_service import pipeline
+from services.ingestion_service.pipeline import IngestConfig, IngestionPipeline
+
+
+class FakeEmbeddings:
+    def embed_documents(self, texts):
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return [0.0, 1.0]
+
+
+class FakeExtractor:
+    """Stands in for extract_chunks: one chunk per line of the file, failing for chosen files."""
+
+    def __init__(self):
+        self.calls = []
+        self.failing = set()
+
+    def __call__(self, path, relative_path, doc_type, chunk_size, chunk_overlap):
+        self.calls.append(relative_path)
+        if relative_path in self.failing:
+            raise OSError("transient read error")
+        with open(path, encoding="utf-8") as f:
+            lines = [line for line in f.read().splitlines() if line]
+        metadatas = [{"source": path, "page": 0, "page_label": "1", "doc_type": doc_type} for _ in lines]
+        return lines, metadatas
+
+
+@pytest.fixture
+def extractor(monkeypatch):
+    fake = FakeExtractor()
+    monkeypatch.setattr(pipeline, "extract_chunks", fake)
+    # Threads instead of processes, so the patched extractor is the one that runs.
+    monkeypatch.setattr(pipeline, "ProcessPoolExecutor", ThreadPoolExecutor)
+    return fake
+
+
+@pytest.fixture
+def raw_dir(tmp_path):
+    code = tmp_path / "raw" / "code"
+    code.mkdir(parents=True)
+    (code / "a.pdf").write_text("article un\narticle deux\n", encoding="utf-8")
+    (code / "b.pdf").write_text("article trois\n", encoding="utf-8")
+    return tmp_path / "raw"
+
+
+def make_pipeline(tmp_path, raw_dir) -> IngestionPipeline:
+    config = IngestConfig(
+        raw_dir=str(raw_dir),
+        stores_dir=str(tmp_path / "stores"),
+        doc_types=["Code"],
+        backends=[],
+        workers=1,
+    )
+    return IngestionPipeline(config, embeddings=FakeEmbeddings())
+
+
+def test_unchanged_files_are_skipped(tmp_path, raw_dir, extractor):
+    first = make_pipeline(tmp_path, raw_dir).run()[0]
+    assert (first.added, first.chunks, first.failed) == (2, 3, [])
+
+    extractor.calls.clear()
+    second = make_pipeline(tmp_path, raw_dir).run()[0]
+    assert extractor.calls == []
+    assert second.unchanged == 2
+
+
+def test_failed_file_is_not_recorded_and_is_retried(tmp_path, raw_dir, extractor):
+    extractor.failing.add("code/b.pdf")
+    stats = make_pipeline(tmp_path, raw_dir).run()[0]
+    assert stats.failed == ["code/b.pdf"]
+    assert stats.chunks == 2
+
+    manifest = make_pipeline(tmp_path, raw_dir).manifest.files("Code")
+    assert set(manifest) == {"code/a.pdf"}
+
+    extractor.failing.clear()
+    extractor.calls.clear()
+    retried = make_pipeline(tmp_path, raw_dir).run()[0]
+    assert extractor.calls == ["code/b.pdf"]
+    assert retried.failed == []
+    assert retried.chunks == 3
+    assert make_pipeline(tmp_path, raw_dir).manifest.files("Code")["code/b.pdf"]["chunks"] == 1
+
+
+def test_failed_change_keeps_the_last_good_version(tmp_path, raw_dir, extractor):
+    make_pipeline(tmp_path, raw_dir).run()
+    old_sha = make_pipeline(tmp_path, raw_dir).manifest.files("Code")["code/b.pdf"]["sha256"]
+
+    (raw_dir / "code" / "b.pdf").write_text("article trois\narticle quatre\n", encoding="utf-8")
+    extractor.failing.add("code/b.pdf")
+    stats = make_pipeline(tmp_path, raw_dir).run()[0]
+    assert stats.failed == ["code/b.pdf"]
+    assert stats.chunks == 3
+    assert make_pipeline(tmp_path, raw_dir).manifest.files("Code")["code/b.pdf"]["sha256"] == old_sha
+
+    extractor.failing.clear()
+    extractor.calls.clear()
+    updated = make_pipeline(tmp_path, raw_dir).run()[0]
+    assert extractor.calls == ["code/b.pdf"]
+    assert updated.chunks == 4
+
+
+def test_fingerprint_depends_on_embedding_backend(monkeypatch):
+    config = IngestConfig()
+    torch_fingerprint = config.fingerprint()
+    monkeypatch.setattr(pipeline, "EMBEDDING_BACKEND", "onnx")
+    assert config.fingerprint() != torch_fingerprint
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from services.retriever_service.metadata_index import (
+    METADATA_INDEX_FILE,
+    UNKNOWN_YEAR,
+    MetadataFilter,
+    MetadataIndex,
+    extract_year,
+    load_or_build_metadata_index,
+)
+
+
+@pytest.mark.parametrize("metadata, year", [
+    ({"source": "data/raw/code/Code_2019.pdf"}, 2019),
+    ({"source": "loi_2021_03.pdf"}, 2021),
+    ({"title": "Décret n° 2015-123 du 4 mars"}, 2015),
+    ({"source": "rapport_12019.pdf"}, UNKNOWN_YEAR),
+    ({"year": 2018, "source": "Code_2019.pdf"}, 2018),
+    ({"year": "2017"}, 2017),
+    ({"year": float("nan"), "source": "Code_2019.pdf"}, 2019),
+    ({"year": float("nan")}, UNKNOWN_YEAR),
+    ({"source": "annexe.pdf"}, UNKNOWN_YEAR),
+])
+def test_extract_year(metadata, year):
+    assert extract_year(metadata) == year
+
+
+def test_year_filter_keeps_unknown_years():
+    index = MetadataIndex.build(
+        [{"source": "Code_2019.pdf"}, {"source": "loi_2022.pdf"}, {"source": "annexe.pdf"}], "Code"
+    )
+    mask = index.mask(MetadataFilter(start_year=2020, end_year=2024))
+    assert mask.tolist() == [False, True, True]
+
+
+def test_index_built_by_older_code_is_rebuilt(tmp_path):
+    metadatas = [{"source": "Code_2019.pdf"}]
+    stale = MetadataIndex.build(metadatas, "Code")
+    stale.years = np.asarray([UNKNOWN_YEAR], dtype=np.int16)
+    stale.version = 1
+    stale.save(str(tmp_path / METADATA_INDEX_FILE))
+
+    index = load_or_build_metadata_index(str(tmp_path), "Code", lambda: metadatas, expected_size=1)
+    assert index.years.tolist() == [2019]
+    assert MetadataIndex.load(str(tmp_path / METADATA_INDEX_FILE)).years.tolist() == [2019]
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("httpx")
+pytest.importorskip("streamlit")
+
+from services.llm_service.http_client import DeadlineExceeded
+from services.llm_service.rag import rag_llm_service
+from services.llm_service.rag.rag_llm_service import RagLLMService
+from services.llm_service.resilience import CircuitBreaker
+
+
+class CountingBreaker(CircuitBreaker):
+    """Half-open breaker that counts how often its trial slot is released."""
+
+    def __init__(self, name: str):
+        super().__init__(name, failure_threshold=1, reset_timeout=0.0)
+        self.record_failure()
+        self.releases = 0
+
+    def release_trial(self):
+        self.releases += 1
+        super().release_trial()
+
+
+def make_service() -> RagLLMService:
+    service = RagLLMService(
+        google_api_key="key", together_api_key="key", http_client=object(), async_http_client=object(),
+        default_provider="auto",
+    )
+    service.breakers = {provider: CountingBreaker(provider) for provider in service.breakers}
+    return service
+
+
+def test_async_losing_hedge_releases_its_trial_once():
+    service = make_service()
+    started = asyncio.Event()
+
+    async def slow_google(prompt, model, temperature, max_tokens, deadline):
+        started.set()
+        await asyncio.sleep(10)
+
+    async def fast_together(prompt, model, temperature, max_tokens, deadline):
+        await started.wait()
+        return "together"
+
+    service._acall_google_ai = slow_google
+    service._acall_together_ai = fast_together
+    service.latency["google"].hedge_delay = lambda *args, **kwargs: 0.01
+
+    async def run():
+        text = await service.agenerate("prompt", deadline=5)
+        # Let the cancelled hedge run its finally.
+        await asyncio.sleep(0.01)
+        return text
+
+    assert asyncio.run(run()) == "together"
+    assert service.breakers["google"].releases == 1
+    assert service.breakers["google"].allow()
+
+
+def test_sync_deadline_releases_queued_attempts(monkeypatch):
+    # One worker: the hedge to together_ai stays queued behind the hung primary.
+    monkeypatch.setattr(rag_llm_service, "_HEDGE_POOL", ThreadPoolExecutor(max_workers=1))
+    service = make_service()
+    release = threading.Event()
+
+    def hung_google(prompt, model, temperature, max_tokens, deadline):
+        release.wait(5)
+        raise DeadlineExceeded("cancelled")
+
+    service._call_google_ai = hung_google
+    service._call_together_ai = lambda *args: "never runs"
+    service.latency["google"].hedge_delay = lambda *args, **kwargs: 0.01
+
+    try:
+        with pytest.raises(DeadlineExceeded):
+            service.generate("prompt", deadline=0.1)
+        assert service.breakers["together_ai"].releases == 1
+        assert service.breakers["together_ai"].allow()
+    finally:
+        release.set()
@@ -0,0 +1,85 @@
+import time
+
+from services.llm_service.resilience import CircuitBreaker, LatencyTracker
+
+
+def open_breaker(reset_timeout: float = 0.0) -> CircuitBreaker:
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=reset_timeout)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_threshold_failures():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_success_resets_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_a_single_trial_through():
+    breaker = open_breaker()
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_trial_success_closes():
+    breaker = open_breaker()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_half_open_trial_failure_reopens():
+    breaker = open_breaker(reset_timeout=60)
+    breaker.opened_at = time.monotonic() - 61
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_cancelled_trial_releases_the_slot():
+    breaker = open_breaker()
+    assert breaker.allow()
+    # The trial was a hedge that lost the race, or a stream the user closed.
+    breaker.release_trial()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_release_trial_keeps_closed_state():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.release_trial()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 1
+
+
+def test_open_stays_open_until_reset_timeout():
+    breaker = open_breaker(reset_timeout=60)
+    assert not breaker.allow()
+    breaker.release_trial()
+    assert not breaker.allow()
+
+
+def test_hedge_delay_defaults_until_enough_samples():
+    tracker = LatencyTracker(window=10, min_samples=3)
+    assert tracker.hedge_delay(default=2.0, minimum=0.1) == 2.0
+    for seconds in (0.2, 0.4, 0.6):
+        tracker.record(seconds)
+    assert tracker.hedge_delay(q=50, default=2.0, minimum=0.1) == 0.4
+    assert tracker.hedge_delay(q=50, default=2.0, minimum=0.5) == 0.5
@@ -0,0 +1,40 @@
+import pytest
+
+from services.retriever_service.score_normalization import (
+    bm25_to_similarity,
+    chroma_distance_to_similarity,
+    cosine_to_similarity,
+    inner_product_to_similarity,
+    l2_to_similarity,
+    qdrant_score_to_similarity,
+)
+
+
+@pytest.mark.parametrize("cosine, similarity", [(1.0, 1.0), (0.62, 0.62), (0.0, 0.0), (-0.3, 0.0), (1.2, 1.0)])
+def test_cosine_is_kept_on_its_own_scale(cosine, similarity):
+    assert cosine_to_similarity(cosine) == pytest.approx(similarity)
+
+
+def test_unrelated_chunks_score_low():
+    # MiniLM cosines of unrelated texts sit around 0.1, not around 0.55.
+    assert cosine_to_similarity(0.1) < 0.2
+
+
+def test_every_backend_agrees_on_the_same_cosine():
+    cosine = 0.7
+    squared_l2 = 2 - 2 * cosine
+    expected = cosine_to_similarity(cosine)
+    assert l2_to_similarity(squared_l2) == pytest.approx(expected)
+    assert inner_product_to_similarity(cosine) == pytest.approx(expected)
+    assert chroma_distance_to_similarity(squared_l2, "l2") == pytest.approx(expected)
+    assert chroma_distance_to_similarity(1 - cosine, "cosine") == pytest.approx(expected)
+    assert chroma_distance_to_similarity(1 - cosine, "ip") == pytest.approx(expected)
+    assert qdrant_score_to_similarity(cosine, "Cosine") == pytest.approx(expected)
+    assert qdrant_score_to_similarity(squared_l2 ** 0.5, "Euclid") == pytest.approx(expected)
+
+
+def test_bm25_saturates_around_the_pivot():
+    assert bm25_to_similarity(0.0) == 0.0
+    assert bm25_to_similarity(float("nan")) == 0.0
+    assert bm25_to_similarity(10.0, pivot=10.0) == pytest.approx(0.5)
+    assert 0.9 < bm25_to_similarity(100.0, pivot=10.0) < 1.0
@@ -0,0 +1,59 @@
+"""
+Run coroutines from synchronous code.
+
+Streamlit scripts and worker threads are not inside an event loop. Rather than
+`asyncio.run()` per call, which would create a new loop and throw away the
+connection pools of the async clients bound to it, coroutines are submitted to
+one long-lived loop running in a daemon thread:
+
+    response = run_sync(rag_service.asearch_documents(...))
+
+If the waiting thread is interrupted (KeyboardInterrupt, a stopped script), the
+coroutine is cancelled instead of running on unobserved.
+"""
+import asyncio
+import threading
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """The shared background event loop, started on first use."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="async-runner", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def run_sync(coroutine: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """
+    Run `coroutine` on the background loop and block until it finishes.
+
+    Args:
+        coroutine: Coroutine to run
+        timeout: Seconds to wait before cancelling it (None: no limit)
+
+    Returns:
+        The coroutine's result; its exception is re-raised in the caller
+    """
+    loop = get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        raise RuntimeError("run_sync() would block the event loop it runs on; await the coroutine instead")
+    future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
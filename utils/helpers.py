@@ -1,16 +1,170 @@
-"""This module contains helper functions and constants for the services."""
+"""This module contains helper functions and constants for the services.
 
-from langchain.embeddings import HuggingFaceEmbeddings
-from services.retriever_service import FaissRetriever, LocalBM25Retriever, HybridRetriever, ChromaRetriever
-from typing import Any
+Nothing heavy is imported here: retriever backends are imported and built the first
+time RETRIEVER_REGISTRY is asked for them, and the embedding model (torch or
+onnxruntime) is only loaded when a dense retriever first needs it.
+"""
+
+import importlib
+import os
+import threading
+from collections.abc import Mapping
 from functools import partial
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Tuple
+
+from services.rag_service.models import RetrieverConfig, RetrieverType
+
+if TYPE_CHECKING:
+    from langchain.embeddings.base import Embeddings
+    from services.cache_service import CachedEmbeddings
+    from services.retriever_service import BaseRetriever
 
 DOC_TYPES_DICT : dict[str, str]= {"Code":"code", "Arrétés":"arrete", "Loi":"loi", "Circulaire":"circulaire", "Autres":"autres", "Décret":"decret", "Arrets":"arret"}
-EMBEDDINGS = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-RETRIEVER_REGISTRY: dict[str, Any] = {
-    "chroma": partial(ChromaRetriever, embeddings=EMBEDDINGS),
-    "bm25": LocalBM25Retriever,
-    "hybrid": HybridRetriever,
-    "faiss_retriever": partial(FaissRetriever, embeddings=EMBEDDINGS),
-}
\ No newline at end of file
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# "huggingface" (PyTorch) or "onnx" (onnxruntime, int8 unless EMBEDDING_ONNX_QUANTIZE=0)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface")
+
+
+def build_embeddings(backend: str = EMBEDDING_BACKEND) -> "Embeddings":
+    """Create the embedding model for the configured backend."""
+    if backend == "onnx":
+        from services.embedding_service import OnnxEmbeddings
+
+        threads = os.getenv("EMBEDDING_NUM_THREADS")
+        return OnnxEmbeddings(
+            EMBEDDING_MODEL_NAME,
+            quantize=os.getenv("EMBEDDING_ONNX_QUANTIZE", "1") != "0",
+            num_threads=int(threads) if threads else None,
+        )
+    from langchain.embeddings import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+
+def get_embeddings() -> "CachedEmbeddings":
+    """The process-wide embedding model, loaded on first use."""
+    global _embeddings
+    with _embeddings_lock:
+        if _embeddings is None:
+            # Imported here: the cache module loads numpy and langchain.
+            from services.cache_service import EMBEDDING_CACHE, CachedEmbeddings
+
+            # Backends produce slightly different vectors, so each one gets its own cache keys.
+            _embeddings = CachedEmbeddings(
+                build_embeddings(), f"{EMBEDDING_MODEL_NAME}:{EMBEDDING_BACKEND}", EMBEDDING_CACHE
+            )
+        return _embeddings
+
+
+def set_embeddings(embeddings: "CachedEmbeddings"):
+    """Replace the process-wide embedding model (benchmarks, tests); dense factories are re-bound to it."""
+    global _embeddings
+    with _embeddings_lock:
+        _embeddings = embeddings
+    RETRIEVER_REGISTRY.reset()
+
+
+class LazyRegistry(Mapping):
+    """
+    Name -> retriever factory mapping whose backends are imported on first lookup.
+
+    Entries are registered as "module:attribute" strings; factories of dense
+    retrievers are bound to the shared embedding model when they are resolved.
+    """
+
+    def __init__(self):
+        self._specs: Dict[str, Tuple[str, bool]] = {}
+        self._resolved: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, target: str, needs_embeddings: bool = False):
+        self._specs[name] = (target, needs_embeddings)
+        self._resolved.pop(name, None)
+
+    def __getitem__(self, name: str) -> Any:
+        with self._lock:
+            if name not in self._resolved:
+                factory = self.retriever_class(name)
+                needs_embeddings = self._specs[name][1]
+                self._resolved[name] = partial(factory, embeddings=get_embeddings()) if needs_embeddings else factory
+            return self._resolved[name]
+
+    def retriever_class(self, name: str) -> Any:
+        """The registered class itself, imported but not bound to the embedding model."""
+        module_name, attribute = self._specs[name][0].split(":")
+        return getattr(importlib.import_module(module_name), attribute)
+
+    def __contains__(self, name: object) -> bool:
+        # Mapping's default would resolve the factory, loading the embedding model for dense retrievers.
+        return name in self._specs
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._specs)
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._resolved
+
+    def reset(self):
+        """Forget resolved factories so they pick up a new embedding model on next lookup."""
+        with self._lock:
+            self._resolved.clear()
+
+
+RETRIEVER_REGISTRY = LazyRegistry()
+RETRIEVER_REGISTRY.register("chroma_retriever", "services.retriever_service.chroma_retriever:ChromaRetriever", needs_embeddings=True)
+RETRIEVER_REGISTRY.register("qdrant_retriever", "services.retriever_service.qdrant_retriever:QdrantRetriever", needs_embeddings=True)
+RETRIEVER_REGISTRY.register("bm25", "services.retriever_service.bm25_retriever:LocalBM25Retriever")
+RETRIEVER_REGISTRY.register("hybrid", "services.retriever_service.hybrid_retriever:HybridRetriever")
+RETRIEVER_REGISTRY.register("faiss_retriever", "services.retriever_service.faiss_retriever:FaissRetriever", needs_embeddings=True)
+RETRIEVER_REGISTRY.register("ensemble_retriever", "services.retriever_service.ensemble_retriever:EnsembleRetriever")
+
+
+def __getattr__(name: str) -> Any:
+    """Keep `from utils.helpers import EMBEDDINGS` working without loading the model at import."""
+    if name == "EMBEDDINGS":
+        return get_embeddings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def uses_embeddings(retriever_type: str, params: Dict[str, Any]) -> bool:
+    """Whether searching with this retriever embeds the query (BM25 alone never loads the embedding model)."""
+    if retriever_type not in RETRIEVER_REGISTRY:
+        retriever_type = "faiss_retriever"
+    return RETRIEVER_REGISTRY.retriever_class(retriever_type).uses_embeddings(params)
+
+
+def get_retriever(retriever_type: str, params: Dict[str, Any], doc_types: List[str]) -> "BaseRetriever":
+    """
+    Get and configure the appropriate retriever.
+
+    Loaded retrievers are shared across queries and sessions through RETRIEVER_CACHE,
+    so indexes are read from disk once per (type, doc types, load params) combination.
+    """
+    from services.cache_service import RETRIEVER_CACHE, make_retriever_key
+
+    config = RetrieverConfig(
+        type=RetrieverType(retriever_type),
+        params=params,
+        document_types=sorted(set(doc_types)) # type: ignore
+    )
+
+    if retriever_type not in RETRIEVER_REGISTRY:
+        retriever_type = "faiss_retriever"
+    retriever_cls = RETRIEVER_REGISTRY[retriever_type]
+    load_params = getattr(getattr(retriever_cls, "func", retriever_cls), "load_params", ())
+    key = make_retriever_key(retriever_type, config.document_types, params, load_params)
+
+    def load() -> "BaseRetriever":
+        retriever = retriever_cls(config)
+        retriever.initialize_connection()
+        return retriever
+
+    retriever = RETRIEVER_CACHE.get_or_load(key, load, size_fn=lambda r: r.estimate_memory())
+    return retriever.with_config(config)
@@ -0,0 +1,193 @@
+"""
+Structured logging and per-request spans.
+
+`configure_logging()` switches the root logger to one JSON object per line
+(LOG_FORMAT=json, the default) or plain text (LOG_FORMAT=text).
+
+A request opens a `Trace`; every `span()` inside it records the stage name, its
+duration and attributes such as counts and byte sizes. Spans also feed the
+stage histograms of `utils.metrics`, even outside of a trace. When the trace
+finishes, the whole request is logged as a single JSON event:
+
+    with start_trace("search_documents") as trace:
+        with span("search", retriever="faiss_retriever") as s:
+            results = retriever.search(...)
+            s.set(items=len(results))
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils.metrics import REQUEST_LATENCY, STAGE_BYTES, STAGE_ERRORS, STAGE_ITEMS, STAGE_LATENCY, write_prometheus_file
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("rag_trace", default=None)
+_configured = False
+_configure_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; structured fields passed with `extra={"data": {...}}` are merged in."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data = getattr(record, "data", None)
+        if isinstance(data, dict):
+            payload.update(data)
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def configure_logging(log_format: str = LOG_FORMAT, level: str = LOG_LEVEL):
+    """Install the root handler once per process (Streamlit re-runs scripts on every interaction)."""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        handler = logging.StreamHandler()
+        if log_format == "json":
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        root = logging.getLogger()
+        root.handlers = [handler]
+        root.setLevel(level)
+        _configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+
+@dataclass
+class Span:
+    """One timed stage of a request"""
+    name: str
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    start: float = 0.0
+    duration: float = 0.0
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"stage": self.name, "ms": round(self.duration * 1000, 2), **self.attributes}
+
+
+class Trace:
+    """Spans of one request, safe to append to from worker threads."""
+
+    def __init__(self, operation: str, **attributes: Any):
+        self.operation = operation
+        self.request_id = uuid.uuid4().hex[:12]
+        self.attributes = attributes
+        self.spans: List[Span] = []
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def add(self, span_: Span):
+        with self._lock:
+            self.spans.append(span_)
+
+    def snapshot(self) -> List[Span]:
+        """The spans recorded so far"""
+        with self._lock:
+            return list(self.spans)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def finish(self, **attributes: Any):
+        """Record the request duration, log the trace and refresh the metrics file. Idempotent."""
+        if self.duration is not None:
+            return
+        self.duration = self.elapsed()
+        self.attributes.update(attributes)
+        REQUEST_LATENCY.observe(self.duration, operation=self.operation)
+        with self._lock:
+            spans = [s.to_dict() for s in self.spans]
+        logging.getLogger("rag.trace").info(
+            f"{self.operation} in {self.duration * 1000:.0f} ms",
+            extra={"data": {
+                "event": "trace",
+                "operation": self.operation,
+                "request_id": self.request_id,
+                "total_ms": round(self.duration * 1000, 2),
+                "spans": spans,
+                **self.attributes,
+            }},
+        )
+        try:
+            write_prometheus_file()
+        except OSError as e:
+            logging.warning(f"Could not write metrics file: {e}")
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def use_trace(trace: Optional[Trace]) -> Iterator[Optional[Trace]]:
+    """Make `trace` the current trace, e.g. in a worker thread."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def start_trace(operation: str, **attributes: Any) -> Iterator[Trace]:
+    """Open a request trace, finished (and logged) when the block exits."""
+    trace = Trace(operation, **attributes)
+    with use_trace(trace):
+        try:
+            yield trace
+        except BaseException as e:
+            # BaseException: a cancelled request (asyncio.CancelledError) is logged too.
+            trace.finish(error=type(e).__name__)
+            raise
+        trace.finish()
+
+
+@contextmanager
+def span(name: str, trace: Optional[Trace] = None, **attributes: Any) -> Iterator[Span]:
+    """
+    Time a stage. `items` and `bytes` attributes (set upfront or with `Span.set`) also go to histograms.
+
+    The span joins `trace`, or the current trace when not given.
+    """
+    record = Span(name, dict(attributes), start=time.perf_counter())
+    try:
+        yield record
+    except Exception as e:
+        record.set(error=type(e).__name__)
+        STAGE_ERRORS.inc(stage=name, error=type(e).__name__)
+        raise
+    finally:
+        record.duration = time.perf_counter() - record.start
+        STAGE_LATENCY.observe(record.duration, stage=name)
+        if "items" in record.attributes:
+            STAGE_ITEMS.observe(record.attributes["items"], stage=name)
+        if "bytes" in record.attributes:
+            STAGE_BYTES.observe(record.attributes["bytes"], stage=name)
+        target = trace or _current_trace.get()
+        if target is not None:
+            target.add(record)
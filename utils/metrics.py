@@ -0,0 +1,157 @@
+"""
+In-process metrics in the Prometheus text format.
+
+Histograms and counters are aggregated in memory by every Streamlit session of
+the process. They can be exposed two ways:
+    METRICS_FILE=data/metrics.prom   rewritten after every request (node_exporter textfile collector)
+    METRICS_PORT=9464                a /metrics HTTP endpoint served from a daemon thread
+"""
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_PORT = os.getenv("METRICS_PORT", "")
+
+# Seconds: from a cached embedding lookup (sub-millisecond) to a slow LLM answer.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+LabelValues = Tuple[str, ...]
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label combination."""
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.label_names = tuple(label_names)
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            counts, totals = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            totals[0] += value
+
+    def snapshot(self) -> Dict[LabelValues, Tuple[int, float]]:
+        """(count, sum) of every series, e.g. to diff two points in time"""
+        with self._lock:
+            return {key: (sum(counts), totals[0]) for key, (counts, totals) in self._series.items()}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, totals) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    labels = _labels(self.label_names, key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                cumulative += counts[-1]
+                labels = _labels(self.label_names, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {totals[0]}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter, one series per label combination."""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, key)} {value}")
+        return lines
+
+
+STAGE_LATENCY = Histogram(
+    "rag_stage_duration_seconds", "Duration of one pipeline stage", LATENCY_BUCKETS, ("stage",)
+)
+STAGE_BYTES = Histogram("rag_stage_bytes", "Bytes handled by one pipeline stage", SIZE_BUCKETS, ("stage",))
+STAGE_ITEMS = Histogram("rag_stage_items", "Items (chunks, documents) produced by one stage", COUNT_BUCKETS, ("stage",))
+STAGE_ERRORS = Counter("rag_stage_errors_total", "Pipeline stages that raised", ("stage", "error"))
+REQUEST_LATENCY = Histogram(
+    "rag_request_duration_seconds", "End-to-end duration of a RAG request", LATENCY_BUCKETS, ("operation",)
+)
+BACKEND_SKIPS = Counter(
+    "rag_ensemble_backend_skips_total", "Ensemble backends skipped because all their workers were busy", ("backend",)
+)
+
+METRICS = [STAGE_LATENCY, STAGE_BYTES, STAGE_ITEMS, STAGE_ERRORS, REQUEST_LATENCY, BACKEND_SKIPS]
+
+
+def render_prometheus() -> str:
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+def write_prometheus_file(path: str = METRICS_FILE):
+    """Atomically rewrite the metrics file, if one is configured."""
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None) -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics on `port` (default METRICS_PORT) once per process; no-op when unset."""
+    global _server
+    port = port or (int(METRICS_PORT) if METRICS_PORT else None)
+    if port is None:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
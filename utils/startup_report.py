@@ -0,0 +1,88 @@
+"""
+Import-time report for the app's entry points.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter and
+summarizes where the startup time goes, per top-level package, and whether
+heavy dependencies (torch, faiss, ...) were pulled in.
+
+    python -m utils.startup_report --module services.query_processor --top 20
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List
+
+HEAVY_PACKAGES = ("torch", "langchain", "transformers", "sentence_transformers", "onnxruntime", "faiss", "chromadb", "qdrant_client")
+
+_LINE_PATTERN = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+@dataclass
+class ImportRecord:
+    """One line of -X importtime output"""
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def profile_imports(module: str) -> List[ImportRecord]:
+    """Import `module` in a fresh interpreter and parse its -X importtime trace."""
+    repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [repo_root, os.getenv("PYTHONPATH")]))}
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=repo_root,
+        env=env,
+    )
+    records = []
+    for line in completed.stderr.splitlines():
+        match = _LINE_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            records.append(ImportRecord(name, int(self_us), int(cumulative_us), len(indent) // 2))
+    if completed.returncode != 0:
+        print(completed.stderr.splitlines()[-1] if completed.stderr else "import failed", file=sys.stderr)
+    return records
+
+
+def summarize(records: List[ImportRecord]) -> Dict[str, int]:
+    """Self time in microseconds, grouped by top-level package."""
+    per_package: Dict[str, int] = defaultdict(int)
+    for record in records:
+        per_package[record.module.split(".")[0]] += record.self_us
+    return dict(per_package)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import/startup time of an app module.")
+    parser.add_argument("--module", default="services.query_processor", help="Module to import")
+    parser.add_argument("--top", type=int, default=15, help="Number of packages/modules to list")
+    args = parser.parse_args()
+
+    records = profile_imports(args.module)
+    if not records:
+        sys.exit(1)
+    total_us = sum(record.self_us for record in records)
+    print(f"Importing {args.module}: {total_us / 1e6:.2f}s across {len(records)} modules\n")
+
+    print("Top packages by self time:")
+    for package, self_us in sorted(summarize(records).items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {self_us / 1e3:10.1f} ms  {package}")
+
+    print("\nTop modules by cumulative time:")
+    for record in sorted(records, key=lambda r: -r.cumulative_us)[:args.top]:
+        print(f"  {record.cumulative_us / 1e3:10.1f} ms  {record.module}")
+
+    loaded = sorted({r.module.split(".")[0] for r in records} & set(HEAVY_PACKAGES))
+    print(f"\nHeavy packages loaded: {', '.join(loaded) if loaded else 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Lightweight text utilities shared by indexing and prompt construction (no heavy dependencies)."""
+import hashlib
+import math
+import re
+from typing import List
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+# Sentence ends: . ! ? ; or a line break, followed by whitespace. Abbreviations such as
+# "art." split too, which only makes the trimmed pieces smaller.
+_SENTENCE_PATTERN = re.compile(r"(?<=[.!?;])\s+|\n+")
+
+# Average characters per LLM token on French legal text (Gemini and Llama tokenizers).
+CHARS_PER_TOKEN = 3.5
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; accents are kept so "arrêté" and "arrete" stay distinct."""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences (or lines), dropping empty pieces."""
+    return [sentence.strip() for sentence in _SENTENCE_PATTERN.split(text) if sentence.strip()]
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM token count, without loading a tokenizer."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def simhash(text: str, shingle_size: int = SHINGLE_SIZE) -> int:
+    """
+    64-bit SimHash of the word shingles of `text`.
+
+    Texts that share most of their shingles (boilerplate repeated across a Code and the
+    Loi amending it, overlapping chunk windows) get fingerprints a few bits apart.
+    """
+    tokens = tokenize(text)
+    shingles = [" ".join(tokens[i:i + shingle_size]) for i in range(max(1, len(tokens) - shingle_size + 1))]
+    if not shingles or not shingles[0]:
+        return 0
+    # One binary string per shingle hash; counting the '1's column by column stays in C.
+    bits = [
+        format(int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big"), "064b")
+        for shingle in shingles
+    ]
+    majority = len(bits) / 2
+    fingerprint = 0
+    for column in zip(*bits):
+        fingerprint = (fingerprint << 1) | (column.count("1") > majority)
+    return fingerprint
+
+
+def simhash_hex(text: str) -> str:
+    """SimHash as 16 hex digits: storable as chunk metadata by every backend (JSON, Chroma, Qdrant)."""
+    return f"{simhash(text):016x}"
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")